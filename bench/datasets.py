@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# bench/datasets.py
+#
+# Synthetic benchmark inputs, scaled up from the committed sample datasets:
+#
+#   depth_log      stage4_depth/sw_tools/binance_depth_small.log  (#SNAP + CSV)
+#   depth_log_tiny stage4_depth/sw_tools/binance_depth_tiny.log   (#SNAP + CSV)
+#   ndjson         phase3 data/sample_btcusdt_depth.ndjson         (meta + ack + depthUpdate)
+#   ndjson_depth   same, depthUpdate lines only (what iter_binance_depth_events reads)
+#   events_bin     phase3 data/sample_btcusdt_depth.events.bin    (EVT0BIN)
+#
+# A dataset scaled by `factor` is the source repeated `factor` times. Each copy
+# is shifted past the previous one in time (ts_ns / E) and sequence (updateId /
+# U / u), so the result still looks like one continuous, monotonic capture.
+# Price / qty strings are copied verbatim, which keeps the fixed-point
+# conversions exact.
+#
+# Built files are cached in the work directory under names that include the
+# source hash and the factor, so they are only rebuilt when either changes.
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+REPO = Path(__file__).resolve().parents[1]
+STAGE4_SWTOOLS = REPO / "stage4_depth" / "sw_tools"
+PHASE3_DATA = REPO / "stage7_ps_pl_stream" / "phase3_demo_ready" / "data"
+PHASE3_TOOLS = REPO / "stage7_ps_pl_stream" / "phase3_demo_ready" / "tools"
+
+
+class Dataset(NamedTuple):
+    source: Path
+    suffix: str
+
+
+DATASETS: Dict[str, Dataset] = {
+    "depth_log": Dataset(STAGE4_SWTOOLS / "binance_depth_small.log", ".log"),
+    "depth_log_tiny": Dataset(STAGE4_SWTOOLS / "binance_depth_tiny.log", ".log"),
+    "ndjson": Dataset(PHASE3_DATA / "sample_btcusdt_depth.ndjson", ".ndjson"),
+    "ndjson_depth": Dataset(PHASE3_DATA / "sample_btcusdt_depth.ndjson", ".ndjson"),
+    "events_bin": Dataset(PHASE3_DATA / "sample_btcusdt_depth.events.bin", ".bin"),
+}
+
+
+def _source_tag(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+
+
+def scale_depth_log(src: Path, dst: Path, factor: int) -> None:
+    """Repeat the CSV events of a depth log, keeping a single #SNAP line on top."""
+    snap: List[str] = []
+    rows: List[List[str]] = []
+    with src.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.rstrip("\n")
+            if line.startswith("#SNAP"):
+                snap.append(line)
+            elif line:
+                rows.append(line.split(",", 2))
+
+    ts = [int(r[0]) for r in rows]
+    uid = [int(r[1]) for r in rows]
+    ts_step = max(ts) - min(ts) + 1
+    uid_step = max(uid) - min(uid) + 1
+
+    with dst.open("w", encoding="utf-8") as out:
+        for line in snap:
+            out.write(line + "\n")
+        for k in range(factor):
+            dt, du = k * ts_step, k * uid_step
+            out.writelines(
+                f"{t + dt},{u + du},{r[2]}\n" for t, u, r in zip(ts, uid, rows)
+            )
+
+
+def scale_ndjson(src: Path, dst: Path, factor: int, depth_only: bool = False) -> None:
+    """
+    Repeat the depthUpdate messages of an NDJSON capture. Meta / ack lines are
+    kept once at the top unless depth_only is set.
+    """
+    head: List[str] = []
+    msgs: List[dict] = []
+    with src.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if isinstance(obj, dict) and obj.get("e") == "depthUpdate":
+                msgs.append(obj)
+            elif not depth_only:
+                head.append(line)
+
+    e_step = max(m["E"] for m in msgs) - min(m["E"] for m in msgs) + 1
+    u_step = max(m["u"] for m in msgs) - min(m["U"] for m in msgs) + 1
+
+    with dst.open("w", encoding="utf-8") as out:
+        for line in head:
+            out.write(line + "\n")
+        for k in range(factor):
+            for m in msgs:
+                shifted = dict(m, E=m["E"] + k * e_step, U=m["U"] + k * u_step, u=m["u"] + k * u_step)
+                out.write(json.dumps(shifted, separators=(",", ":")) + "\n")
+
+
+def scale_events_bin(src: Path, dst: Path, factor: int) -> None:
+    """Tile the records of an events.bin (v0) behind its original header."""
+    if str(PHASE3_TOOLS) not in sys.path:
+        sys.path.append(str(PHASE3_TOOLS))
+    import numpy as np
+    from record_codecs import EventsFile, decode
+
+    with EventsFile(src) as ev:
+        if ev.header.version != 0:
+            raise ValueError(f"{src}: only EVT0BIN sources can be scaled")
+        header_size = ev.header.header_size
+    raw = src.read_bytes()
+    header, body = raw[:header_size], raw[header_size:]
+
+    # tile the raw bytes (pad bytes included), then shift the ids in place
+    out = decode("evt0", bytearray(body * factor))
+    n = len(body) // out.dtype.itemsize
+    base = out[:n]
+    e_step = int(base["E"].max() - base["E"].min()) + 1
+    u_step = int(base["u"].max() - base["U"].min()) + 1
+    shift = np.repeat(np.arange(factor, dtype=np.uint64), n)
+    out["E"] += shift * np.uint64(e_step)
+    out["U"] += shift * np.uint64(u_step)
+    out["u"] += shift * np.uint64(u_step)
+
+    with dst.open("wb") as fh:
+        fh.write(header)
+        fh.write(out.tobytes())
+
+
+def ensure(name: str, factor: int, workdir: Path) -> Path:
+    """Path of dataset `name` scaled by `factor`, building it if missing."""
+    ds = DATASETS[name]
+    workdir.mkdir(parents=True, exist_ok=True)
+    dst = workdir / f"{name}_{_source_tag(ds.source)}_x{factor}{ds.suffix}"
+    if dst.is_file():
+        return dst
+
+    tmp = dst.with_name(dst.name + ".tmp")
+    if name in ("depth_log", "depth_log_tiny"):
+        scale_depth_log(ds.source, tmp, factor)
+    elif name == "ndjson":
+        scale_ndjson(ds.source, tmp, factor)
+    elif name == "ndjson_depth":
+        scale_ndjson(ds.source, tmp, factor, depth_only=True)
+    elif name == "events_bin":
+        scale_events_bin(ds.source, tmp, factor)
+    else:
+        raise KeyError(name)
+    tmp.replace(dst)
+    return dst
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# bench/run_bench.py
+#
+# Benchmark suite for the host-side hot paths, on synthetic inputs scaled up
+# from the committed datasets (see datasets.py).
+#
+# Cases (unit = records / events processed per run):
+#   ndjson_to_events_v0        convert_ndjson_to_events(), NDJSON -> events.bin
+#   events_checksum_v0         events_checksum_v0 main(), streaming SHA256
+#   compare_events_bins        compare_events_bins main() on two identical files
+#   parse_log_lines            stage2 replay parse_log_lines() over a depth log
+#   iter_binance_depth_events  stage4 scalar NDJSON normalizer
+#   simulate_cpu_strategy      stage6 CPU book + strategy_kernel_simple reference
+#   uart_pack_pty              stage2 replay loop (struct pack + write per record)
+#                              into a pty, timed until the far end has read it all
+#   uart_events_bin_pty        events.bin transcode + one write per E group, same pty
+#
+# Every case runs in its own interpreter (the stage directories share module
+# names such as depth_cpu_normalizer), after one untimed warm-up run. A case
+# whose imports fail (e.g. pyserial missing) is recorded as skipped.
+#
+# Usage:
+#   python3 bench/run_bench.py run                          # -> bench/results/latest.json
+#   python3 bench/run_bench.py run --out bench/baselines/reference.json
+#   python3 bench/run_bench.py compare bench/baselines/reference.json bench/results/latest.json
+#   python3 bench/run_bench.py run --compare-to bench/baselines/reference.json --threshold 0.15
+#
+# compare matches cases by name and compares the best time per unit. Fixed
+# per-run costs do not shrink with the dataset, so each case records its
+# dataset factor and is only compared against a baseline taken at the same
+# factor (a mismatch fails the comparison). It exits 1 if any case got slower
+# than the baseline by more than --threshold (default 10%), failed to run
+# (error) or is missing from the current run.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import datasets
+from datasets import REPO, PHASE3_TOOLS, STAGE4_SWTOOLS
+
+BENCH_DIR = Path(__file__).resolve().parent
+STAGE2_DIR = REPO / "stage2_feed_replay"
+STAGE6_SCRIPTS = REPO / "stage6_stateless_kernel_risk_pl" / "scripts"
+
+DEFAULT_WORKDIR = BENCH_DIR / ".data"
+DEFAULT_OUT = BENCH_DIR / "results" / "latest.json"
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.10
+SCHEMA = "ax-bench.v1"
+
+# A prepared case: the callable to time and how many units one call processes
+Prepared = Tuple[Callable[[], None], int]
+
+
+class Case(NamedTuple):
+    dataset: str
+    factor: int                 # default scale factor of the dataset
+    prepare: Callable[[Path, Path], Prepared]   # (dataset path, scratch dir)
+
+
+def _use_path(path: Path) -> None:
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+def _run_main(main: Callable[[], None], argv: List[str]) -> None:
+    """Call a tool's main() with argv, discarding what it prints."""
+    saved = sys.argv
+    sys.argv = ["bench"] + argv
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main()
+    finally:
+        sys.argv = saved
+
+
+def _events_count(path: Path) -> int:
+    _use_path(PHASE3_TOOLS)
+    from record_codecs import EventsFile
+
+    with EventsFile(path) as ev:
+        return len(ev.records)
+
+
+# ---------------------------------------------------------------------------
+# cases
+# ---------------------------------------------------------------------------
+
+def prep_ndjson_to_events(src: Path, scratch: Path) -> Prepared:
+    _use_path(PHASE3_TOOLS)
+    from ndjson_to_events_v0 import convert_ndjson_to_events
+
+    out = scratch / "ndjson_to_events.bin"
+    _, _, _, n_recs = convert_ndjson_to_events(src, out, "BTCUSDT", 100_000_000, 100_000_000)
+
+    def run() -> None:
+        convert_ndjson_to_events(src, out, "BTCUSDT", 100_000_000, 100_000_000)
+
+    return run, n_recs
+
+
+def prep_events_checksum(src: Path, scratch: Path) -> Prepared:
+    _use_path(PHASE3_TOOLS)
+    from events_checksum_v0 import main
+
+    argv = ["--in", str(src), "--every", str(1 << 62)]
+    return (lambda: _run_main(main, argv)), _events_count(src)
+
+
+def prep_compare_events_bins(src: Path, scratch: Path) -> Prepared:
+    _use_path(PHASE3_TOOLS)
+    from compare_events_bins import main
+
+    copy = scratch / "compare_b.bin"
+    copy.write_bytes(src.read_bytes())
+    argv = ["--a", str(src), "--b", str(copy)]
+    return (lambda: _run_main(main, argv)), _events_count(src)
+
+
+def prep_parse_log_lines(src: Path, scratch: Path) -> Prepared:
+    _use_path(STAGE2_DIR)
+    from replay.replay_uart import parse_log_lines
+
+    n = sum(1 for _ in parse_log_lines(src))
+
+    def run() -> None:
+        for _ in parse_log_lines(src):
+            pass
+
+    return run, n
+
+
+def prep_iter_binance_depth_events(src: Path, scratch: Path) -> Prepared:
+    _use_path(STAGE4_SWTOOLS)
+    from depth_cpu_normalizer import iter_binance_depth_events
+
+    n = sum(1 for _ in iter_binance_depth_events(str(src)))
+
+    def run() -> None:
+        for _ in iter_binance_depth_events(str(src)):
+            pass
+
+    return run, n
+
+
+def prep_simulate_cpu_strategy(src: Path, scratch: Path) -> Prepared:
+    _use_path(STAGE6_SCRIPTS)
+    from stage6_actions_compare import simulate_cpu_strategy
+
+    with src.open("r", encoding="utf-8") as fh:
+        n = sum(1 for line in fh if line[:1].isdigit())
+    return (lambda: simulate_cpu_strategy(str(src), cache=None)), n
+
+
+class PtySink:
+    """
+    A pty pair whose master side is drained by a thread, standing in for the
+    board's UART. wait(n) blocks until n bytes have arrived since reset().
+    """
+
+    def __init__(self) -> None:
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._received = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                chunk = os.read(self.master, 1 << 16)
+            except OSError:
+                return
+            if not chunk:
+                return
+            with self._cond:
+                self._received += len(chunk)
+                self._cond.notify_all()
+
+    def reset(self) -> None:
+        with self._cond:
+            self._received = 0
+
+    def wait(self, n_bytes: int, timeout_s: float = 60.0) -> None:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._received >= n_bytes, timeout_s):
+                raise TimeoutError(f"pty received {self._received}/{n_bytes} bytes")
+
+
+def _open_pty_serial(sink: PtySink):
+    import serial
+
+    return serial.Serial(port=sink.port, baudrate=921600, timeout=1)
+
+
+def prep_uart_pack_pty(src: Path, scratch: Path) -> Prepared:
+    _use_path(STAGE2_DIR)
+    from replay.replay_uart import RECORD_STRUCT, parse_log_lines
+
+    records = list(parse_log_lines(src))
+    sink = PtySink()
+    ser = _open_pty_serial(sink)
+    total = len(records) * RECORD_STRUCT.size
+
+    def run() -> None:
+        # the body of replay_uart()'s send loop, without the pacing sleeps
+        sink.reset()
+        for ts_ns, update_id, side_code, price, qty in records:
+            ser.write(RECORD_STRUCT.pack(ts_ns, update_id, side_code, float(price), float(qty)))
+        sink.wait(total)
+
+    return run, len(records)
+
+
+def prep_uart_events_bin_pty(src: Path, scratch: Path) -> Prepared:
+    import numpy as np
+
+    _use_path(STAGE2_DIR)
+    from replay.replay_uart import RECORD_STRUCT, load_events_bin_payload
+
+    sink = PtySink()
+    ser = _open_pty_serial(sink)
+    n = _events_count(src)
+
+    def run() -> None:
+        # replay_events_bin(): transcode up front, then one write per E group
+        sink.reset()
+        payload, event_ms = load_events_bin_payload(src)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(event_ms)) + 1, [len(event_ms)]))
+        view = memoryview(payload)
+        size = RECORD_STRUCT.size
+        for lo, hi in zip(starts[:-1].tolist(), starts[1:].tolist()):
+            ser.write(view[lo * size:hi * size])
+        view.release()
+        sink.wait(len(payload))
+
+    return run, n
+
+
+CASES: Dict[str, Case] = {
+    "ndjson_to_events_v0": Case("ndjson", 40, prep_ndjson_to_events),
+    "events_checksum_v0": Case("events_bin", 200, prep_events_checksum),
+    "compare_events_bins": Case("events_bin", 10, prep_compare_events_bins),
+    "parse_log_lines": Case("depth_log", 200, prep_parse_log_lines),
+    "iter_binance_depth_events": Case("ndjson_depth", 40, prep_iter_binance_depth_events),
+    "simulate_cpu_strategy": Case("depth_log_tiny", 1000, prep_simulate_cpu_strategy),
+    "uart_pack_pty": Case("depth_log", 100, prep_uart_pack_pty),
+    "uart_events_bin_pty": Case("events_bin", 50, prep_uart_events_bin_pty),
+}
+
+
+# ---------------------------------------------------------------------------
+# running
+# ---------------------------------------------------------------------------
+
+def case_factor(name: str, scale: float) -> int:
+    return max(1, round(CASES[name].factor * scale))
+
+
+def time_case(name: str, factor: int, repeats: int, workdir: Path) -> dict:
+    """Run one case in this process; returns its result record."""
+    case = CASES[name]
+    src = datasets.ensure(case.dataset, factor, workdir)
+    scratch = workdir / "scratch"
+    scratch.mkdir(parents=True, exist_ok=True)
+    result = {"dataset": src.name, "factor": factor}
+
+    try:
+        run, units = case.prepare(src, scratch)
+    except ImportError as e:
+        result.update(status="skipped", reason=f"import failed: {e}")
+        return result
+
+    run()  # warm-up: page cache, imports, lazy allocations
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+
+    median = statistics.median(times)
+    result.update(
+        status="ok",
+        units=units,
+        times_s=[round(t, 6) for t in times],
+        min_s=round(min(times), 6),
+        median_s=round(median, 6),
+        # best-of-N: on a shared box the minimum is far steadier than the median
+        per_unit_ns=round(min(times) / units * 1e9, 3) if units else None,
+        units_per_s=round(units / min(times), 1) if min(times) > 0 else None,
+    )
+    return result
+
+
+def run_case_subprocess(name: str, factor: int, repeats: int, workdir: Path) -> dict:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "case", name,
+           "--factor", str(factor), "--repeats", str(repeats), "--workdir", str(workdir)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        err = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"factor": factor, "status": "error", "reason": err}
+    return json.loads(lines[-1])
+
+
+def machine_info() -> dict:
+    info = {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import numpy
+
+        info["numpy"] = numpy.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def run_suite(names: List[str], scale: float, repeats: int, workdir: Path) -> dict:
+    results = {}
+    for name in names:
+        factor = case_factor(name, scale)
+        # build the input here so dataset generation never overlaps a timing
+        datasets.ensure(CASES[name].dataset, factor, workdir)
+        res = run_case_subprocess(name, factor, repeats, workdir)
+        results[name] = res
+        if res["status"] == "ok":
+            print(f"  {name:<27} {res['units']:>9} units  best {res['min_s'] * 1e3:9.2f} ms"
+                  f"  {res['per_unit_ns']:10.1f} ns/unit  {res['units_per_s']:>12.0f}/s")
+        else:
+            print(f"  {name:<27} {res['status']}: {res.get('reason', '')}")
+
+    return {
+        "schema": SCHEMA,
+        "created_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine_info(),
+        "scale": scale,
+        "repeats": repeats,
+        "cases": results,
+    }
+
+
+# ---------------------------------------------------------------------------
+# comparing
+# ---------------------------------------------------------------------------
+
+class Delta(NamedTuple):
+    name: str
+    base_ns: Optional[float]
+    cur_ns: Optional[float]
+    ratio: Optional[float]      # current / baseline time per unit
+    verdict: str                # ok | improved | skipped | new | REGRESSION | ERROR | MISSING | SCALE-MISMATCH
+
+
+# verdicts that fail the comparison
+FAILING = ("REGRESSION", "ERROR", "MISSING", "SCALE-MISMATCH")
+
+
+def compare_results(base: dict, cur: dict, threshold: float) -> List[Delta]:
+    out = []
+    for name in sorted(set(base["cases"]) | set(cur["cases"])):
+        b = base["cases"].get(name)
+        c = cur["cases"].get(name)
+        if b is None:
+            out.append(Delta(name, None, c.get("per_unit_ns"), None, "new"))
+            continue
+        if c is None:
+            out.append(Delta(name, b.get("per_unit_ns"), None, None, "MISSING"))
+            continue
+        if c.get("status") == "skipped":    # import failed (optional dependency missing)
+            out.append(Delta(name, b.get("per_unit_ns"), None, None, "skipped"))
+            continue
+        if c.get("status") != "ok":
+            out.append(Delta(name, b.get("per_unit_ns"), None, None, "ERROR"))
+            continue
+        if b.get("status") != "ok":
+            out.append(Delta(name, None, c["per_unit_ns"], None, "new"))
+            continue
+        if b.get("factor") != c.get("factor"):
+            out.append(Delta(name, b["per_unit_ns"], c["per_unit_ns"], None, "SCALE-MISMATCH"))
+            continue
+        ratio = c["per_unit_ns"] / b["per_unit_ns"]
+        if ratio > 1.0 + threshold:
+            verdict = "REGRESSION"
+        elif ratio < 1.0 - threshold:
+            verdict = "improved"
+        else:
+            verdict = "ok"
+        out.append(Delta(name, b["per_unit_ns"], c["per_unit_ns"], ratio, verdict))
+    return out
+
+
+def print_comparison(deltas: List[Delta], base: dict, cur: dict, threshold: float) -> None:
+    bm, cm = base.get("machine", {}), cur.get("machine", {})
+    print(f"baseline: {base.get('created_utc')} {bm.get('hostname')} python {bm.get('python')}")
+    print(f"current : {cur.get('created_utc')} {cm.get('hostname')} python {cm.get('python')}")
+    if bm.get("hostname") != cm.get("hostname"):
+        print("note: different hosts, ratios mostly reflect the machines")
+    print(f"threshold: +/-{threshold:.0%} on best ns/unit")
+
+    def fmt(v: Optional[float]) -> str:
+        return f"{v:10.1f}" if v is not None else f"{'-':>10}"
+
+    print(f"  {'case':<27} {'base ns':>10} {'cur ns':>10} {'ratio':>7}  verdict")
+    for d in deltas:
+        ratio = f"{d.ratio:7.3f}" if d.ratio is not None else f"{'-':>7}"
+        print(f"  {d.name:<27} {fmt(d.base_ns)} {fmt(d.cur_ns)} {ratio}  {d.verdict}")
+    for d in deltas:
+        if d.verdict == "ERROR":
+            print(f"  {d.name}: {cur['cases'][d.name].get('reason', '')}")
+        elif d.verdict == "SCALE-MISMATCH":
+            print(f"  {d.name}: dataset factor {base['cases'][d.name].get('factor')} in the baseline, "
+                  f"{cur['cases'][d.name].get('factor')} now (rerun with the baseline's --scale)")
+
+
+def _load(path: Path) -> dict:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if data.get("schema") != SCHEMA:
+        raise SystemExit(f"{path}: not a {SCHEMA} result file")
+    return data
+
+
+def _compare_and_report(base_path: Path, cur: dict, threshold: float,
+                        only: Optional[List[str]] = None) -> int:
+    """only: the cases a subset run selected (the others are not MISSING)."""
+    base = _load(base_path)
+    if only:
+        base = {**base, "cases": {k: v for k, v in base["cases"].items() if k in only}}
+    deltas = compare_results(base, cur, threshold)
+    print_comparison(deltas, base, cur, threshold)
+    failed = [f"{d.name} ({d.verdict})" for d in deltas if d.verdict in FAILING]
+    if failed:
+        print(f"FAIL: {len(failed)} case(s): {', '.join(failed)}")
+        return 1
+    print("PASS: no regressions")
+    return 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark suite for the host-side hot paths.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmarks and write a result JSON")
+    p_run.add_argument("cases", nargs="*", help=f"subset of cases (default: all of {', '.join(CASES)})")
+    p_run.add_argument("--scale", type=float, default=1.0,
+                       help="multiplier on every case's dataset factor (e.g. 0.1 for a quick run)")
+    p_run.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="timed runs per case")
+    p_run.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR,
+                       help="where scaled datasets are cached")
+    p_run.add_argument("--out", type=Path, default=DEFAULT_OUT, help="result JSON path")
+    p_run.add_argument("--compare-to", type=Path, default=None, help="baseline JSON to compare against")
+    p_run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="allowed slowdown as a fraction (0.10 = 10%%)")
+
+    p_cmp = sub.add_parser("compare", help="compare a result JSON against a baseline")
+    p_cmp.add_argument("baseline", type=Path)
+    p_cmp.add_argument("current", type=Path)
+    p_cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="allowed slowdown as a fraction (0.10 = 10%%)")
+
+    p_case = sub.add_parser("case", help=argparse.SUPPRESS)  # worker: one case, JSON on stdout
+    p_case.add_argument("name", choices=list(CASES))
+    p_case.add_argument("--factor", type=int, required=True)
+    p_case.add_argument("--repeats", type=int, required=True)
+    p_case.add_argument("--workdir", type=Path, required=True)
+
+    args = ap.parse_args()
+
+    if args.cmd == "case":
+        print(json.dumps(time_case(args.name, args.factor, args.repeats, args.workdir)))
+        return
+
+    if args.cmd == "compare":
+        sys.exit(_compare_and_report(args.baseline, _load(args.current), args.threshold))
+
+    unknown = [c for c in args.cases if c not in CASES]
+    if unknown:
+        raise SystemExit(f"unknown case(s): {', '.join(unknown)}")
+    names = args.cases or list(CASES)
+
+    print(f"[bench] {len(names)} case(s), scale={args.scale}, repeats={args.repeats}")
+    result = run_suite(names, args.scale, args.repeats, args.workdir)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"[bench] wrote {args.out}")
+
+    if args.compare_to is not None:
+        sys.exit(_compare_and_report(args.compare_to, result, args.threshold, args.cases))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 
 import asyncio
 import json
+import os
 import time
 from typing import TextIO
 
@@ -15,26 +16,48 @@ if __package__ in (None, ""):
     this_dir = pathlib.Path(__file__).resolve().parent
     if str(this_dir) not in sys.path:
         sys.path.insert(0, str(this_dir))
+    if str(this_dir.parent) not in sys.path:
+        sys.path.insert(0, str(this_dir.parent))
     from config import (
+        SYMBOL,
         REST_DEPTH_URL,
         WS_DEPTH_STREAM_URL,
         LOG_FILE,
         FLUSH_INTERVAL,
         WS_MAX_SIZE,
+        METRICS_JSONL,
+        METRICS_PORT,
+        METRICS_INTERVAL_S,
+        PROFILE_OUT,
+        SHM_RING_NAME,
+        SHM_RING_CAPACITY,
+        SHM_RING_CONSUMERS,
+        SHM_RING_CHECK_S,
     )
 else:
     from .config import (
+        SYMBOL,
         REST_DEPTH_URL,
         WS_DEPTH_STREAM_URL,
         LOG_FILE,
         FLUSH_INTERVAL,
         WS_MAX_SIZE,
+        METRICS_JSONL,
+        METRICS_PORT,
+        METRICS_INTERVAL_S,
+        PROFILE_OUT,
+        SHM_RING_NAME,
+        SHM_RING_CAPACITY,
+        SHM_RING_CONSUMERS,
+        SHM_RING_CHECK_S,
     )
 
+from telemetry import Telemetry, ws_queue_depth
 
-def write_snapshot(fh: TextIO) -> None:
+
+def write_snapshot(fh: TextIO) -> dict:
     """
-    Fetch and write initial order book snapshot.
+    Fetch and write initial order book snapshot; returns it.
 
     Line format:
     #SNAP {"lastUpdateId": ..., "bids": [...], "asks": [...]}
@@ -43,11 +66,27 @@ def write_snapshot(fh: TextIO) -> None:
     resp.raise_for_status()
     snap = resp.json()
     fh.write("#SNAP " + json.dumps(snap, separators=(",", ":")) + "\n")
+    return snap
+
+
+def open_ring():
+    """Shared-memory ring producer if configured (needs numpy, imported only then)."""
+    name = os.getenv("AX_SHM_RING", SHM_RING_NAME or "") or None
+    if name is None:
+        return None
+    if __package__ in (None, ""):
+        from shm_ring import RingProducer
+    else:
+        from .shm_ring import RingProducer
+    ring = RingProducer(name, SHM_RING_CAPACITY, SHM_RING_CONSUMERS, symbol=SYMBOL)
+    print(f"[capture] publishing to shared-memory ring {name} ({SHM_RING_CAPACITY} records)")
+    return ring
 
 
-async def capture_loop() -> None:
+async def capture_loop(tm: Telemetry, ring=None) -> None:
     """
-    Connect to Binance depth WebSocket, append records to LOG_FILE.
+    Connect to Binance depth WebSocket, append records to LOG_FILE (and
+    publish them to the shared-memory ring, if one is open).
 
     Record format (CSV):
     ts_ns,updateId,side,price,qty
@@ -58,11 +97,34 @@ async def capture_loop() -> None:
     - price, qty: strings from Binance JSON (kept as text for exactness)
     """
     msg_counter = 0
+    records_since_flush = 0
+
+    msgs = tm.counter("messages_total", "depthUpdate messages received")
+    recs = tm.counter("records_total", "CSV records written")
+    rx_bytes = tm.counter("bytes_total", "websocket payload bytes received")
+    last_uid = tm.gauge("last_update_id", "u of the last message")
+    unflushed = tm.gauge("unflushed_records", "records written since the last flush")
+    queue_depth = tm.gauge("ws_queue_depth", "received websocket messages not yet processed")
+    handle_s = tm.histogram("handle_seconds", "parse + write time per message")
+    flush_s = tm.histogram("flush_seconds", "log flush time")
+    lag_s = tm.histogram("event_lag_seconds", "receive time minus exchange event time E")
+    if ring is not None:
+        ring_recs = tm.counter("ring_records_total", "records published to the shared-memory ring")
+        ring_epoch = tm.gauge("ring_epoch", "snapshots published to the ring (1 + reconnects)")
+        ring_slow_events = tm.counter("ring_slow_consumer_events_total", "ring consumers that became slow")
+        ring_consumers = tm.gauge("ring_consumers", "attached ring consumers")
+        ring_slow = tm.gauge("ring_slow_consumers", "ring consumers currently flagged slow")
+        ring_lag = tm.gauge("ring_max_lag_records", "unread records of the furthest-behind consumer")
+        ring_overrun = tm.gauge("ring_overrun_records", "records lost by attached consumers (overrun)")
+        publish_s = tm.histogram("ring_publish_seconds", "ring publish time per message")
 
     with open(LOG_FILE, "a", buffering=1) as fh:
-        # Snapshot first
-        write_snapshot(fh)
+        # Snapshot first (on the ring it opens a new epoch: consumers rebuild from it)
+        snap = write_snapshot(fh)
         fh.flush()
+        if ring is not None:
+            ring_recs.inc(ring.publish_snapshot(time.time_ns(), snap))
+            ring_epoch.set(ring.epoch)
 
         async with websockets.connect(
             WS_DEPTH_STREAM_URL,
@@ -73,6 +135,7 @@ async def capture_loop() -> None:
             print(f"[capture] Connected to {WS_DEPTH_STREAM_URL}")
             async for msg in ws:
                 ts_ns = time.time_ns()
+                t0 = time.perf_counter()
                 data = json.loads(msg)
 
                 # Binance diff depth fields:
@@ -82,28 +145,75 @@ async def capture_loop() -> None:
                 update_id = data["u"]
 
                 # Write one line per (side, price, qty)
-                for price, qty in data.get("b", []):
+                bids = data.get("b", [])
+                asks = data.get("a", [])
+                for price, qty in bids:
                     fh.write(f"{ts_ns},{update_id},B,{price},{qty}\n")
 
-                for price, qty in data.get("a", []):
+                for price, qty in asks:
                     fh.write(f"{ts_ns},{update_id},A,{price},{qty}\n")
 
+                if ring is not None:
+                    t1 = time.perf_counter()
+                    ring_recs.inc(ring.publish_levels(ts_ns, data.get("E", 0), data.get("U", update_id),
+                                                      update_id, bids, asks))
+                    publish_s.observe(time.perf_counter() - t1)
+                    st = ring.check_consumers(SHM_RING_CHECK_S)
+                    if st is not None:
+                        ring_slow_events.inc(st["new_slow_events"])
+                        ring_consumers.set(st["consumers"])
+                        ring_slow.set(st["slow"])
+                        ring_lag.set(st["max_lag"])
+                        ring_overrun.set(st["overrun_records"])
+
+                n_recs = len(bids) + len(asks)
+                records_since_flush += n_recs
+                msgs.inc()
+                recs.inc(n_recs)
+                rx_bytes.inc(len(msg))
+                last_uid.set(update_id)
+                unflushed.set(records_since_flush)
+                if "E" in data:
+                    lag_s.observe(ts_ns / 1e9 - data["E"] / 1e3)
+                depth = ws_queue_depth(ws)
+                if depth is not None:
+                    queue_depth.set(depth)
+                handle_s.observe(time.perf_counter() - t0)
+
                 msg_counter += 1
                 if msg_counter % FLUSH_INTERVAL == 0:
-                    fh.flush()
+                    with flush_s.time():
+                        fh.flush()
+                    records_since_flush = 0
+                    unflushed.set(0)
                     print(f"[capture] messages={msg_counter}", flush=True)
 
 
 async def main() -> None:
-    while True:
-        try:
-            await capture_loop()
-        except (websockets.ConnectionClosed, websockets.WebSocketException) as e:
-            print(f"[capture] WebSocket error: {e}. Reconnecting in 5s...")
-            await asyncio.sleep(5)
-        except Exception as e:
-            print(f"[capture] Fatal error: {e}. Exiting.")
-            raise
+    tm = Telemetry.from_env(
+        "capture",
+        jsonl=str(METRICS_JSONL) if METRICS_JSONL else None,
+        port=METRICS_PORT,
+        interval_s=METRICS_INTERVAL_S,
+        profile=str(PROFILE_OUT) if PROFILE_OUT else None,
+    )
+    reconnects = tm.counter("reconnects_total", "websocket reconnects")
+    ring = open_ring()
+    try:
+        while True:
+            try:
+                await capture_loop(tm, ring)
+            except (websockets.ConnectionClosed, websockets.WebSocketException) as e:
+                print(f"[capture] WebSocket error: {e}. Reconnecting in 5s...")
+                reconnects.inc()
+                await asyncio.sleep(5)
+            except Exception as e:
+                print(f"[capture] Fatal error: {e}. Exiting.")
+                raise
+    finally:
+        if ring is not None:
+            ring.close()
+        tm.close()
 
 
 if __name__ == "__main__":
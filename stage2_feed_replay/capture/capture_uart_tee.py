@@ -0,0 +1,251 @@
+# capture/capture_uart_tee.py
+#
+# Live capture -> UART tee.
+#
+# Same Binance depth stream as capture_binance_depth.py, but every received
+# depthUpdate is encoded straight into 32-byte UART records (the replay's
+# <QQBffxxxxxxx layout, ts_ns = receive time) and written to the serial port
+# before anything else happens to it, so the PL sees the live stream. The
+# depth log is still written, in the capture's format, by a background
+# thread fed through a queue: formatting and disk I/O stay off the
+# receive -> write path.
+#
+# Per message the tee records receive -> ser.write() returned time
+# (tee_rx_to_write_seconds; from the moment the websocket hands over the
+# message to the moment the records are queued in the UART driver) and
+# prints its p50 / p99 / max on exit. --sync-every interleaves clock-sync
+# records (replay/sync_records.py), so the PL side can be put on the host
+# time axis with stage4_depth/sw_tools/clock_sync.py: ts_ns being the
+# receive time, latency_measure then covers receive -> PL end to end.
+#
+# Usage:
+#   python -m capture.capture_uart_tee --port /dev/ttyUSB0 --baud 921600
+#   python -m capture.capture_uart_tee --port /dev/ttyUSB0 --sync-every 0.1 --metrics-jsonl tee.jsonl
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import sys
+import pathlib
+import threading
+import time
+from typing import Optional, Sequence
+
+import websockets
+
+# Support running both as a package module and as a standalone script
+if __package__ in (None, ""):
+    this_dir = pathlib.Path(__file__).resolve().parent
+    if str(this_dir) not in sys.path:
+        sys.path.insert(0, str(this_dir))
+    if str(this_dir.parent) not in sys.path:
+        sys.path.insert(0, str(this_dir.parent))
+    from config import WS_DEPTH_STREAM_URL, LOG_FILE, FLUSH_INTERVAL, WS_MAX_SIZE
+    from capture_binance_depth import write_snapshot
+else:
+    from .config import WS_DEPTH_STREAM_URL, LOG_FILE, FLUSH_INTERVAL, WS_MAX_SIZE
+    from .capture_binance_depth import write_snapshot
+
+from replay.config import UART_PORT, UART_BAUDRATE, UART_RTSCTS, SYNC_EVERY_S
+from replay.replay_uart import RECORD_STRUCT, ReplayMetrics, open_serial
+from replay.sync_records import SyncSender
+from telemetry import Telemetry, add_cli_args as add_telemetry_args, ws_queue_depth
+
+Levels = Sequence[Sequence[str]]
+
+
+def encode_message(ts_ns: int, update_id: int, bids: Levels, asks: Levels) -> bytes:
+    """One depthUpdate -> concatenated 32-byte records, bids then asks (as the replay sends them)."""
+    pack = RECORD_STRUCT.pack
+    return b"".join(
+        [pack(ts_ns, update_id, 0, float(p), float(q)) for p, q in bids]
+        + [pack(ts_ns, update_id, 1, float(p), float(q)) for p, q in asks]
+    )
+
+
+class AsyncLogWriter:
+    """
+    Depth log in the capture's format, written by a daemon thread. put()
+    only enqueues; the thread formats the lines and flushes every
+    flush_every messages or whenever the queue runs dry.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, tm: Telemetry, flush_every: int = FLUSH_INTERVAL) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self._q: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.queued = tm.gauge("log_queue_messages", "messages waiting for the disk log thread")
+        self.written = tm.counter("log_records_total", "depth log records written")
+        self.flush_s = tm.histogram("log_flush_seconds", "depth log flush time")
+        self._fh = open(path, "a")
+        self._thread = threading.Thread(target=self._run, name="depth-log", daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> None:
+        """REST snapshot line (#SNAP ...), fetched and written by the log thread."""
+        self._q.put(write_snapshot)
+
+    def put(self, ts_ns: int, update_id: int, bids: Levels, asks: Levels) -> None:
+        self._q.put((ts_ns, update_id, bids, asks))
+
+    def _run(self) -> None:
+        fh = self._fh
+        pending = 0
+        while True:
+            try:
+                item = self._q.get(timeout=0.5)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if item is not None:
+                if callable(item):
+                    try:
+                        item(fh)
+                    except Exception as e:      # the UART feed goes on without a snapshot line
+                        print(f"[tee] snapshot failed: {e}")
+                else:
+                    ts_ns, update_id, bids, asks = item
+                    fh.write("".join([f"{ts_ns},{update_id},B,{p},{q}\n" for p, q in bids]
+                                     + [f"{ts_ns},{update_id},A,{p},{q}\n" for p, q in asks]))
+                    self.written.inc(len(bids) + len(asks))
+                    pending += 1
+            if pending and (pending >= self.flush_every or self._q.empty()):
+                with self.flush_s.time():
+                    fh.flush()
+                pending = 0
+            self.queued.set(self._q.qsize())
+        fh.flush()
+
+    def close(self) -> None:
+        self._q.put(self._STOP)
+        self._thread.join()
+        self._fh.close()
+
+
+async def tee_loop(ser, log: Optional[AsyncLogWriter], sync: SyncSender, tm: Telemetry) -> None:
+    """Connect, then write every message to the UART as soon as it is parsed."""
+    metrics = ReplayMetrics(tm)
+    msgs = tm.counter("messages_total", "depthUpdate messages received")
+    rx_bytes = tm.counter("ws_bytes_total", "websocket payload bytes received")
+    last_uid = tm.gauge("last_update_id", "u of the last message")
+    queue_depth = tm.gauge("ws_queue_depth", "received websocket messages not yet processed")
+    rx_to_write = tm.histogram("rx_to_write_seconds", "message received -> UART write returned")
+    lag_s = tm.histogram("event_lag_seconds", "receive time minus exchange event time E")
+
+    if log is not None:
+        log.snapshot()
+    async with websockets.connect(
+        WS_DEPTH_STREAM_URL,
+        max_size=WS_MAX_SIZE,
+        ping_interval=20,
+        ping_timeout=20,
+    ) as ws:
+        print(f"[tee] Connected to {WS_DEPTH_STREAM_URL}")
+        n = 0
+        async for msg in ws:
+            ts_ns = time.time_ns()
+            t0 = time.perf_counter()
+            data = json.loads(msg)
+            update_id = data["u"]
+            bids = data.get("b", [])
+            asks = data.get("a", [])
+
+            payload = encode_message(ts_ns, update_id, bids, asks)
+            t_write = time.perf_counter()
+            ser.write(payload)
+            t1 = time.perf_counter()
+            rx_to_write.observe(t1 - t0)
+            metrics.write_s.observe(t1 - t_write)
+
+            # everything below is off the receive -> write path
+            metrics.send_sync(sync, ser)
+            if log is not None:
+                log.put(ts_ns, update_id, bids, asks)
+            metrics.records.inc(len(bids) + len(asks))
+            metrics.bytes.inc(len(payload))
+            msgs.inc()
+            rx_bytes.inc(len(msg))
+            last_uid.set(update_id)
+            if "E" in data:
+                lag_s.observe(ts_ns / 1e9 - data["E"] / 1e3)
+            depth = ws_queue_depth(ws)
+            if depth is not None:
+                queue_depth.set(depth)
+            n += 1
+            if n % ReplayMetrics.OUT_WAITING_EVERY == 0:
+                metrics.sample_out_waiting(ser)
+            if n % FLUSH_INTERVAL == 0:
+                print(f"[tee] messages={n}", flush=True)
+
+
+def print_latency(tm: Telemetry) -> None:
+    s = tm.histogram("rx_to_write_seconds").summary()
+    if s["count"]:
+        print(f"[tee] receive -> UART write over {s['count']} messages (us): "
+              f"p50={s['p50'] * 1e6:.0f} p99={s['p99'] * 1e6:.0f} max={s['max'] * 1e6:.0f}")
+
+
+async def run(ser, log: Optional[AsyncLogWriter], sync: SyncSender, tm: Telemetry) -> None:
+    reconnects = tm.counter("reconnects_total", "websocket reconnects")
+    while True:
+        try:
+            await tee_loop(ser, log, sync, tm)
+        except (websockets.ConnectionClosed, websockets.WebSocketException) as e:
+            print(f"[tee] WebSocket error: {e}. Reconnecting in 5s...")
+            reconnects.inc()
+            await asyncio.sleep(5)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Live Binance depth capture written straight to the UART (32B records), logged to disk on the side."
+    )
+    parser.add_argument("--port", type=str, default=None, help="UART device path (overrides config/env)")
+    parser.add_argument("--baud", type=int, default=None, help="UART baud rate (overrides config/env)")
+    parser.add_argument("--rtscts", action="store_true", help="Enable RTS/CTS flow control")
+    parser.add_argument("--log", type=str, default=str(LOG_FILE), help="depth log path (appended)")
+    parser.add_argument("--no-log", action="store_true", help="UART only, no depth log")
+    parser.add_argument(
+        "--sync-every",
+        type=float,
+        default=SYNC_EVERY_S,
+        help="Send a clock-sync record at most every N seconds (0 = off)",
+    )
+    add_telemetry_args(parser)
+    args = parser.parse_args()
+
+    # Resolve UART settings with precedence: CLI > ENV > config (as the replay)
+    port = args.port or os.getenv("UART_PORT") or UART_PORT
+    baud = args.baud if args.baud is not None else int(os.getenv("UART_BAUDRATE", UART_BAUDRATE))
+    rtscts = args.rtscts or (os.getenv("UART_RTSCTS", str(UART_RTSCTS)).lower() in ("1", "true", "yes"))
+
+    ser = open_serial(port, baud, rtscts)
+    if ser is None:
+        return
+    print(f"[tee] Opened UART {port} at {baud} baud")
+
+    tm = Telemetry.from_args("tee", args)
+    log = None if args.no_log else AsyncLogWriter(args.log, tm)
+    if log is not None:
+        print(f"[tee] depth log -> {args.log}")
+    sync = SyncSender(args.sync_every)
+    try:
+        asyncio.run(run(ser, log, sync, tm))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ReplayMetrics(tm).send_sync(sync, ser, final=True)
+        ser.close()
+        if log is not None:
+            log.close()
+        print_latency(tm)
+        tm.close()
+
+
+if __name__ == "__main__":
+    main()
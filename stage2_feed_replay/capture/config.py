@@ -24,3 +24,17 @@ FLUSH_INTERVAL = 50
 
 # Max websocket message size (bytes); 16 MiB is plenty for depth updates.
 WS_MAX_SIZE = 16 * 1024 * 1024
+
+# Telemetry (see telemetry/); env AX_METRICS_JSONL / AX_METRICS_PORT /
+# AX_METRICS_INTERVAL / AX_PROFILE override these.
+METRICS_JSONL = None        # e.g. BASE_DIR / "capture_metrics.jsonl"
+METRICS_PORT = None         # e.g. 9108 -> http://127.0.0.1:9108/metrics
+METRICS_INTERVAL_S = 5.0
+PROFILE_OUT = None          # collapsed-stack file for the sampling profiler
+
+# Shared-memory ring for live consumers (see capture/shm_ring.py); env
+# AX_SHM_RING overrides the name. None = capture only writes the log.
+SHM_RING_NAME = None        # e.g. "axdepth" -> /dev/shm/axdepth
+SHM_RING_CAPACITY = 1 << 20 # records, power of two (64 bytes each)
+SHM_RING_CONSUMERS = 8
+SHM_RING_CHECK_S = 0.01     # slow-consumer / overrun check interval
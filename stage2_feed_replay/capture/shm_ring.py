@@ -0,0 +1,509 @@
+# capture/shm_ring.py
+#
+# Shared-memory ring buffer for live consumers of the capture.
+#
+# The capture publishes every depth level it receives as a fixed 64-byte
+# record into a multiprocessing.shared_memory segment. Any number of
+# independent processes (live UART replay, events.bin writer, book model, ...)
+# attach by name and read at their own pace, without re-reading the log.
+#
+# Single producer, lock-free:
+#   - the producer stores reserve_seq (end of the batch it is about to
+#     write), copies the records into slot (seq % capacity), then stores
+#     write_seq; it never waits for consumers, a consumer that falls more
+#     than `capacity` records behind loses the oldest ones (overrun);
+#   - each consumer owns one cursor line in the header (read_seq, overrun
+#     counters) and the producer only reads it, except for the slow-consumer
+#     fields it owns; every header field has exactly one writer;
+#   - a consumer reads write_seq, copies (or views) the records, then reads
+#     reserve_seq: records the producer may have overwritten meanwhile (seq <
+#     reserve_seq - capacity) are dropped and counted as overrun, so a
+#     consumer never returns torn data.
+# Header fields are aligned 8-byte words (single stores on x86-64 / AArch64).
+# Python cannot issue memory barriers, so ordering relies on the stores
+# being issued in program order, which holds on x86-64 (TSO).
+#
+# Segment layout:
+#   0      header (2 lines): magic, version, record size, capacity, max
+#          consumers, price/qty scale, producer pid, symbol
+#   128    producer line: write_seq, closed, reserve_seq, epoch
+#   192    one 64-byte line per consumer: pid (0 = free), read_seq,
+#          overrun_records, overrun_events   (written by the consumer)
+#          slow, slow_events, max_lag        (written by the producer)
+#   ...    capacity x 64-byte records
+#
+# Records (RECORD_DTYPE): the first 48 bytes are an events.bin v0 (evt0)
+# record, so a consumer can write events.bin directly; ts_ns (host receive
+# time) follows at offset 48, then kind and epoch. Prices and quantities are
+# integers scaled by price_scale / qty_scale (1e8), parsed from Binance's
+# decimal strings.
+#
+# Epochs: every REST snapshot the capture takes (at start and after each
+# reconnect) opens a new epoch. It is published as one KIND_EPOCH marker
+# (u = the snapshot's lastUpdateId, no level), then the snapshot levels as
+# KIND_SNAPSHOT records (U = u = lastUpdateId); the diff levels that follow
+# are KIND_DIFF. REST snapshots carry no event time, so marker and snapshot
+# records get E = the fetch time in ms (ts_ns // 1e6): an events.bin written
+# from the ring keeps E on the exchange time axis and can be replayed in
+# real time. A consumer that sees a marker drops its book and rebuilds it
+# from the snapshot, as after a gap in the diff stream.
+#
+# Usage:
+#   python -m capture.shm_ring stat axdepth [--watch 1]
+#   python -m capture.shm_ring events axdepth --out live.events.bin
+
+import argparse
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"AXRING\x00\x00"
+VERSION = 2
+LINE = 64
+DEFAULT_CAPACITY = 1 << 20      # records (64 MiB)
+DEFAULT_CONSUMERS = 8
+PRICE_SCALE = 100_000_000
+QTY_SCALE = 100_000_000
+
+# slow-consumer hysteresis, as fractions of the capacity
+SLOW_ENTER = 0.5
+SLOW_LEAVE = 0.25
+
+# record kinds
+KIND_DIFF, KIND_EPOCH, KIND_SNAPSHOT = 0, 1, 2
+
+RECORD_DTYPE = np.dtype({
+    "names": ["side", "E", "U", "u", "price_i64", "qty_i64", "ts_ns", "kind", "epoch"],
+    "formats": ["u1", "<u8", "<u8", "<u8", "<i8", "<i8", "<u8", "u1", "<u4"],
+    "offsets": [0, 8, 16, 24, 32, 40, 48, 56, 60],
+    "itemsize": 64,
+})
+EVT0_FIELDS = ["side", "E", "U", "u", "price_i64", "qty_i64"]
+
+_HEADER = struct.Struct("<8sIIQIxxxxqqQ32s")   # 96 bytes, two lines
+
+# word indexes: producer line (after the header), consumer lines
+W_WRITE_SEQ, W_CLOSED, W_RESERVE_SEQ, W_EPOCH = 0, 1, 2, 3
+C_PID, C_READ_SEQ, C_OVERRUN_RECORDS, C_OVERRUN_EVENTS, C_SLOW, C_SLOW_EVENTS, C_MAX_LAG = range(7)
+C_PRODUCER_OWNED = [C_SLOW, C_SLOW_EVENTS, C_MAX_LAG]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing segment without handing it to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")  # otherwise unlinked when we exit
+    except Exception:
+        pass
+    return shm
+
+
+def scaled_int(s: str, digits: int = 8) -> int:
+    """Decimal string -> integer scaled by 10**digits, exactly (extra digits are truncated)."""
+    i, _, f = s.partition(".")
+    return int(i + f[:digits].ljust(digits, "0"))
+
+
+class RingView:
+    """
+    Header, cursors and record views of a segment. attach() opens one for
+    inspection only (no cursor slot); producer and consumer build on it.
+    """
+
+    @classmethod
+    def attach(cls, name: str) -> "RingView":
+        ring = cls.__new__(cls)
+        ring._map(_attach(name))
+        return ring
+
+    def _map(self, shm: shared_memory.SharedMemory) -> None:
+        self.shm = shm
+        magic, version, rec_size, self.capacity, self.max_consumers, self.price_scale, \
+            self.qty_scale, self.producer_pid, sym = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION or rec_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{shm.name}: not a depth ring (v{VERSION})")
+        self.symbol = sym.rstrip(b"\x00").decode("ascii")
+        self.mask = self.capacity - 1
+        self.prod = np.ndarray((8,), dtype="<u8", buffer=shm.buf, offset=2 * LINE)
+        self.cons = np.ndarray((self.max_consumers, 8), dtype="<u8", buffer=shm.buf, offset=3 * LINE)
+        self.data = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=shm.buf,
+                               offset=_data_offset(self.max_consumers))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_seq(self) -> int:
+        return int(self.prod[W_WRITE_SEQ])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.prod[W_CLOSED])
+
+    @property
+    def epoch(self) -> int:
+        return int(self.prod[W_EPOCH])
+
+    def consumer_stats(self) -> List[dict]:
+        """Active consumers, as seen in the header."""
+        w = self.write_seq
+        c = self.cons.copy()
+        return [{
+            "slot": k, "pid": int(c[k, C_PID]), "lag": w - int(c[k, C_READ_SEQ]),
+            "overrun_records": int(c[k, C_OVERRUN_RECORDS]), "overrun_events": int(c[k, C_OVERRUN_EVENTS]),
+            "slow": bool(c[k, C_SLOW]), "slow_events": int(c[k, C_SLOW_EVENTS]),
+            "max_lag": int(c[k, C_MAX_LAG]),
+        } for k in np.flatnonzero(c[:, C_PID]).tolist()]
+
+    def _release_views(self) -> None:
+        # the segment cannot be closed while numpy views still export its buffer
+        self.prod = self.cons = self.data = None
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self._release_views()
+        self.shm.close()
+        self.shm = None
+
+
+def _data_offset(max_consumers: int) -> int:
+    return 3 * LINE + LINE * max_consumers
+
+
+class RingProducer(RingView):
+    """
+    Creates the segment (replacing a stale one of the same name) and
+    publishes records. close() marks the stream closed for the consumers and
+    unlinks the segment.
+    """
+
+    def __init__(self, name: str, capacity: int = DEFAULT_CAPACITY,
+                 max_consumers: int = DEFAULT_CONSUMERS, symbol: str = "",
+                 price_scale: int = PRICE_SCALE, qty_scale: int = QTY_SCALE) -> None:
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        size = _data_offset(max_consumers) + capacity * RECORD_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:_data_offset(max_consumers)] = bytes(_data_offset(max_consumers))
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, RECORD_DTYPE.itemsize, capacity,
+                          max_consumers, price_scale, qty_scale, os.getpid(), symbol.encode("ascii"))
+        self._map(shm)
+        self._w = 0
+        self._epoch = 0
+        self._last_check = 0.0
+        self._pids = np.zeros(max_consumers, dtype="<u8")
+        self._slow_enter = int(capacity * SLOW_ENTER)
+        self._slow_leave = int(capacity * SLOW_LEAVE)
+        self._price_digits = len(str(price_scale)) - 1
+        self._qty_digits = len(str(qty_scale)) - 1
+
+    def publish(self, records: np.ndarray) -> None:
+        """Append records (RECORD_DTYPE array, at most capacity of them)."""
+        n = len(records)
+        if n > self.capacity:
+            raise ValueError(f"batch of {n} records exceeds the ring capacity ({self.capacity})")
+        self.prod[W_RESERVE_SEQ] = self._w + n
+        i = self._w & self.mask
+        k = min(n, self.capacity - i)
+        self.data[i:i + k] = records[:k]
+        if k < n:
+            self.data[:n - k] = records[k:]
+        self._w += n
+        self.prod[W_WRITE_SEQ] = self._w
+
+    def publish_levels(self, ts_ns: int, E: int, U: int, u: int,
+                       bids: Sequence[Sequence[str]], asks: Sequence[Sequence[str]]) -> int:
+        """One depthUpdate (Binance [price, qty] string pairs), bids then asks. Returns records published."""
+        levels = list(bids) + list(asks)
+        rec = np.zeros(len(levels), dtype=RECORD_DTYPE)
+        rec["side"][len(bids):] = 1
+        rec["E"] = E
+        rec["U"] = U
+        rec["u"] = u
+        rec["ts_ns"] = ts_ns
+        rec["epoch"] = self._epoch
+        rec["price_i64"] = [scaled_int(p, self._price_digits) for p, _ in levels]
+        rec["qty_i64"] = [scaled_int(q, self._qty_digits) for _, q in levels]
+        self.publish(rec)
+        return len(levels)
+
+    def publish_snapshot(self, ts_ns: int, snap: dict) -> int:
+        """
+        Open a new epoch with a REST snapshot ({"lastUpdateId", "bids",
+        "asks"}) fetched at ts_ns: one KIND_EPOCH marker, then the levels as
+        KIND_SNAPSHOT, all with E = ts_ns in ms. Returns records published.
+        """
+        self._epoch += 1
+        last_id = snap["lastUpdateId"]
+        e_ms = ts_ns // 1_000_000
+        bids, asks = snap.get("bids", []), snap.get("asks", [])
+        marker = np.zeros(1, dtype=RECORD_DTYPE)
+        marker["E"] = e_ms
+        marker["U"] = marker["u"] = last_id
+        marker["ts_ns"] = ts_ns
+        marker["kind"] = KIND_EPOCH
+        marker["epoch"] = self._epoch
+        self.prod[W_EPOCH] = self._epoch
+        self.publish(marker)
+        n = 1
+        # a full snapshot (5000 levels a side) fits easily, but keep batches within capacity
+        step = self.capacity
+        levels = [(0, lv) for lv in bids] + [(1, lv) for lv in asks]
+        for k in range(0, len(levels), step):
+            part = levels[k:k + step]
+            rec = np.zeros(len(part), dtype=RECORD_DTYPE)
+            rec["side"] = [side for side, _ in part]
+            rec["E"] = e_ms
+            rec["U"] = rec["u"] = last_id
+            rec["ts_ns"] = ts_ns
+            rec["kind"] = KIND_SNAPSHOT
+            rec["epoch"] = self._epoch
+            rec["price_i64"] = [scaled_int(p, self._price_digits) for _, (p, _) in part]
+            rec["qty_i64"] = [scaled_int(q, self._qty_digits) for _, (_, q) in part]
+            self.publish(rec)
+            n += len(part)
+        return n
+
+    def check_consumers(self, min_interval_s: float = 0.0) -> Optional[dict]:
+        """
+        Update the slow-consumer flags (lag above SLOW_ENTER of the capacity,
+        cleared below SLOW_LEAVE) and per-consumer max lag. Returns totals
+        for telemetry: consumers, max_lag, slow, new_slow_events,
+        overrun_records; None if the last check is less than min_interval_s
+        old (a check costs tens of microseconds, too much for every message).
+        """
+        now = time.monotonic()
+        if now - self._last_check < min_interval_s:
+            return None
+        self._last_check = now
+        c = self.cons
+        pids = c[:, C_PID].copy()
+        reused = pids != self._pids        # slot freed and claimed again: reset what we own there
+        if reused.any():
+            for w in C_PRODUCER_OWNED:
+                c[reused, w] = 0
+        self._pids = pids
+        active = pids != 0
+        lag = np.where(active, self._w - c[:, C_READ_SEQ].astype(np.int64), 0)
+        slow = c[:, C_SLOW] != 0
+        enter = active & ~slow & (lag >= self._slow_enter)
+        leave = slow & (~active | (lag < self._slow_leave))
+        if enter.any():
+            c[enter, C_SLOW_EVENTS] += 1
+            c[enter, C_SLOW] = 1
+        if leave.any():
+            c[leave, C_SLOW] = 0
+        c[:, C_MAX_LAG] = np.maximum(c[:, C_MAX_LAG], lag.astype(np.uint64))
+        return {
+            "consumers": int(active.sum()),
+            "max_lag": int(lag.max()) if len(lag) else 0,
+            "slow": int((c[:, C_SLOW] != 0).sum()),
+            "new_slow_events": int(enter.sum()),
+            "overrun_records": int(c[active, C_OVERRUN_RECORDS].sum()),
+        }
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self.prod[W_CLOSED] = 1
+        self._release_views()
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class RingConsumer(RingView):
+    """
+    Attaches to a producer's segment and claims a cursor slot (slot=None:
+    the first free one; two consumers starting at the same instant should
+    pass explicit slots). start="latest" reads only what is published from
+    now on, "oldest" begins with everything still in the ring.
+    """
+
+    def __init__(self, name: str, slot: Optional[int] = None, start: str = "latest") -> None:
+        self._map(_attach(name))
+        if slot is None:
+            free = np.flatnonzero(self.cons[:, C_PID] == 0)
+            if len(free) == 0:
+                raise RuntimeError(f"{name}: all {self.max_consumers} consumer slots are taken")
+            slot = int(free[0])
+        elif self.cons[slot, C_PID] != 0:
+            raise RuntimeError(f"{name}: consumer slot {slot} is taken by pid {int(self.cons[slot, C_PID])}")
+        self.slot = slot
+        self.cur = self.cons[slot]
+        w = self.write_seq
+        self._r = w if start == "latest" else max(0, w - self.capacity)
+        # only the consumer-owned words: slow flags and max_lag belong to the producer
+        self.cur[C_OVERRUN_RECORDS] = 0
+        self.cur[C_OVERRUN_EVENTS] = 0
+        self.cur[C_READ_SEQ] = self._r
+        self.cur[C_PID] = os.getpid()
+        self._pending = 0
+
+    @property
+    def read_seq(self) -> int:
+        return self._r
+
+    def available(self) -> int:
+        return self.write_seq - self._r
+
+    def _overrun(self, lost: int) -> None:
+        self.cur[C_OVERRUN_RECORDS] += lost
+        self.cur[C_OVERRUN_EVENTS] += 1
+
+    def view(self, max_records: Optional[int] = None) -> np.ndarray:
+        """
+        Zero-copy view of unread records (up to the end of the ring, so
+        possibly fewer than available()). Valid until the producer laps it:
+        call release() when done, it tells how many were overwritten.
+        """
+        w = self.write_seq
+        oldest = int(self.prod[W_RESERVE_SEQ]) - self.capacity
+        if self._r < oldest:
+            self._overrun(oldest - self._r)
+            self._r = oldest
+        i = self._r & self.mask
+        n = min(w - self._r, self.capacity - i)
+        if max_records is not None:
+            n = min(n, max_records)
+        self._pending = n
+        return self.data[i:i + n]
+
+    def release(self, n: Optional[int] = None) -> int:
+        """
+        Advance past n records of the last view (default: all). Returns how
+        many of them the producer may have overwritten while they were in
+        use (counted as overrun).
+        """
+        n = self._pending if n is None else n
+        torn = min(max(int(self.prod[W_RESERVE_SEQ]) - self.capacity - self._r, 0), n)
+        if torn:
+            self._overrun(torn)
+        self._r += n
+        self._pending = 0
+        self.cur[C_READ_SEQ] = self._r
+        return torn
+
+    def read(self, max_records: Optional[int] = None) -> np.ndarray:
+        """Copy out unread records (possibly none); never returns overwritten data."""
+        out = self.view(max_records).copy()
+        torn = self.release()
+        return out[torn:]
+
+    def wait(self, timeout: Optional[float] = None, spin_s: float = 0.001) -> bool:
+        """
+        Wait for unread records: spin (sleep(0)) for spin_s, then poll every
+        100 us. Returns False on timeout or when the producer closed with
+        nothing left to read.
+        """
+        t0 = time.monotonic()
+        while self.write_seq == self._r:
+            if self.closed:
+                return False
+            dt = time.monotonic() - t0
+            if timeout is not None and dt >= timeout:
+                return False
+            time.sleep(0 if dt < spin_s else 0.0001)
+        return True
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self.cur[C_PID] = 0
+        self.cur = None
+        super().close()
+
+
+# --------------------------------------------------------------------------
+# CLI: inspection and a live events.bin writer
+
+PHASE3_TOOLS = Path(__file__).resolve().parents[2] / "stage7_ps_pl_stream" / "phase3_demo_ready" / "tools"
+
+
+def cmd_stat(args: argparse.Namespace) -> None:
+    ring = RingView.attach(args.name)
+    try:
+        while True:
+            print(f"[ring] {ring.name} {ring.symbol}: write_seq={ring.write_seq} capacity={ring.capacity} "
+                  f"epoch={ring.epoch} producer_pid={ring.producer_pid}{' closed' if ring.closed else ''}")
+            for s in ring.consumer_stats():
+                print(f"  slot {s['slot']} pid {s['pid']}: lag={s['lag']} max_lag={s['max_lag']} "
+                      f"overrun={s['overrun_records']} ({s['overrun_events']} events) "
+                      f"slow={'yes' if s['slow'] else 'no'} ({s['slow_events']} events)")
+            if not args.watch or ring.closed:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+def cmd_events(args: argparse.Namespace) -> None:
+    if str(PHASE3_TOOLS) not in sys.path:
+        sys.path.append(str(PHASE3_TOOLS))
+    from record_codecs import empty, pack_evt0_header
+
+    ring = RingConsumer(args.name, slot=args.slot, start=args.start)
+    n = 0
+    try:
+        with open(args.out, "wb") as fh:
+            fh.write(pack_evt0_header(ring.price_scale, ring.qty_scale, ring.symbol))
+            print(f"[ring] {ring.name} slot {ring.slot} -> {args.out}")
+            while ring.wait(timeout=1.0) or not ring.closed:
+                rec = ring.view()
+                if len(rec) == 0:
+                    continue
+                out = empty("evt0", len(rec))
+                for f in EVT0_FIELDS:
+                    out[f] = rec[f]
+                kind = rec["kind"].copy()
+                torn = ring.release()
+                out, kind = out[torn:], kind[torn:]
+                for k in np.flatnonzero(kind == KIND_EPOCH).tolist():
+                    print(f"[ring] new epoch: snapshot lastUpdateId={int(out['u'][k])}")
+                # snapshot levels are absolute, like diff levels; only the markers are dropped
+                out = out[kind != KIND_EPOCH]
+                fh.write(out.tobytes())
+                n += len(out)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[ring] wrote {n} records, overrun {int(ring.cur[C_OVERRUN_RECORDS])} records")
+        ring.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Shared-memory depth ring: inspect, or consume into events.bin.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    st = sub.add_parser("stat", help="print the ring and consumer cursors")
+    st.add_argument("name")
+    st.add_argument("--watch", type=float, default=0.0, help="repeat every N seconds")
+    ev = sub.add_parser("events", help="append live records to an events.bin (v0)")
+    ev.add_argument("name")
+    ev.add_argument("--out", required=True)
+    ev.add_argument("--slot", type=int, default=None)
+    ev.add_argument("--start", choices=["latest", "oldest"], default="latest")
+    args = ap.parse_args()
+    {"stat": cmd_stat, "events": cmd_events}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
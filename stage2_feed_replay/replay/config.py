@@ -15,3 +15,7 @@ UART_RTSCTS = False
 # Replay behaviour
 DEFAULT_MODE = "realtime"  # "realtime" or "accelerated"
 DEFAULT_SPEED = 5.0        # acceleration factor when mode == "accelerated"
+
+# Clock-sync records for latency runs (see replay/sync_records.py).
+# 0 disables them; --sync-every overrides.
+SYNC_EVERY_S = 0.0
@@ -2,10 +2,9 @@
 
 import argparse
 import os
-import struct
 import time
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Iterable, Optional, Tuple
 
 import serial
 from serial.tools import list_ports
@@ -17,13 +16,17 @@ if __package__ in (None, ""):
     this_dir = pathlib.Path(__file__).resolve().parent
     if str(this_dir) not in sys.path:
         sys.path.insert(0, str(this_dir))
+    if str(this_dir.parent) not in sys.path:
+        sys.path.insert(0, str(this_dir.parent))
     from config import (
         UART_PORT,
         UART_BAUDRATE,
         UART_RTSCTS,
         DEFAULT_MODE,
         DEFAULT_SPEED,
+        SYNC_EVERY_S,
     )
+    from sync_records import RECORD_STRUCT, SyncSender
 else:
     from .config import (
         UART_PORT,
@@ -31,16 +34,22 @@ else:
         UART_RTSCTS,
         DEFAULT_MODE,
         DEFAULT_SPEED,
+        SYNC_EVERY_S,
     )
+    from .sync_records import RECORD_STRUCT, SyncSender
 
-# 32-byte record: <QQBffxxxxxxx
-# ts_ns:   uint64
-# updateId:uint64
-# side:    uint8  (0=bid,1=ask)
-# price:   float32
-# qty:     float32
-# padding: 7 bytes
-RECORD_STRUCT = struct.Struct("<QQBffxxxxxxx")  # 32 bytes
+from telemetry import Telemetry, add_cli_args as add_telemetry_args
+
+# events.bin (stage7 phase3, EVT0BIN/EVT1BIN) is replayed through the shared
+# record codecs (imported on demand, they need numpy)
+PHASE3_TOOLS = Path(__file__).resolve().parents[2] / "stage7_ps_pl_stream" / "phase3_demo_ready" / "tools"
+EVENTS_MAGICS = (b"EVT0BIN\x00", b"EVT1BIN\x00")
+
+
+def is_events_bin(path: Path) -> bool:
+    """True if path starts with an events.bin v0/v1 magic."""
+    with path.open("rb") as fh:
+        return fh.read(8) in EVENTS_MAGICS
 
 
 def parse_log_lines(path: Path) -> Iterable[Tuple[int, int, int, float, float]]:
@@ -75,6 +84,54 @@ def parse_log_lines(path: Path) -> Iterable[Tuple[int, int, int, float, float]]:
             yield ts_ns, update_id, side_code, price, qty
 
 
+def open_serial(port: str, baudrate: int, rtscts: bool) -> Optional[serial.Serial]:
+    """Open the UART, or list the available ports and return None."""
+    try:
+        return serial.Serial(
+            port=port,
+            baudrate=baudrate,
+            timeout=1,
+            rtscts=rtscts,
+        )
+    except serial.SerialException as e:
+        print(f"[replay] Failed to open UART '{port}': {e}")
+        ports = list(list_ports.comports())
+        if ports:
+            print("[replay] Available serial ports:")
+            for p in ports:
+                print(f"  - {p.device} ({p.description})")
+        else:
+            print("[replay] No serial ports detected. Is your USB-UART connected?")
+        return None
+
+
+class ReplayMetrics:
+    """The replay's metrics, shared by the log and events.bin paths."""
+
+    # ser.out_waiting is an ioctl; per-record sends sample it this often
+    OUT_WAITING_EVERY = 64
+
+    def __init__(self, tm: Telemetry) -> None:
+        self.records = tm.counter("records_total", "records written to the UART")
+        self.bytes = tm.counter("bytes_total", "bytes written to the UART")
+        self.out_waiting = tm.gauge("uart_out_waiting_bytes", "bytes queued in the UART driver")
+        self.write_s = tm.histogram("write_seconds", "time spent in ser.write")
+        self.lateness_s = tm.histogram("send_lateness_seconds", "send time minus scheduled time")
+        self.sync = tm.counter("sync_records_total", "clock-sync records written")
+
+    def send_sync(self, sync: SyncSender, ser, final: bool = False) -> None:
+        n = sync.flush(ser) if final else sync.poll(ser)
+        if n:
+            self.sync.inc()
+            self.bytes.inc(n)
+
+    def sample_out_waiting(self, ser) -> None:
+        try:
+            self.out_waiting.set(ser.out_waiting)
+        except (AttributeError, OSError, NotImplementedError):
+            pass
+
+
 def replay_uart(
     log_path: Path,
     mode: str,
@@ -82,6 +139,9 @@ def replay_uart(
     port: str,
     baudrate: int,
     rtscts: bool,
+    tm: Optional[Telemetry] = None,
+    sync_every: float = 0.0,
+    stamp_send: bool = False,
 ) -> None:
     """
     Replay records from log_path over UART.
@@ -91,33 +151,30 @@ def replay_uart(
         sleep for the original delta between consecutive ts_ns
     - accelerated:
         sleep for delta / speed
+
+    send_lateness_seconds records how far each sleep overshot its target.
+
+    sync_every > 0 interleaves clock-sync records (replay/sync_records.py);
+    stamp_send replaces each record's ts_ns with time.time_ns() at write, so
+    latency_measure sees send-to-PL time for the data records too (pacing
+    still follows the logged timestamps).
     """
+    metrics = ReplayMetrics(tm or Telemetry("replay"))
+    sync = SyncSender(sync_every)
     records = list(parse_log_lines(log_path))
     if not records:
         print("[replay] No records to replay.")
         return
 
-    try:
-        ser = serial.Serial(
-            port=port,
-            baudrate=baudrate,
-            timeout=1,
-            rtscts=rtscts,
-        )
-    except serial.SerialException as e:
-        print(f"[replay] Failed to open UART '{port}': {e}")
-        ports = list(list_ports.comports())
-        if ports:
-            print("[replay] Available serial ports:")
-            for p in ports:
-                print(f"  - {p.device} ({p.description})")
-        else:
-            print("[replay] No serial ports detected. Is your USB-UART connected?")
+    ser = open_serial(port, baudrate, rtscts)
+    if ser is None:
         return
 
     print(f"[replay] Opened UART {port} at {baudrate} baud")
     print(f"[replay] Records to send: {len(records)}")
     print(f"[replay] Mode={mode}, speed={speed}")
+    if sync_every > 0 or stamp_send:
+        print(f"[replay] sync every {sync_every:g}s, stamp_send={stamp_send}")
 
     prev_ts_ns = None
     start_wall = time.time()
@@ -138,13 +195,16 @@ def replay_uart(
                     sleep_s = 0.0
 
                 if sleep_s > 0:
+                    t_sleep = time.perf_counter()
                     time.sleep(sleep_s)
+                    metrics.lateness_s.observe(time.perf_counter() - t_sleep - sleep_s)
 
             prev_ts_ns = ts_ns
+            metrics.send_sync(sync, ser)
 
             # Pack record into 32 bytes (price/qty cast to float32 by struct)
             payload = RECORD_STRUCT.pack(
-                ts_ns,
+                time.time_ns() if stamp_send else ts_ns,
                 update_id,
                 side_code,
                 float(price),
@@ -152,7 +212,13 @@ def replay_uart(
             )
 
             # Send over UART
+            t_write = time.perf_counter()
             ser.write(payload)
+            metrics.write_s.observe(time.perf_counter() - t_write)
+            metrics.records.inc()
+            metrics.bytes.inc(len(payload))
+            if idx % ReplayMetrics.OUT_WAITING_EVERY == 0:
+                metrics.sample_out_waiting(ser)
 
             if (idx + 1) % 1000 == 0:
                 elapsed = time.time() - start_wall
@@ -160,19 +226,141 @@ def replay_uart(
                 print(
                     f"[replay] sent={idx + 1}/{len(records)} ({rate:.0f} rec/s)"
                 )
+        metrics.send_sync(sync, ser, final=True)
+    finally:
+        ser.close()
+        print("[replay] UART closed.")
+
+
+def load_events_bin_payload(events_path: Path, symbol: Optional[str] = None):
+    """
+    Map an events.bin (v0 / v1) and transcode all records to 32-byte UART
+    records in one pass.
+
+    Returns (payload bytes, event_time_ms per record as a numpy array). For v1
+    files, `symbol` keeps only that symbol's records.
+    """
+    if str(PHASE3_TOOLS) not in sys.path:
+        sys.path.append(str(PHASE3_TOOLS))
+    import numpy as np
+    from record_codecs import EventsFile, encode, evt_to_uart32, get_codec
+
+    assert RECORD_STRUCT.format == get_codec("uart32").struct_fmt
+
+    with EventsFile(events_path) as ev:
+        hdr = ev.header
+        records = ev.records
+        if symbol is not None:
+            if symbol not in hdr.symbols:
+                raise ValueError(f"symbol {symbol} not in {events_path} ({', '.join(hdr.symbols)})")
+            if hdr.version == 1:
+                records = records[records["symbol_id"] == hdr.symbols.index(symbol)]
+        elif len(hdr.symbols) > 1:
+            print(f"[replay] {events_path} holds {len(hdr.symbols)} symbols; "
+                  f"sending all of them (use --symbol to pick one)")
+        uart = evt_to_uart32(records, hdr.price_scale, hdr.qty_scale)
+        event_ms = np.array(records["E"], dtype=np.int64)
+        del records
+    return encode("uart32", uart), event_ms
+
+
+def replay_events_bin(
+    events_path: Path,
+    mode: str,
+    speed: float,
+    port: str,
+    baudrate: int,
+    rtscts: bool,
+    symbol: Optional[str] = None,
+    tm: Optional[Telemetry] = None,
+    sync_every: float = 0.0,
+    stamp_send: bool = False,
+) -> None:
+    """
+    Replay an events.bin over UART, paced on event_time_ms (E).
+
+    All records sharing one E (one depthUpdate message) go out in a single
+    write. Each group is sent at its offset from the first E (divided by
+    speed in accelerated mode), measured from the replay start, so sleep
+    overshoot does not accumulate. send_lateness_seconds is the wall time of
+    each write minus its scheduled time.
+
+    sync_every / stamp_send as for replay_uart(); a stamped group gets one
+    time.time_ns() for all its records.
+    """
+    import numpy as np
+
+    metrics = ReplayMetrics(tm or Telemetry("replay"))
+    sync = SyncSender(sync_every)
+
+    payload, event_ms = load_events_bin_payload(events_path, symbol)
+    n = len(event_ms)
+    if n == 0:
+        print("[replay] No records to replay.")
+        return
+
+    # group boundaries: first record of every new E
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(event_ms)) + 1, [n]))
+    offsets_s = (event_ms[starts[:-1]] - event_ms[0]) / 1e3
+    if mode == "accelerated":
+        offsets_s = offsets_s / speed if speed > 0 else np.zeros_like(offsets_s)
+
+    ser = open_serial(port, baudrate, rtscts)
+    if ser is None:
+        return
+
+    record_size = RECORD_STRUCT.size
+    print(f"[replay] Opened UART {port} at {baudrate} baud")
+    print(f"[replay] Records to send: {n} in {len(starts) - 1} event-time groups")
+    print(f"[replay] Mode={mode}, speed={speed}")
+    if sync_every > 0 or stamp_send:
+        print(f"[replay] sync every {sync_every:g}s, stamp_send={stamp_send}")
+
+    if stamp_send:
+        payload = bytearray(payload)
+        ts_field = np.frombuffer(payload, dtype="<u8").reshape(-1, record_size // 8)[:, 0]
+    view = memoryview(payload)
+    start_wall = time.monotonic()
+    next_report = 1000
+
+    try:
+        for g in range(len(starts) - 1):
+            sleep_s = offsets_s[g] - (time.monotonic() - start_wall)
+            if sleep_s > 0:
+                time.sleep(sleep_s)
+
+            metrics.send_sync(sync, ser)
+            lo, hi = int(starts[g]), int(starts[g + 1])
+            if stamp_send:
+                ts_field[lo:hi] = time.time_ns()
+            t_write = time.monotonic()
+            metrics.lateness_s.observe(t_write - start_wall - offsets_s[g])
+            ser.write(view[lo * record_size:hi * record_size])
+            metrics.write_s.observe(time.monotonic() - t_write)
+            metrics.records.inc(hi - lo)
+            metrics.bytes.inc((hi - lo) * record_size)
+            metrics.sample_out_waiting(ser)
+
+            if hi >= next_report:
+                elapsed = time.monotonic() - start_wall
+                rate = hi / elapsed if elapsed > 0 else 0.0
+                print(f"[replay] sent={hi}/{n} ({rate:.0f} rec/s)")
+                next_report = (hi // 1000 + 1) * 1000
+        metrics.send_sync(sync, ser, final=True)
     finally:
+        view.release()
         ser.close()
         print("[replay] UART closed.")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(
-        description="Replay Binance depth log over UART (32B records)."
+        description="Replay Binance depth log or events.bin over UART (32B records)."
     )
     parser.add_argument(
         "logfile",
         type=str,
-        help="Path to binance_depth.log",
+        help="Path to binance_depth.log or a stage7 events.bin (EVT0BIN/EVT1BIN)",
     )
     parser.add_argument(
         "--mode",
@@ -204,6 +392,24 @@ def main() -> None:
         action="store_true",
         help="Enable RTS/CTS flow control",
     )
+    parser.add_argument(
+        "--symbol",
+        type=str,
+        default=None,
+        help="events.bin v1 only: replay just this symbol",
+    )
+    parser.add_argument(
+        "--sync-every",
+        type=float,
+        default=SYNC_EVERY_S,
+        help="Send a clock-sync record at most every N seconds (0 = off)",
+    )
+    parser.add_argument(
+        "--stamp-send",
+        action="store_true",
+        help="Overwrite ts_ns with the host time at write (latency runs)",
+    )
+    add_telemetry_args(parser)
 
     args = parser.parse_args()
     log_path = Path(args.logfile)
@@ -225,14 +431,36 @@ def main() -> None:
     )
     rtscts = args.rtscts or (os.getenv("UART_RTSCTS", str(UART_RTSCTS)).lower() in ("1", "true", "yes"))
 
-    replay_uart(
-        log_path=log_path,
-        mode=args.mode,
-        speed=args.speed,
-        port=port,
-        baudrate=baud,
-        rtscts=rtscts,
-    )
+    tm = Telemetry.from_args("replay", args)
+    try:
+        if is_events_bin(log_path):
+            replay_events_bin(
+                events_path=log_path,
+                mode=args.mode,
+                speed=args.speed,
+                port=port,
+                baudrate=baud,
+                rtscts=rtscts,
+                symbol=args.symbol,
+                tm=tm,
+                sync_every=args.sync_every,
+                stamp_send=args.stamp_send,
+            )
+            return
+
+        replay_uart(
+            log_path=log_path,
+            mode=args.mode,
+            speed=args.speed,
+            port=port,
+            baudrate=baud,
+            rtscts=rtscts,
+            tm=tm,
+            sync_every=args.sync_every,
+            stamp_send=args.stamp_send,
+        )
+    finally:
+        tm.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+# replay/sync_records.py
+#
+# Clock-sync records for latency runs.
+#
+# latency_measure computes pl_now - ts_ns: a free-running PL cycle counter
+# minus a host time.time_ns() value, two clocks with unrelated epochs and
+# rates. To relate them, the replay drivers can interleave sync records every
+# --sync-every seconds: ordinary 32-byte records whose ts_ns is taken right
+# before ser.write(), tagged so analysis can tell them apart from market data:
+#
+#   update_id = SYNC_UID_FLAG | seq     (bit 55 set; Binance ids never get there)
+#   side      = SYNC_SIDE (0xFF)
+#   price = qty = 0.0
+#
+# The PL decodes side from bit 0 only, so a sync record goes through the
+# pipeline as an ask delete at price 0 (a level that never exists, so the
+# book does not change). It still shows up as an event: analysis filters on
+# SYNC_UID_FLAG (clock_sync.is_sync), as depth_stage4_compare.py and
+# pl_latency_report.py do.
+#
+# Each one captured by the ILA gives a (host ns, PL ticks) pair; see
+# stage4_depth/sw_tools/clock_sync.py for the fit.
+
+import struct
+import time
+
+# bit 55: the top bit depth_ev_packed keeps of update_id (56 bits after the
+# header byte), so the tag survives in every probe, not just update_id[63:0]
+SYNC_UID_FLAG = 1 << 55
+SYNC_SIDE = 0xFF
+
+# 32-byte record: <QQBffxxxxxxx
+# ts_ns:   uint64
+# updateId:uint64
+# side:    uint8  (0=bid,1=ask)
+# price:   float32
+# qty:     float32
+# padding: 7 bytes
+# The stage2 replay/capture path runs without numpy, so this is a plain
+# struct; it must stay equal to record_codecs.CODECS["uart32"] (checked when
+# the codecs are loaded, see replay_uart.load_events_bin_payload, and in the
+# stage4 sw_tools tests).
+RECORD_STRUCT = struct.Struct("<QQBffxxxxxxx")  # 32 bytes
+
+
+def sync_record(seq: int) -> bytes:
+    """One sync record, stamped with the current host time."""
+    return RECORD_STRUCT.pack(time.time_ns(), SYNC_UID_FLAG | seq, SYNC_SIDE, 0.0, 0.0)
+
+
+class SyncSender:
+    """
+    Writes a sync record when at least every_s seconds have passed since the
+    previous one (every_s <= 0: never). Call poll() right before each data
+    write, and flush() once at the end so the last stretch is bracketed too.
+    """
+
+    def __init__(self, every_s: float) -> None:
+        self.every_s = every_s
+        self.sent = 0
+        self._next = time.monotonic()
+
+    def poll(self, ser) -> int:
+        """Send a sync record if one is due. Returns the bytes written."""
+        if self.every_s <= 0 or time.monotonic() < self._next:
+            return 0
+        return self._send(ser)
+
+    def flush(self, ser) -> int:
+        return self._send(ser) if self.every_s > 0 else 0
+
+    def _send(self, ser) -> int:
+        rec = sync_record(self.sent)
+        ser.write(rec)
+        self.sent += 1
+        self._next = time.monotonic() + self.every_s
+        return len(rec)
@@ -1,5 +1,4 @@
 # send_known_record.py
-import struct
 import serial
 import sys
 import time
@@ -10,7 +9,7 @@ if len(sys.argv) != 2:
 
 port = sys.argv[1]
 
-RECORD_STRUCT = struct.Struct("<QQBffxxxxxxx")
+from replay.sync_records import RECORD_STRUCT
 
 ts_ns     = 1234567890123456789
 update_id = 9876543210
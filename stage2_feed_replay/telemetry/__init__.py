@@ -0,0 +1,138 @@
+# telemetry/__init__.py
+#
+# Lightweight metrics for the long-running capture / replay processes:
+# counters, gauges and log-bucketed histograms, exported as periodic JSON
+# lines and / or a Prometheus /metrics endpoint on a local port, plus an
+# opt-in sampling profiler. Standard library only.
+#
+# Usage from a script:
+#
+#   tm = Telemetry.from_args("replay", args)      # after add_cli_args(parser)
+#   sent = tm.counter("records_total", "records written to the UART")
+#   ...
+#   tm.close()
+
+import argparse
+import os
+from typing import Optional
+
+from .export import JsonlExporter, PrometheusServer, render_prometheus
+from .metrics import BUCKETS_PER_OCTAVE, Counter, Gauge, Histogram, Registry
+from .profiler import SamplingProfiler
+
+__all__ = [
+    "BUCKETS_PER_OCTAVE",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "JsonlExporter",
+    "PrometheusServer",
+    "Registry",
+    "SamplingProfiler",
+    "Telemetry",
+    "add_cli_args",
+    "render_prometheus",
+    "ws_queue_depth",
+]
+
+DEFAULT_INTERVAL_S = 5.0
+
+
+class Telemetry:
+    """
+    One process's registry plus whichever exporters were asked for. With no
+    exporter enabled the metrics are still kept (the cost is an attribute
+    update per event) and close() is a no-op apart from the profiler.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        jsonl: Optional[str] = None,
+        port: Optional[int] = None,
+        interval_s: float = DEFAULT_INTERVAL_S,
+        profile: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.registry = Registry(prefix=name)
+        self.jsonl = JsonlExporter(self.registry, jsonl, interval_s, {"process": name}) if jsonl else None
+        self.http = PrometheusServer(self.registry, port) if port is not None else None
+        self.profiler = SamplingProfiler(profile) if profile else None
+
+        if self.http is not None:
+            print(f"[{name}] metrics on http://127.0.0.1:{self.http.port}/metrics")
+        if self.jsonl is not None:
+            print(f"[{name}] metrics every {interval_s:g}s -> {jsonl}")
+        if self.profiler is not None:
+            print(f"[{name}] sampling profiler -> {profile}")
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self.registry.counter(name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self.registry.gauge(name, help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self.registry.histogram(name, help)
+
+    def close(self) -> None:
+        if self.profiler is not None:
+            top = self.profiler.close()
+            print(f"[{self.name}] profile: {self.profiler.samples} samples -> {self.profiler.out_path}")
+            for frame, n in top[:10]:
+                print(f"  {n:7d}  {frame}")
+        if self.jsonl is not None:
+            self.jsonl.close()
+        if self.http is not None:
+            self.http.close()
+
+    @classmethod
+    def from_args(cls, name: str, args: argparse.Namespace) -> "Telemetry":
+        return cls(
+            name,
+            jsonl=args.metrics_jsonl,
+            port=args.metrics_port,
+            interval_s=args.metrics_interval,
+            profile=args.profile,
+        )
+
+    @classmethod
+    def from_env(cls, name: str, jsonl: Optional[str] = None, port: Optional[int] = None,
+                 interval_s: float = DEFAULT_INTERVAL_S, profile: Optional[str] = None) -> "Telemetry":
+        """
+        For scripts driven by a config module: the arguments are the config
+        defaults, AX_METRICS_JSONL / AX_METRICS_PORT / AX_METRICS_INTERVAL /
+        AX_PROFILE override them.
+        """
+        port_env = os.getenv("AX_METRICS_PORT")
+        return cls(
+            name,
+            jsonl=os.getenv("AX_METRICS_JSONL", jsonl) or None,
+            port=int(port_env) if port_env else port,
+            interval_s=float(os.getenv("AX_METRICS_INTERVAL", interval_s)),
+            profile=os.getenv("AX_PROFILE", profile) or None,
+        )
+
+
+def add_cli_args(parser: argparse.ArgumentParser) -> None:
+    """--metrics-jsonl / --metrics-port / --metrics-interval / --profile."""
+    g = parser.add_argument_group("telemetry")
+    g.add_argument("--metrics-jsonl", type=str, default=os.getenv("AX_METRICS_JSONL"),
+                   help="append a metrics snapshot as one JSON line every interval ('-' = stdout)")
+    g.add_argument("--metrics-port", type=int,
+                   default=int(os.environ["AX_METRICS_PORT"]) if os.getenv("AX_METRICS_PORT") else None,
+                   help="serve Prometheus text metrics on 127.0.0.1:PORT/metrics (0 = any free port)")
+    g.add_argument("--metrics-interval", type=float,
+                   default=float(os.getenv("AX_METRICS_INTERVAL", DEFAULT_INTERVAL_S)),
+                   help="seconds between JSON lines")
+    g.add_argument("--profile", type=str, default=os.getenv("AX_PROFILE"),
+                   help="run the sampling profiler, write collapsed stacks to this file")
+
+
+def ws_queue_depth(ws) -> Optional[int]:
+    """Messages a websockets connection received but not yet consumed, if it exposes them."""
+    messages = getattr(ws, "messages", None)  # websockets legacy protocol: deque
+    try:
+        return len(messages) if messages is not None else None
+    except TypeError:
+        return None
@@ -0,0 +1,125 @@
+# telemetry/export.py
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, TextIO
+
+from .metrics import Registry
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render_prometheus(registry: Registry) -> str:
+    """Registry in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for m in registry:
+        if m.help:
+            lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        if m.kind in ("counter", "gauge"):
+            lines.append(f"{m.name} {_fmt(m.value)}")
+            continue
+        for le, n in m.cumulative():
+            lines.append(f'{m.name}_bucket{{le="{_fmt(le)}"}} {n}')
+        lines.append(f'{m.name}_bucket{{le="+Inf"}} {m.count}')
+        lines.append(f"{m.name}_sum {_fmt(m.sum)}")
+        lines.append(f"{m.name}_count {m.count}")
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusServer:
+    """
+    Serves GET /metrics on host:port from a daemon thread. Binds to
+    localhost by default; scrape it or curl it while a capture runs.
+    """
+
+    def __init__(self, registry: Registry, port: int, host: str = "127.0.0.1") -> None:
+        reg = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = render_prometheus(reg).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.1},
+                                        name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JsonlExporter:
+    """
+    Appends one JSON line per interval: the registry snapshot plus per-second
+    rates of every counter over the interval (msgs/s, bytes/s, ...). close()
+    writes a final line with "final": true.
+    """
+
+    def __init__(self, registry: Registry, path: str, interval_s: float = 5.0,
+                 labels: Optional[Dict[str, str]] = None) -> None:
+        self.registry = registry
+        self.interval_s = interval_s
+        self.labels = labels or {}
+        self._own = path != "-"
+        self._fh: TextIO = open(path, "a", encoding="utf-8") if self._own else sys.stdout
+        self._prev: Dict[str, float] = {}
+        self._prev_t = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-jsonl", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.write()
+
+    def write(self, final: bool = False) -> None:
+        now = time.monotonic()
+        dt = now - self._prev_t
+        snap = self.registry.snapshot()
+        rates = {}
+        for name, v in snap["counters"].items():
+            rates[name] = (v - self._prev.get(name, 0)) / dt if dt > 0 else 0.0
+        self._prev = dict(snap["counters"])
+        self._prev_t = now
+
+        rec = {
+            "ts": round(time.time(), 3),
+            "uptime_s": round(time.time() - self.registry.started, 3),
+            **self.labels,
+            "interval_s": round(dt, 3),
+            "rates": rates,
+            **snap,
+        }
+        if final:
+            rec["final"] = True
+        self._fh.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.write(final=True)
+        if self._own:
+            self._fh.close()
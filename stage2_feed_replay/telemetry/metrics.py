@@ -0,0 +1,213 @@
+# telemetry/metrics.py
+
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Histogram resolution: bucket i covers [2^(i/4), 2^((i+1)/4)), i.e. four
+# buckets per doubling, so any quantile read back is within ~9% of the truth.
+BUCKETS_PER_OCTAVE = 4
+
+
+def bucket_index(value: float) -> int:
+    """Log bucket of a positive value."""
+    return math.floor(math.log2(value) * BUCKETS_PER_OCTAVE)
+
+
+def bucket_upper(index: int) -> float:
+    """Exclusive upper bound of bucket `index`."""
+    return 2.0 ** ((index + 1) / BUCKETS_PER_OCTAVE)
+
+
+class Counter:
+    """Monotonic count (messages, records, bytes)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+
+class Gauge:
+    """Last-written value (queue depth, last update id)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self.value: float = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    """
+    Log-bucketed distribution of non-negative values (latencies in seconds).
+
+    Only populated buckets are stored, so the range is unbounded and memory is
+    proportional to the spread of the data. Values <= 0 land in a separate
+    zero bucket. Two histograms merge by adding bucket counts.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "") -> None:
+        self.name = name
+        self.help = help
+        self.buckets: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            if value > 0:
+                i = bucket_index(value)
+                self.buckets[i] = self.buckets.get(i, 0) + 1
+            else:
+                self.zero += 1
+            self.count += 1
+            self.sum += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed perf_counter seconds."""
+        return _Timer(self)
+
+    def merge(self, other: "Histogram") -> None:
+        with self._lock:
+            for i, n in other.buckets.items():
+                self.buckets[i] = self.buckets.get(i, 0) + n
+            self.zero += other.zero
+            self.count += other.count
+            self.sum += other.sum
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate of the q-quantile (0 <= q <= 1): the geometric centre of the
+        bucket holding it, clamped to the observed min / max.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q * (self.count - 1)
+            seen = self.zero
+            if rank < seen:
+                return max(self.min, 0.0)
+            for i in sorted(self.buckets):
+                seen += self.buckets[i]
+                if rank < seen:
+                    mid = 2.0 ** ((i + 0.5) / BUCKETS_PER_OCTAVE)
+                    return min(max(mid, self.min), self.max)
+            return self.max
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        (upper bound, count of values below it) for every bucket from the
+        lowest to the highest populated one, zero bucket first (bound 0).
+        """
+        with self._lock:
+            out = []
+            total = self.zero
+            if self.zero:
+                out.append((0.0, total))
+            if self.buckets:
+                lo, hi = min(self.buckets), max(self.buckets)
+                for i in range(lo, hi + 1):
+                    total += self.buckets.get(i, 0)
+                    out.append((bucket_upper(i), total))
+            return out
+
+    def summary(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "p50": self.quantile(0.50),
+            "p90": self.quantile(0.90),
+            "p99": self.quantile(0.99),
+            "p999": self.quantile(0.999),
+            "max": self.max,
+        }
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist: Histogram) -> None:
+        self.hist = hist
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.hist.observe(time.perf_counter() - self.t0)
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class Registry:
+    """
+    Named metrics of one process. counter() / gauge() / histogram() return
+    the existing metric when the name is already registered.
+    """
+
+    def __init__(self, prefix: str = "") -> None:
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+        self.started = time.time()
+
+    def _get(self, cls, name: str, help: str) -> Metric:
+        full = f"{self.prefix}_{name}" if self.prefix else name
+        m = self.metrics.get(full)
+        if m is None:
+            m = cls(full, help)
+            self.metrics[full] = m
+        elif not isinstance(m, cls):
+            raise TypeError(f"metric {full} already registered as a {m.kind}")
+        return m
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "") -> Histogram:
+        return self._get(Histogram, name, help)
+
+    def __iter__(self) -> Iterable[Metric]:
+        return iter(list(self.metrics.values()))
+
+    def snapshot(self) -> dict:
+        """Counters / gauges by value, histograms as summaries."""
+        snap: dict = {"counters": {}, "gauges": {}, "histograms": {}}
+        for m in self:
+            if m.kind == "counter":
+                snap["counters"][m.name] = m.value
+            elif m.kind == "gauge":
+                snap["gauges"][m.name] = m.value
+            else:
+                snap["histograms"][m.name] = m.summary()
+        return snap
@@ -0,0 +1,63 @@
+# telemetry/profiler.py
+
+import os
+import sys
+import threading
+from collections import Counter as Tally
+from typing import Optional
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread (the one that created it, by
+    default) every interval_s from a background thread, via
+    sys._current_frames(). Nothing is hooked into the profiled code, so the
+    overhead is one stack walk per sample and the target runs unmodified.
+
+    close() writes the samples as collapsed stacks ("a;b;c count" lines,
+    root first), the input format of flamegraph.pl and speedscope, and
+    returns the hottest leaf frames.
+    """
+
+    def __init__(self, out_path: str, interval_s: float = 0.005,
+                 thread_id: Optional[int] = None) -> None:
+        self.out_path = out_path
+        self.interval_s = interval_s
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks: Tally = Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _label(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                parts.append(self._label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def top(self, n: int = 15):
+        """[(leaf frame, samples)] over all collected stacks, hottest first."""
+        leaves: Tally = Tally()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        with open(self.out_path, "w", encoding="utf-8") as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+        return self.top()
@@ -0,0 +1,139 @@
+# artifact_cache.py
+#
+# Content-addressed cache for decoded compare inputs (library module, no CLI).
+#
+# Key   = blake2b(tool name, tool parameters, content hash of every input file)
+# Value = dict of numpy arrays stored as one .npz file named <key>.npz
+#
+# Renaming or touching an input does not invalidate an entry; editing it does.
+# Bump the tool's version parameter when its decoder changes.
+#
+# Eviction is size-based LRU: a hit refreshes the entry's mtime, and after each
+# store the oldest entries are removed until the directory fits max_bytes.
+#
+# Location: $AX_COMPARE_CACHE (set it to "off" to disable), default
+# ~/.cache/ax7015b-compare.
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+CACHE_ENV = "AX_COMPARE_CACHE"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ax7015b-compare")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+Arrays = Dict[str, np.ndarray]
+
+# (path, size, mtime_ns) -> digest, so one process hashes each file once
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(path: str) -> str:
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def cache_key(tool: str, params: dict, *paths: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    h.update(tool.encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    for p in paths:
+        h.update(file_digest(p).encode())
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """Directory of <key>.npz files with size-based LRU eviction."""
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".npz")
+
+    def get(self, key: str) -> Optional[Arrays]:
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                arrays = {name: z[name] for name in z.files}
+        except (OSError, ValueError):
+            # missing, or a truncated file from an interrupted writer
+            self.misses += 1
+            return None
+        os.utime(path)  # LRU: mark as recently used
+        self.hits += 1
+        return arrays
+
+    def put(self, key: str, arrays: Arrays) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits; returns entries removed."""
+        entries = []
+        total = 0
+        with os.scandir(self.root) as it:
+            for e in it:
+                if e.name.endswith(".npz") and e.is_file():
+                    st = e.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, e.path))
+                    total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def get_or_compute(self, key: str, compute: Callable[[], Arrays]) -> Arrays:
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
+
+
+def default_cache(enabled: bool = True) -> Optional[ArtifactCache]:
+    """Cache at $AX_COMPARE_CACHE (or the default dir); None when disabled."""
+    root = os.environ.get(CACHE_ENV, DEFAULT_CACHE_DIR)
+    if not enabled or root.lower() in ("off", "0", "none", ""):
+        return None
+    return ArtifactCache(root)
+
+
+def cached_arrays(cache: Optional[ArtifactCache], tool: str, params: dict,
+                  paths: Tuple[str, ...], compute: Callable[[], Arrays]) -> Arrays:
+    """compute() through the cache, or directly when cache is None."""
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(cache_key(tool, params, *paths), compute)
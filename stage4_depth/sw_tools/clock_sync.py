@@ -0,0 +1,249 @@
+# clock_sync.py
+#
+# Host clock <-> PL counter fit for latency_measure runs.
+#
+# latency_measure registers delta = pl_now - ts_ns: pl_now counts PL clock
+# cycles from reset (pl_timestamp_counter), ts_ns is host time.time_ns(). The
+# two have unrelated epochs and rates, so raw deltas only mean something
+# within one session and one board. This tool fits
+#
+#     pl_ticks = intercept + rate * host_ns          (per session)
+#
+# from the clock-sync records the replay drivers send with --sync-every (see
+# stage2_feed_replay/replay/sync_records.py): each one carries the host time
+# it was written at, and pl_now = ts_ns + delta is recovered from the ILA
+# capture (probes ts_ns, update_id, latency). The fit is Theil-Sen (median of
+# pairwise slopes, median intercept), refitted once after dropping samples
+# more than --reject MADs away, so a few records delayed behind a burst or a
+# host scheduling hiccup do not tilt it.
+#
+# One-way samples cannot separate the clock offset from the transfer time, so
+# the fitted line is anchored on the fastest sync records instead: residuals
+# are shifted so their --floor-quantile (0 = minimum) sits at the wire time of
+# one 32-byte record at --baud. Normalised latency is then
+#
+#     host_time(pl_now) - ts_ns - floor + wire      [ns]
+#
+# i.e. the time above the best case seen in the session plus the unavoidable
+# serialisation time, comparable across sessions and boards. The fit is saved
+# as JSON (--fit-out) and applied by pl_latency_report.py --clock; data
+# records need ts_ns stamped at send (replay --stamp-send) for their latency
+# to be meaningful.
+#
+# Usage:
+#   python clock_sync.py ila_sync_run.csv --fit-out session1.clock.json
+#   python clock_sync.py run_a.csv run_b.csv --pl-hz 50e6 --baud 921600 --fit-out s2.clock.json
+#   python pl_latency_report.py run_a.csv --clock session1.clock.json --sketch-out s1.json
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from ila_csv_loader import IlaLatency, load_latency_samples, read_header, resolve_column
+from quantile_sketch import QuantileSketch
+
+# sync record tags, shared with the replay drivers
+STAGE2_DIR = Path(__file__).resolve().parents[2] / "stage2_feed_replay"
+if str(STAGE2_DIR) not in sys.path:
+    sys.path.append(str(STAGE2_DIR))
+from replay.sync_records import SYNC_UID_FLAG  # noqa: E402
+
+FIT_SCHEMA = "pl-clock-fit.v1"
+DEFAULT_PL_HZ = 50e6        # pl_clk, ax7015b_stage3_timestamp.xdc
+DEFAULT_BAUD = 115200
+RECORD_BYTES = 32
+MAX_PAIRS = 2_000_000       # Theil-Sen: all pairs up to ~2000 samples, sampled above
+
+
+def is_sync(update_id: np.ndarray) -> np.ndarray:
+    return (update_id & np.uint64(SYNC_UID_FLAG)) != 0
+
+
+def uart_wire_ns(baud: int, nbytes: int = RECORD_BYTES) -> float:
+    """Serialisation time of nbytes at 8N1 (10 bit times per byte)."""
+    return nbytes * 10 * 1e9 / baud
+
+
+def pl_ticks(ts_ns: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    """pl_now = ts_ns + delta, modulo 2^64 like the RTL."""
+    return ts_ns.astype(np.uint64) + delta.view(np.uint64)
+
+
+def theil_sen(x: np.ndarray, y: np.ndarray, max_pairs: int = MAX_PAIRS,
+              seed: int = 0) -> Tuple[float, float]:
+    """(slope, intercept): median pairwise slope, median of y - slope * x."""
+    n = len(x)
+    if n < 2:
+        raise ValueError("need at least two samples")
+    if n * (n - 1) // 2 <= max_pairs:
+        i, j = np.triu_indices(n, k=1)
+    else:
+        rng = np.random.default_rng(seed)
+        i = rng.integers(0, n, max_pairs)
+        j = rng.integers(0, n, max_pairs)
+    dx = x[j] - x[i]
+    keep = dx != 0
+    if not keep.any():
+        raise ValueError("all samples at the same host time")
+    slope = float(np.median((y[j] - y[i])[keep] / dx[keep]))
+    return slope, float(np.median(y - slope * x))
+
+
+class ClockFit(NamedTuple):
+    """pl_ticks - pl0 = intercept + rate * (host_ns - host0), plus the latency anchor."""
+    host0: int             # host ns of the first sync sample
+    pl0: int               # PL ticks of the first sync sample
+    rate: float            # PL ticks per host ns
+    intercept: float       # ticks
+    floor_ns: float        # residual quantile the latency is anchored on
+    wire_ns: float         # serialisation time of one record
+    pl_hz_nominal: float
+    samples: int
+    inliers: int
+    mad_ns: float          # median absolute deviation of inlier residuals
+    span_s: float          # host time covered by the sync samples
+
+    @property
+    def pl_hz(self) -> float:
+        return self.rate * 1e9
+
+    @property
+    def drift_ppm(self) -> float:
+        return (self.pl_hz / self.pl_hz_nominal - 1.0) * 1e6
+
+    @property
+    def pl_zero_host_ns(self) -> float:
+        """Host time at which the PL counter read 0 (its reset, if it never wrapped)."""
+        return self.host0 + (-self.pl0 - self.intercept) / self.rate
+
+    def residual_ns(self, ts_ns: np.ndarray, pl: np.ndarray) -> np.ndarray:
+        """Arrival on the host time axis minus ts_ns, before anchoring."""
+        x = (ts_ns.astype(np.uint64) - np.uint64(self.host0)).view(np.int64).astype(np.float64)
+        y = (pl - np.uint64(self.pl0)).view(np.int64).astype(np.float64)
+        return (y - self.intercept) / self.rate - x
+
+    def latency_ns(self, ts_ns: np.ndarray, delta: np.ndarray) -> np.ndarray:
+        """Normalised latency (ns) of records with ts_ns and latency_measure delta."""
+        return self.residual_ns(ts_ns, pl_ticks(ts_ns, delta)) - self.floor_ns + self.wire_ns
+
+    def to_dict(self) -> dict:
+        return {"schema": FIT_SCHEMA, **self._asdict(),
+                "pl_hz": self.pl_hz, "drift_ppm": self.drift_ppm}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ClockFit":
+        if d.get("schema") != FIT_SCHEMA:
+            raise ValueError("not a clock fit file")
+        return cls(**{k: d[k] for k in cls._fields})
+
+    @classmethod
+    def load(cls, path: str) -> "ClockFit":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def fit_clock(ts_ns: np.ndarray, pl: np.ndarray, pl_hz: float = DEFAULT_PL_HZ,
+              wire_ns: float = 0.0, floor_quantile: float = 0.0,
+              reject: float = 5.0) -> Tuple[ClockFit, np.ndarray]:
+    """
+    Fit paired sync samples (host ns, PL ticks). Returns the fit and the
+    inlier mask.
+    """
+    order = np.argsort(ts_ns, kind="stable")
+    ts_ns, pl = ts_ns[order].astype(np.uint64), pl[order]
+    host0, pl0 = int(ts_ns[0]), int(pl[0])
+    x = (ts_ns - np.uint64(host0)).view(np.int64).astype(np.float64)
+    y = (pl - np.uint64(pl0)).view(np.int64).astype(np.float64)
+
+    rate, intercept = theil_sen(x, y)
+    resid = y - (intercept + rate * x)
+    mad = float(np.median(np.abs(resid - np.median(resid))))
+    inl = np.abs(resid - np.median(resid)) <= reject * max(mad, 1.0)
+    if inl.sum() >= 2 and not inl.all():
+        rate, intercept = theil_sen(x[inl], y[inl])
+
+    fit = ClockFit(host0, pl0, rate, intercept, 0.0, wire_ns, pl_hz,
+                   len(x), int(inl.sum()), 0.0, float(x[-1] - x[0]) / 1e9)
+    r_ns = fit.residual_ns(ts_ns, pl)[inl]
+    fit = fit._replace(
+        floor_ns=float(np.quantile(r_ns, floor_quantile)),
+        mad_ns=float(np.median(np.abs(r_ns - np.median(r_ns)))),
+    )
+    mask = np.empty_like(inl)
+    mask[order] = inl
+    return fit, mask
+
+
+def load_sync_samples(paths: List[str], args: argparse.Namespace) -> IlaLatency:
+    """Sync records of all captures, concatenated."""
+    parts = []
+    for path in paths:
+        header = read_header(path)
+        lat = load_latency_samples(
+            path,
+            valid_col=resolve_column(header, args.valid_col),
+            uid_col=resolve_column(header, args.uid_col),
+            delta_col=resolve_column(header, args.delta_col),
+            mode=args.valid_mode,
+            delta_lag=args.delta_lag,
+            ts_col=resolve_column(header, args.ts_col),
+        )
+        sync = is_sync(lat.update_id)
+        print(f"[clock] {path}: {int(sync.sum())} sync / {int((~sync).sum())} data records")
+        parts.append(IlaLatency(*(a[sync] for a in lat)))
+    return IlaLatency(*(np.concatenate(cols) for cols in zip(*parts)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Fit host clock vs PL counter from clock-sync records.")
+    ap.add_argument("inputs", nargs="+", help="ILA CSV exports of one session (same PL reset)")
+    ap.add_argument("--valid-col", default="unpack_valid")
+    ap.add_argument("--uid-col", default="update_id")
+    ap.add_argument("--delta-col", default="latency")
+    ap.add_argument("--ts-col", default="ts_ns")
+    ap.add_argument("--valid-mode", choices=["rising", "level"], default="rising")
+    ap.add_argument("--delta-lag", type=int, default=1,
+                    help="samples between the valid strobe and the registered delta")
+    ap.add_argument("--pl-hz", type=float, default=DEFAULT_PL_HZ,
+                    help="nominal PL counter clock (for the drift figure)")
+    ap.add_argument("--baud", type=int, default=DEFAULT_BAUD,
+                    help="UART baud rate of the run (wire time of one record)")
+    ap.add_argument("--floor-quantile", type=float, default=0.0,
+                    help="residual quantile anchored at the wire time (0 = fastest sync record)")
+    ap.add_argument("--reject", type=float, default=5.0,
+                    help="drop sync samples further than this many MADs from the first fit")
+    ap.add_argument("--fit-out", type=str, default=None, help="write the fit as JSON")
+    args = ap.parse_args()
+
+    sync = load_sync_samples(args.inputs, args)
+    if len(sync.update_id) < 2:
+        raise SystemExit("[clock] need at least two sync records (replay with --sync-every)")
+
+    pl = pl_ticks(sync.ts_ns, sync.delta)
+    fit, inl = fit_clock(sync.ts_ns, pl, args.pl_hz, uart_wire_ns(args.baud),
+                         args.floor_quantile, args.reject)
+
+    print(f"[clock] {fit.samples} sync samples over {fit.span_s:.3f} s, "
+          f"{fit.inliers} inliers (reject > {args.reject:g} MAD)")
+    print(f"[clock] PL clock {fit.pl_hz:,.1f} Hz = {fit.drift_ppm:+.2f} ppm vs {fit.pl_hz_nominal:,.0f}")
+    print(f"[clock] PL counter zero at host {fit.pl_zero_host_ns / 1e9:.6f} s (epoch)")
+    print(f"[clock] residual MAD {fit.mad_ns:.0f} ns, floor q{args.floor_quantile:g} = "
+          f"{fit.floor_ns:.0f} ns, wire {fit.wire_ns:.0f} ns")
+
+    lat = QuantileSketch()
+    lat.add(fit.latency_ns(sync.ts_ns[inl], sync.delta[inl]))
+    s = lat.summary()
+    print(f"[clock] sync latency (ns): p50={s['p50']:.0f} p90={s['p90']:.0f} "
+          f"p99={s['p99']:.0f} max={s['max']:.0f}")
+
+    if args.fit_out:
+        Path(args.fit_out).write_text(json.dumps(fit.to_dict(), indent=2) + "\n", encoding="utf-8")
+        print(f"[clock] fit -> {args.fit_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# cpu_order_book.py
+#
+# CPU reference L2 order book on fixed-point (price_fp, qty_fp) levels.
+#
+# Each side keeps a dict price -> qty plus a sorted key list, arranged so the
+# best level is always the LAST element (bids store +price, asks store -price):
+#   - best bid / best ask      : O(1)
+#   - insert / delete a level  : O(log n) search + memmove of the tail, which is
+#                                 tiny because depth updates cluster at the top
+#   - top-N                     : O(N) slice
+#
+# Empty-side convention matches the Stage 6 CPU reference: (0, 0).
+# (The PL uses 0xFFFF_FFFF as the empty-ask price; that is modelled separately.)
+
+from bisect import bisect_left, insort
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+SIDE_BID = 0
+SIDE_ASK = 1
+
+EMPTY_LEVEL = (0, 0)
+
+
+class TopOfBook(NamedTuple):
+    """Per-event best bid/ask after each update (parallel int64 arrays)."""
+    bid_price: np.ndarray
+    bid_qty: np.ndarray
+    ask_price: np.ndarray
+    ask_qty: np.ndarray
+
+
+class BookSide:
+    """One side of the book. Keys are sorted ascending; best level is keys[-1]."""
+
+    __slots__ = ("is_bid", "_keys", "_qty")
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._keys: List[int] = []
+        self._qty: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set(self, price_fp: int, qty_fp: int) -> None:
+        """qty_fp == 0 deletes the level, otherwise insert/update."""
+        key = price_fp if self.is_bid else -price_fp
+        if qty_fp == 0:
+            if self._qty.pop(price_fp, None) is not None:
+                del self._keys[bisect_left(self._keys, key)]
+        else:
+            if price_fp not in self._qty:
+                insort(self._keys, key)
+            self._qty[price_fp] = qty_fp
+
+    def get(self, price_fp: int) -> int:
+        return self._qty.get(price_fp, 0)
+
+    def best(self) -> Tuple[int, int]:
+        if not self._keys:
+            return EMPTY_LEVEL
+        key = self._keys[-1]
+        price = key if self.is_bid else -key
+        return price, self._qty[price]
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        """Best n levels, best first."""
+        keys = self._keys[-n:] if n > 0 else []
+        sign = 1 if self.is_bid else -1
+        return [(sign * k, self._qty[sign * k]) for k in reversed(keys)]
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._qty.clear()
+
+
+class CpuOrderBook:
+    """Fixed-point L2 book with O(1) best levels and a batch apply API."""
+
+    def __init__(self):
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+
+    def clear(self) -> None:
+        self.bids.clear()
+        self.asks.clear()
+
+    def apply(self, side: int, price_fp: int, qty_fp: int) -> None:
+        """side: 0 = BID, 1 = ASK (same encoding as binance_depth_types::side_t)."""
+        (self.bids if side == SIDE_BID else self.asks).set(price_fp, qty_fp)
+
+    def best_bid(self) -> Tuple[int, int]:
+        return self.bids.best()
+
+    def best_ask(self) -> Tuple[int, int]:
+        return self.asks.best()
+
+    def top_n(self, n: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        return self.bids.top(n), self.asks.top(n)
+
+    def top_n_arrays(self, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Top-N as fixed-width arrays (bid_px, bid_qty, ask_px, ask_qty), each
+        shape (n,), best first, padded with 0 where a side has fewer levels.
+        """
+        out = np.zeros((4, n), dtype=np.int64)
+        for row, levels in ((0, self.bids.top(n)), (2, self.asks.top(n))):
+            if levels:
+                out[row:row + 2, :len(levels)] = np.asarray(levels, dtype=np.int64).T
+        return out[0], out[1], out[2], out[3]
+
+    def apply_batch(self, side, price_fp, qty_fp) -> TopOfBook:
+        """
+        Apply a batch of updates and return the top of book after each one.
+
+        side / price_fp / qty_fp are parallel array-likes (numpy or lists).
+        """
+        sides = np.asarray(side).tolist()
+        prices = np.asarray(price_fp).tolist()
+        qtys = np.asarray(qty_fp).tolist()
+        n = len(sides)
+        if len(prices) != n or len(qtys) != n:
+            raise ValueError("side/price_fp/qty_fp length mismatch")
+
+        bid_px = [0] * n
+        bid_q = [0] * n
+        ask_px = [0] * n
+        ask_q = [0] * n
+
+        bkeys, bqty = self.bids._keys, self.bids._qty
+        akeys, aqty = self.asks._keys, self.asks._qty
+
+        # Inlined BookSide.set/best: this loop is the hot path.
+        for i in range(n):
+            p = prices[i]
+            q = qtys[i]
+            if sides[i] == SIDE_BID:
+                keys, qty, key = bkeys, bqty, p
+            else:
+                keys, qty, key = akeys, aqty, -p
+
+            if q == 0:
+                if qty.pop(p, None) is not None:
+                    if keys[-1] == key:
+                        keys.pop()
+                    else:
+                        del keys[bisect_left(keys, key)]
+            else:
+                if p not in qty:
+                    if not keys or key > keys[-1]:
+                        keys.append(key)
+                    else:
+                        insort(keys, key)
+                qty[p] = q
+
+            if bkeys:
+                bp = bkeys[-1]
+                bid_px[i] = bp
+                bid_q[i] = bqty[bp]
+            if akeys:
+                ap = -akeys[-1]
+                ask_px[i] = ap
+                ask_q[i] = aqty[ap]
+
+        return TopOfBook(
+            np.asarray(bid_px, dtype=np.int64),
+            np.asarray(bid_q, dtype=np.int64),
+            np.asarray(ask_px, dtype=np.int64),
+            np.asarray(ask_q, dtype=np.int64),
+        )
+
+    def apply_events(self, batch) -> TopOfBook:
+        """apply_batch over a depth_cpu_normalizer.DepthEventBatch."""
+        return self.apply_batch(batch.side, batch.price_fp, batch.qty_fp)
+
+
+def concat_top_of_book(parts) -> TopOfBook:
+    """Join per-batch TopOfBook results into one series."""
+    parts = list(parts)
+    if not parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return TopOfBook(empty, empty, empty, empty)
+    return TopOfBook(*(np.concatenate(col) for col in zip(*parts)))
@@ -0,0 +1,283 @@
+# depth_book_reconstruct.py
+#
+# Full L2 book reconstruction: seed from the REST snapshot, then apply the
+# diff stream with Binance's sequencing rules
+# (https://developers.binance.com/docs/binance-spot-api-docs/web-socket-streams
+#  "How to manage a local order book correctly"):
+#
+#   1. drop any diff with u <= lastUpdateId (stale, already in the snapshot)
+#   2. the first applied diff must satisfy U <= lastUpdateId + 1 <= u
+#   3. every later diff must satisfy U == previous u + 1
+#
+# Inputs:
+#   - Stage 2 logs: "#SNAP {...}" header line + "ts_ns,u,side,price,qty" lines.
+#     Only 'u' is logged there, so rules 2/3 cannot be checked; rule 1 still
+#     applies. Consecutive lines with the same u form one diff message.
+#   - NDJSON depthUpdate streams (U and u present) + a snapshot JSON file.
+#
+# Output: top-N of book after every applied diff message, as columnar arrays.
+#
+# Usage:
+#   python depth_book_reconstruct.py binance_depth_tiny.log --top 5 --out tob.npz
+
+import argparse
+import json
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from cpu_order_book import CpuOrderBook, SIDE_ASK, SIDE_BID
+from depth_cpu_normalizer import PRICE_SCALE, QTY_SCALE, float_to_fp
+
+SNAP_PREFIX = "#SNAP "
+
+Level = Tuple[int, int, int]  # (side, price_fp, qty_fp)
+
+
+class SequenceGapError(RuntimeError):
+    """Raised in strict mode when U/u continuity is broken."""
+
+
+class NotSeededError(RuntimeError):
+    """Raised when a diff arrives before any snapshot."""
+
+
+class DiffMessage:
+    __slots__ = ("ts_ns", "first_update_id", "final_update_id", "levels")
+
+    def __init__(self, ts_ns: int, first_update_id: Optional[int], final_update_id: int,
+                 levels: List[Level]):
+        self.ts_ns = ts_ns
+        self.first_update_id = first_update_id  # None when the source does not carry U
+        self.final_update_id = final_update_id
+        self.levels = levels
+
+
+def snapshot_levels(snap: dict) -> List[Level]:
+    levels: List[Level] = []
+    for price_str, qty_str in snap.get("bids", []):
+        levels.append((SIDE_BID, float_to_fp(float(price_str), PRICE_SCALE),
+                       float_to_fp(float(qty_str), QTY_SCALE)))
+    for price_str, qty_str in snap.get("asks", []):
+        levels.append((SIDE_ASK, float_to_fp(float(price_str), PRICE_SCALE),
+                       float_to_fp(float(qty_str), QTY_SCALE)))
+    return levels
+
+
+def iter_log_messages(path: str) -> Iterator[Union[dict, DiffMessage]]:
+    """
+    Parse a Stage 2 depth log. Yields the snapshot dict for each #SNAP line
+    (capture restarts append a new one) and a DiffMessage per update id.
+    """
+    cur: Optional[DiffMessage] = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(SNAP_PREFIX):
+                if cur is not None:
+                    yield cur
+                    cur = None
+                yield json.loads(line[len(SNAP_PREFIX):])
+                continue
+
+            parts = line.split(",")
+            if len(parts) != 5:
+                continue
+            ts_str, uid_str, side_char, price_str, qty_str = parts
+            try:
+                ts_ns = int(ts_str)
+                update_id = int(uid_str)
+                price_fp = float_to_fp(float(price_str), PRICE_SCALE)
+                qty_fp = float_to_fp(float(qty_str), QTY_SCALE)
+            except ValueError:
+                continue
+            if side_char == "B":
+                side = SIDE_BID
+            elif side_char == "A":
+                side = SIDE_ASK
+            else:
+                continue
+
+            if cur is None or cur.final_update_id != update_id:
+                if cur is not None:
+                    yield cur
+                cur = DiffMessage(ts_ns, None, update_id, [])
+            cur.levels.append((side, price_fp, qty_fp))
+    if cur is not None:
+        yield cur
+
+
+def iter_ndjson_messages(path: str) -> Iterator[DiffMessage]:
+    """Parse depthUpdate lines (meta / subscribe-ack lines are skipped)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            msg = json.loads(line)
+            if not isinstance(msg, dict) or msg.get("e") != "depthUpdate":
+                continue
+            levels = snapshot_levels({"bids": msg.get("b", []), "asks": msg.get("a", [])})
+            # Event time is in ms; keep the ts_ns column in ns like the Stage 2 logs.
+            yield DiffMessage(int(msg["E"]) * 1_000_000, int(msg["U"]), int(msg["u"]), levels)
+
+
+class BookReconstructor:
+    """Snapshot-seeded book that applies diffs with U/u sequencing."""
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self.book = CpuOrderBook()
+        self.last_update_id: Optional[int] = None
+        self.synced = False
+
+        self.applied_msgs = 0
+        self.stale_msgs = 0
+        self.gaps = 0
+        self.snapshots = 0
+
+    def seed(self, snap: dict) -> None:
+        self.book.clear()
+        for side, price_fp, qty_fp in snapshot_levels(snap):
+            self.book.apply(side, price_fp, qty_fp)
+        self.last_update_id = int(snap["lastUpdateId"])
+        self.synced = False
+        self.snapshots += 1
+
+    def apply_message(self, msg: DiffMessage) -> bool:
+        """Apply one diff message. Returns False if it was dropped as stale."""
+        if self.last_update_id is None:
+            raise NotSeededError("book not seeded: no snapshot before first diff")
+
+        if msg.final_update_id <= self.last_update_id:
+            self.stale_msgs += 1
+            return False
+
+        if msg.first_update_id is not None:
+            expected = self.last_update_id + 1
+            if self.synced:
+                ok = msg.first_update_id == expected
+            else:
+                ok = msg.first_update_id <= expected <= msg.final_update_id
+            if not ok:
+                self.gaps += 1
+                if self.strict:
+                    raise SequenceGapError(
+                        f"gap: last_update_id={self.last_update_id} "
+                        f"U={msg.first_update_id} u={msg.final_update_id}"
+                    )
+
+        apply = self.book.apply
+        for side, price_fp, qty_fp in msg.levels:
+            apply(side, price_fp, qty_fp)
+        self.last_update_id = msg.final_update_id
+        self.synced = True
+        self.applied_msgs += 1
+        return True
+
+
+def reconstruct(
+    items: Iterable[Union[dict, DiffMessage]],
+    top_n: int = 1,
+    recon: Optional[BookReconstructor] = None,
+    snapshot: Optional[dict] = None,
+) -> dict:
+    """
+    Run items (snapshot dicts and DiffMessages) through a reconstructor and
+    collect the top-N book after each applied message.
+
+    Returns a dict of arrays:
+        update_id (n,), ts_ns (n,),
+        bid_price / bid_qty / ask_price / ask_qty (n, top_n)  best level first, 0-padded
+    """
+    if top_n < 1:
+        raise ValueError("top_n must be >= 1")
+    recon = recon or BookReconstructor()
+    if snapshot is not None:
+        recon.seed(snapshot)
+
+    update_ids: List[int] = []
+    ts: List[int] = []
+    rows: List[np.ndarray] = []
+
+    for item in items:
+        if isinstance(item, dict):
+            recon.seed(item)
+            continue
+        if not recon.apply_message(item):
+            continue
+        update_ids.append(item.final_update_id)
+        ts.append(item.ts_ns)
+        rows.append(np.stack(recon.book.top_n_arrays(top_n)))
+
+    tops = np.stack(rows) if rows else np.zeros((0, 4, top_n), dtype=np.int64)
+    return {
+        "update_id": np.asarray(update_ids, dtype=np.uint64),
+        "ts_ns": np.asarray(ts, dtype=np.int64),
+        "bid_price": tops[:, 0, :],
+        "bid_qty": tops[:, 1, :],
+        "ask_price": tops[:, 2, :],
+        "ask_qty": tops[:, 3, :],
+    }
+
+
+def write_tob_csv(path: str, cols: dict) -> None:
+    top_n = cols["bid_price"].shape[1]
+    header = ["update_id", "ts_ns"]
+    for k in range(top_n):
+        header += [f"bid_price_{k}", f"bid_qty_{k}", f"ask_price_{k}", f"ask_qty_{k}"]
+    table = np.empty((len(cols["update_id"]), 2 + 4 * top_n), dtype=object)
+    table[:, 0] = cols["update_id"]
+    table[:, 1] = cols["ts_ns"]
+    for j, name in enumerate(("bid_price", "bid_qty", "ask_price", "ask_qty")):
+        table[:, 2 + j::4] = cols[name]
+    np.savetxt(path, table, fmt="%d", delimiter=",", header=",".join(header), comments="")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(
+        description="Reconstruct the L2 book from a depth log snapshot + diffs (U/u sequencing)."
+    )
+    ap.add_argument("input", help="Stage 2 depth log (#SNAP + CSV) or NDJSON depthUpdate stream")
+    ap.add_argument("--snapshot", default=None,
+                    help="REST depth snapshot JSON (required for NDJSON input without #SNAP)")
+    ap.add_argument("--ndjson", action="store_true", help="input is NDJSON depthUpdate messages")
+    ap.add_argument("--top", type=int, default=1, help="levels per side to emit")
+    ap.add_argument("--strict", action="store_true", help="fail on U/u sequence gaps")
+    ap.add_argument("--out", default=None, help="write columnar arrays to .npz")
+    ap.add_argument("--csv", default=None, help="write top-N rows to CSV")
+    args = ap.parse_args(argv)
+
+    snapshot = None
+    if args.snapshot:
+        with open(args.snapshot, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+    items = iter_ndjson_messages(args.input) if args.ndjson else iter_log_messages(args.input)
+    recon = BookReconstructor(strict=args.strict)
+    try:
+        cols = reconstruct(items, top_n=args.top, recon=recon, snapshot=snapshot)
+    except NotSeededError:
+        raise SystemExit(f"{args.input}: no #SNAP before the first diff; pass a REST snapshot with --snapshot")
+
+    print(f"snapshots:       {recon.snapshots}")
+    print(f"applied msgs:    {recon.applied_msgs}")
+    print(f"stale dropped:   {recon.stale_msgs}")
+    print(f"sequence gaps:   {recon.gaps}")
+    print(f"last update id:  {recon.last_update_id}")
+    print(f"book levels:     bids={len(recon.book.bids)} asks={len(recon.book.asks)}")
+    bid, ask = recon.book.best_bid(), recon.book.best_ask()
+    print(f"best bid / ask:  {bid} / {ask}")
+
+    if args.out:
+        np.savez_compressed(args.out, **cols)
+        print(f"wrote {args.out}")
+    if args.csv:
+        write_tob_csv(args.csv, cols)
+        print(f"wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,24 @@
 # depth_cpu_normalizer.py
 from dataclasses import dataclass
-from typing import Iterable, Iterator, Literal
+from typing import Iterable, Iterator, List, Literal, Sequence
 import json
 import math
+import sys
+
+import numpy as np
 
 Side = Literal["BID", "ASK"]
 
-@dataclass
+# side codes used in batches (same encoding as binance_depth_types::side_t)
+SIDE_CODE = {"BID": 0, "ASK": 1}
+SIDE_NAME = ("BID", "ASK")
+
+DEFAULT_CHUNK = 65_536  # events per batch
+
+# __slots__ on the scalar event (dataclass(slots=...) needs Python 3.10+)
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class DepthEvent:
     update_id: int
     side: Side
@@ -24,9 +36,140 @@ QTY_SCALE   = 1_000_000  # same as you used in Stage 2
 def float_to_fp(x: float, scale: int) -> int:
     return int(round(x * scale))
 
+def floats_to_fp(x, scale: int) -> np.ndarray:
+    """Vectorised float_to_fp: round-half-even of x * scale, as int64."""
+    return np.rint(np.asarray(x, dtype=np.float64) * scale).astype(np.int64)
+
+
+class DepthEventBatch:
+    """
+    A chunk of depth events as parallel typed arrays:
+
+        update_id uint64, side uint8 (0 = BID, 1 = ASK),
+        price_fp int64, qty_fp int64, ts_rx_ns int64
+    """
+
+    __slots__ = ("update_id", "side", "price_fp", "qty_fp", "ts_rx_ns")
+
+    def __init__(self, update_id, side, price_fp, qty_fp, ts_rx_ns=None):
+        self.update_id = np.asarray(update_id, dtype=np.uint64)
+        self.side = np.asarray(side, dtype=np.uint8)
+        self.price_fp = np.asarray(price_fp, dtype=np.int64)
+        self.qty_fp = np.asarray(qty_fp, dtype=np.int64)
+        n = len(self.update_id)
+        self.ts_rx_ns = (np.zeros(n, dtype=np.int64) if ts_rx_ns is None
+                         else np.asarray(ts_rx_ns, dtype=np.int64))
+        if not (len(self.side) == len(self.price_fp) == len(self.qty_fp) == len(self.ts_rx_ns) == n):
+            raise ValueError("DepthEventBatch columns differ in length")
+
+    def __len__(self) -> int:
+        return len(self.update_id)
+
+    def events(self) -> Iterator[DepthEvent]:
+        """Scalar view, one DepthEvent per row."""
+        for u, s, p, q, ts in zip(self.update_id.tolist(), self.side.tolist(),
+                                  self.price_fp.tolist(), self.qty_fp.tolist(),
+                                  self.ts_rx_ns.tolist()):
+            yield DepthEvent(update_id=u, side=SIDE_NAME[s], price_fp=p, qty_fp=q, ts_rx_ns=ts)
+
+    @classmethod
+    def from_events(cls, events: Iterable[DepthEvent]) -> "DepthEventBatch":
+        rows = [(e.update_id, SIDE_CODE[e.side], e.price_fp, e.qty_fp, e.ts_rx_ns) for e in events]
+        if not rows:
+            return cls.empty()
+        u, s, p, q, ts = zip(*rows)
+        return cls(u, s, p, q, ts)
+
+    @classmethod
+    def empty(cls) -> "DepthEventBatch":
+        return cls([], [], [], [], [])
+
+    @classmethod
+    def concat(cls, batches: Sequence["DepthEventBatch"]) -> "DepthEventBatch":
+        if not batches:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(b, name) for b in batches]) for name in cls.__slots__))
+
+
+def parse_depth_log_lines(lines: Sequence[str]) -> DepthEventBatch:
+    """
+    Parse Stage 2 depth log lines "ts_ns,update_id,side(B/A),price,qty" into
+    one batch. #SNAP / JSON-fragment / malformed lines are skipped.
+    """
+    good = [l for l in (x.strip() for x in lines) if l[:1].isdigit()]
+    if not good:
+        return DepthEventBatch.empty()
+
+    # Fast path: one join + split instead of a list per line.
+    flat = ",".join(good).split(",")
+    cols = None
+    if len(flat) == 5 * len(good):
+        try:
+            cols = _log_columns(flat[0::5], flat[1::5], flat[2::5], flat[3::5], flat[4::5])
+        except ValueError:
+            cols = None
+    if cols is None:
+        # some line has the wrong field count or a malformed number
+        rows = [r for r in (l.split(",") for l in good) if len(r) == 5 and _log_row_ok(r)]
+        if not rows:
+            return DepthEventBatch.empty()
+        cols = _log_columns(*zip(*rows))
+
+    ts_a, uid_a, side_s, price_a, qty_a = cols
+    is_ask = side_s == "A"
+    keep = is_ask | (side_s == "B")
+    if not keep.all():
+        ts_a, uid_a, is_ask, price_a, qty_a = (c[keep] for c in (ts_a, uid_a, is_ask, price_a, qty_a))
+    return DepthEventBatch(uid_a, is_ask.astype(np.uint8), floats_to_fp(price_a, PRICE_SCALE),
+                           floats_to_fp(qty_a, QTY_SCALE), ts_a)
+
+
+def _log_columns(ts, uid, side, price, qty):
+    return (
+        np.array(ts, dtype=np.int64),
+        np.array(uid, dtype=np.uint64),
+        np.array(side),
+        np.array(price, dtype=np.float64),
+        np.array(qty, dtype=np.float64),
+    )
+
+
+def _log_row_ok(parts) -> bool:
+    try:
+        int(parts[0])
+        int(parts[1])
+        float(parts[3])
+        float(parts[4])
+    except ValueError:
+        return False
+    return True
+
+
+def iter_depth_log_batches(path: str, chunk_size: int = DEFAULT_CHUNK) -> Iterator[DepthEventBatch]:
+    """Stage 2 depth log (CSV lines) as DepthEventBatch chunks of ~chunk_size events."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines: List[str] = []
+        for line in f:
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                batch = parse_depth_log_lines(lines)
+                lines = []
+                if len(batch):
+                    yield batch
+        batch = parse_depth_log_lines(lines)
+        if len(batch):
+            yield batch
+
+
+def is_depth_update(msg) -> bool:
+    """True for a depthUpdate message (capture meta / subscribe-ack lines are not)."""
+    return isinstance(msg, dict) and msg.get("e") == "depthUpdate"
+
+
 def iter_binance_depth_events(path: str) -> Iterator[DepthEvent]:
     """
-    Assumes each line of `path` is one JSON Binance depthUpdate message.
+    Assumes each line of `path` is one JSON Binance depthUpdate message;
+    other lines (pc_capture meta line, subscribe ack) are skipped.
 
     For each bid/ask level in the event, we emit one DepthEvent.
     """
@@ -36,6 +179,8 @@ def iter_binance_depth_events(path: str) -> Iterator[DepthEvent]:
             if not line:
                 continue
             msg = json.loads(line)
+            if not is_depth_update(msg):
+                continue
 
             # update_id: use 'u' (final update ID) – consistent with Binance docs
             # If your TLV uses 'U'/'lastUpdateId' instead, swap accordingly.
@@ -67,3 +212,60 @@ def iter_binance_depth_events(path: str) -> Iterator[DepthEvent]:
                     price_fp=price_fp,
                     qty_fp=qty_fp,
                 )
+
+
+def parse_binance_depth_lines(lines: Sequence[str]) -> DepthEventBatch:
+    """depthUpdate JSON lines -> one batch (same event order as iter_binance_depth_events)."""
+    uids: List[int] = []
+    sides: List[int] = []
+    prices: List[str] = []
+    qtys: List[str] = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        msg = json.loads(line)
+        if not is_depth_update(msg):
+            continue
+        u = int(msg["u"])
+        for code, key in ((0, "b"), (1, "a")):
+            levels = msg.get(key, [])
+            if not levels:
+                continue
+            n = len(levels)
+            uids.extend([u] * n)
+            sides.extend([code] * n)
+            for price_str, qty_str in levels:
+                prices.append(price_str)
+                qtys.append(qty_str)
+    if not uids:
+        return DepthEventBatch.empty()
+    return DepthEventBatch(
+        uids, sides,
+        floats_to_fp(np.array(prices, dtype=np.float64), PRICE_SCALE),
+        floats_to_fp(np.array(qtys, dtype=np.float64), QTY_SCALE),
+    )
+
+
+def iter_binance_depth_event_batches(path: str, chunk_size: int = DEFAULT_CHUNK) -> Iterator[DepthEventBatch]:
+    """
+    Batch form of iter_binance_depth_events: DepthEventBatch chunks, split on
+    message boundaries once at least chunk_size levels are buffered.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines: List[str] = []
+        approx = 0
+        for line in f:
+            lines.append(line)
+            # cheap level-count estimate: every level is a ["p","q"] pair
+            approx += line.count("],[") + 1
+            if approx >= chunk_size:
+                batch = parse_binance_depth_lines(lines)
+                lines = []
+                approx = 0
+                if len(batch):
+                    yield batch
+        if lines:
+            batch = parse_binance_depth_lines(lines)
+            if len(batch):
+                yield batch
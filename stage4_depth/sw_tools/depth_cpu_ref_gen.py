@@ -0,0 +1,131 @@
+# depth_cpu_ref_gen.py
+#
+# Bulk generation of the Stage 4 CPU reference (depth_cpu_ref.csv) from a
+# Binance depth log, in one numpy pass:
+#
+#   price_fp / qty_fp = float32(price / qty) bit patterns, exactly what the
+#   FPGA sees in price_f32 / qty_f32 (same rounding as struct.pack("<f")).
+#
+# Outputs:
+#   - CSV  : update_id,price_fp,qty_fp  (what depth_stage4_compare.py reads)
+#   - .npz : update_id, price_fp, qty_fp plus ts_ns and side, for tools that
+#            want the reference without reparsing text
+#
+# replay_uart.py calls this before its send loop, so the loop only sleeps and
+# writes bytes.
+#
+# Usage:
+#   python depth_cpu_ref_gen.py binance_depth_tiny.log
+#   python depth_cpu_ref_gen.py binance_depth.log --csv ref.csv --npz ref.npz
+
+import argparse
+import sys
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# The record layouts are defined once, in the stage7 phase3 record codecs
+PHASE3_TOOLS = Path(__file__).resolve().parents[2] / "stage7_ps_pl_stream" / "phase3_demo_ready" / "tools"
+if str(PHASE3_TOOLS) not in sys.path:
+    sys.path.append(str(PHASE3_TOOLS))
+from record_codecs import get_codec
+
+DEFAULT_CSV = "depth_cpu_ref.csv"
+
+# numpy view of the 32-byte UART record "<QQBffxxxxxxx"
+RECORD_DTYPE = get_codec("uart32").dtype
+
+
+class LogColumns(NamedTuple):
+    ts_ns: np.ndarray      # int64
+    update_id: np.ndarray  # uint64
+    side: np.ndarray       # uint8, 0 = bid, 1 = ask
+    price: np.ndarray      # float64 as logged
+    qty: np.ndarray        # float64 as logged
+
+
+def _row_ok(parts) -> bool:
+    try:
+        int(parts[0])
+        int(parts[1])
+        float(parts[3])
+        float(parts[4])
+    except ValueError:
+        return False
+    return True
+
+
+def load_log_columns(log_path: str) -> LogColumns:
+    """
+    Event lines "ts_ns,updateId,side,price,qty" of a depth log as columns.
+    Same filtering as replay_uart.parse_log_lines: empty / #SNAP / malformed
+    lines are skipped, side is 0 for "B" and 1 otherwise.
+    """
+    with open(log_path, "r") as fh:
+        lines = [l for l in (x.strip() for x in fh) if l and not l.startswith("#SNAP")]
+
+    flat = ",".join(lines).split(",") if lines else []
+    try:
+        if len(flat) != 5 * len(lines):
+            raise ValueError("field count")
+        ts, uid, side, price, qty = (flat[k::5] for k in range(5))
+        cols = (np.array(ts, dtype=np.int64), np.array(uid, dtype=np.uint64),
+                np.array(price, dtype=np.float64), np.array(qty, dtype=np.float64))
+    except ValueError:
+        # some line is malformed: keep only the well-formed ones
+        rows = [p for p in (l.split(",") for l in lines) if len(p) == 5 and _row_ok(p)]
+        ts, uid, side, price, qty = zip(*rows) if rows else ((),) * 5
+        cols = (np.array(ts, dtype=np.int64), np.array(uid, dtype=np.uint64),
+                np.array(price, dtype=np.float64), np.array(qty, dtype=np.float64))
+
+    side_code = (np.array(side, dtype=str) != "B").astype(np.uint8)
+    return LogColumns(cols[0], cols[1], side_code, cols[2], cols[3])
+
+
+def f32_bits(x: np.ndarray) -> np.ndarray:
+    """float64 -> float32 (round to nearest even) -> raw uint32 bits."""
+    return np.asarray(x, dtype=np.float64).astype(np.float32).view(np.uint32)
+
+
+def pack_records(cols: LogColumns) -> np.ndarray:
+    """All 32-byte UART records at once (structured array, RECORD_DTYPE)."""
+    rec = np.zeros(len(cols.ts_ns), dtype=RECORD_DTYPE)
+    rec["ts_ns"] = cols.ts_ns
+    rec["update_id"] = cols.update_id
+    rec["side"] = cols.side
+    rec["price"] = cols.price
+    rec["qty"] = cols.qty
+    return rec
+
+
+def write_reference(cols: LogColumns, csv_path: Optional[str] = DEFAULT_CSV,
+                    npz_path: Optional[str] = None) -> int:
+    """Write depth_cpu_ref.csv (and optionally .npz); returns the row count."""
+    price_bits = f32_bits(cols.price)
+    qty_bits = f32_bits(cols.qty)
+    if csv_path:
+        table = np.stack([cols.update_id, price_bits.astype(np.uint64), qty_bits.astype(np.uint64)], axis=1)
+        # \r\n line ends, as the csv module writes them (the reference format)
+        np.savetxt(csv_path, table, fmt="%d", delimiter=",", newline="\r\n",
+                   header="update_id,price_fp,qty_fp", comments="")
+    if npz_path:
+        np.savez(npz_path, update_id=cols.update_id, price_fp=price_bits, qty_fp=qty_bits,
+                 ts_ns=cols.ts_ns, side=cols.side)
+    return len(price_bits)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Generate depth_cpu_ref.csv (float32 bit patterns) from a depth log.")
+    ap.add_argument("logfile", help="Path to binance_depth*.log")
+    ap.add_argument("--csv", default=DEFAULT_CSV, help="CSV output (default: depth_cpu_ref.csv)")
+    ap.add_argument("--npz", default=None, help="also write a binary .npz reference")
+    args = ap.parse_args(argv)
+
+    cols = load_log_columns(args.logfile)
+    n = write_reference(cols, args.csv, args.npz)
+    print(f"[ref] {n} rows -> {args.csv}" + (f", {args.npz}" if args.npz else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 # depth_stage4_compare.py
 
-import pandas as pd
+import argparse
 import csv
 
+import numpy as np
+
+from artifact_cache import cached_arrays, default_cache
+from clock_sync import is_sync
+from ila_csv_loader import load_depth_events
+from sequence_align import align_events, alignment_counts, paired_elements
+
 ILA_CSV     = "depth_stage4_small.csv"
 CPU_REF_CSV = "depth_cpu_ref.csv"
 
@@ -18,83 +25,83 @@ def decode_depth(depth_hex: str):
     qty_fp    = shifted & ((1 << 32) - 1)
     return update_id, price_fp, qty_fp
 
-def load_fpga_events(csv_path: str):
-    df = pd.read_csv(csv_path)
+def _triples(cols):
+    return list(zip(cols["update_id"].tolist(), cols["price_fp"].tolist(), cols["qty_fp"].tolist()))
 
-    # Drop the radix row
-    df = df[df["Sample in Buffer"] != "Radix - UNSIGNED"].copy()
 
-    # Keep only rows where unpack_valid == 1
-    # Depending on how Vivado exported, the column may be "0"/"1" strings or ints.
-    valid_mask = df[VALID_COL].astype(int) == 1
-    df_valid = df[valid_mask]
+def load_fpga_events(csv_path: str, cache=None):
+    """
+    FPGA events and the number of clock-sync records left out. Keeps every
+    sample with unpack_valid == 1 (level, not edge: a strobe held high over
+    back-to-back events is one event per cycle here). Sync records (replay
+    --sync-every) reach the core as ask deletes at price 0 with SYNC_UID_FLAG
+    (bit 55, kept by the 56-bit update_id of depth_ev_packed) set; the CPU
+    reference has no counterpart, so they are dropped.
+    """
+    def parse():
+        ev = load_depth_events(csv_path, VALID_COL, DEPTH_COL, mode="level")
+        return {"update_id": ev.update_id, "price_fp": ev.price, "qty_fp": ev.qty}
 
-    events = []
-    for _, row in df_valid.iterrows():
-        depth_hex = row[DEPTH_COL]
-        events.append(decode_depth(depth_hex))
-    return events
+    params = {"version": 1, "valid": VALID_COL, "depth": DEPTH_COL, "mode": "level"}
+    cols = cached_arrays(cache, "stage4_fpga_events", params, (csv_path,), parse)
+    sync = is_sync(cols["update_id"]) & (cols["price_fp"] == 0) & (cols["qty_fp"] == 0)
+    return _triples({k: v[~sync] for k, v in cols.items()}), int(sync.sum())
 
 
-def load_cpu_events(csv_path: str):
+def load_cpu_events(csv_path: str, cache=None):
     """
     Load all CPU events from depth_cpu_ref.csv.
     """
-    events = []
-    with open(csv_path, newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            u = int(row["update_id"])
-            p = int(row["price_fp"])
-            q = int(row["qty_fp"])
-            events.append((u, p, q))
-    return events
-
-
-def align_by_first_match(fpga, cpu):
-    """
-    Align CPU stream to FPGA window.
-
-    Strategy:
-    - Try to find first index in CPU where the triple exactly matches fpga[0].
-    - If that fails, fall back to matching only on update_id.
-    - If still no match, return original lists (then you know the runs are
-      from different parts / different logs).
+    def parse():
+        events = []
+        with open(csv_path, newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                u = int(row["update_id"])
+                p = int(row["price_fp"])
+                q = int(row["qty_fp"])
+                events.append((u, p, q))
+        cols = np.asarray(events, dtype=np.uint64).reshape(-1, 3)
+        return {"update_id": cols[:, 0], "price_fp": cols[:, 1], "qty_fp": cols[:, 2]}
+
+    return _triples(cached_arrays(cache, "stage4_cpu_ref", {"version": 1}, (csv_path,), parse))
+
+
+def align_streams(fpga, cpu):
     """
-    if not fpga:
-        return [], []
+    Align the FPGA window against the CPU stream (sequence_align: k-gram
+    anchors + gap DP), tolerating dropped / extra ILA samples.
 
-    target = fpga[0]
+    If no triple matches at all, align on update_id only (then you know the
+    decoding differs, or the runs are from different parts / different logs).
 
-    # 1) exact triple match
-    start = None
-    for i, e in enumerate(cpu):
-        if e == target:
-            start = i
-            break
-
-    # 2) fallback: update_id only
-    if start is None:
-        target_u = target[0]
-        for i, (u, p, q) in enumerate(cpu):
-            if u == target_u:
-                start = i
-                break
-
-    if start is None:
-        # No alignment possible; return as-is
-        return cpu, fpga
-
-    cpu_slice = cpu[start:start + len(fpga)]
-    fpga_slice = fpga[:len(cpu_slice)]
-    return cpu_slice, fpga_slice
+    Returns (cpu_aligned, fpga_aligned, counts) where the two lists hold the
+    paired events in order and counts has inserted / dropped totals.
+    """
+    al = align_events(cpu, fpga)
+    counts = alignment_counts(al)
+    if counts["matches"] == 0 and fpga and cpu:
+        al = align_events([e[:1] for e in cpu], [e[:1] for e in fpga])
+        counts = alignment_counts(al)
+    cpu_aligned, fpga_aligned = paired_elements(al, cpu, fpga)
+    return cpu_aligned, fpga_aligned, counts
 
 
 def main():
-    fpga_events = load_fpga_events(ILA_CSV)
-    cpu_events = load_cpu_events(CPU_REF_CSV)
+    ap = argparse.ArgumentParser(description="Compare Stage 4 ILA depth events against the CPU reference CSV.")
+    ap.add_argument("--ila", default=ILA_CSV, help="Vivado ILA CSV export")
+    ap.add_argument("--cpu-ref", default=CPU_REF_CSV, help="CPU reference CSV (depth_cpu_ref.csv)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="always reparse (cache dir: $AX_COMPARE_CACHE, 'off' disables)")
+    args = ap.parse_args()
+
+    cache = default_cache(not args.no_cache)
+    fpga_events, n_sync = load_fpga_events(args.ila, cache)
+    if n_sync:
+        print(f"Clock-sync records left out: {n_sync}")
+    cpu_events = load_cpu_events(args.cpu_ref, cache)
 
-    cpu_aligned, fpga_aligned = align_by_first_match(fpga_events, cpu_events)
+    cpu_aligned, fpga_aligned, counts = align_streams(fpga_events, cpu_events)
 
     total = min(len(cpu_aligned), len(fpga_aligned))
     matches = 0
@@ -114,6 +121,10 @@ def main():
         print(f"Match rate: {matches / total * 100:.5f}%")
     else:
         print("Match rate: N/A (no events)")
+    print(f"Inserted (FPGA only): {counts['inserted']}")
+    print(f"Dropped (CPU only): {counts['dropped']}")
+    if counts["cpu_start"] >= 0:
+        print(f"CPU window: [{counts['cpu_start']}, {counts['cpu_end']})")
 
     print("First 10 mismatches:")
     for i, f, c in mismatches[:10]:
@@ -0,0 +1,207 @@
+# ila_csv_loader.py
+#
+# Columnar loader for Vivado ILA CSV exports (library module, no CLI).
+#
+# Only the requested probe columns are kept (radix rows skipped while parsing,
+# strobes parsed as integers, hex probes as strings). Valid strobes are
+# selected with numpy, either as:
+#   - "rising": 0 -> 1 transitions (a level that stays high counts once;
+#               a strobe high on the first sample counts)
+#   - "level" : every sample with the strobe high
+# and the hex probe values are decoded in bulk:
+#   - 32-bit probes: hex -> bytes -> big-endian uint32 view
+#   - float32 probes: uint32 bits -> float32 view -> round(f * scale)
+#   - depth_ev_packed[127:0]: two big-endian uint64 halves, fields extracted
+#     with shifts/masks (same layout as depth_stage4_compare.decode_depth)
+#   - 64-bit probes (update_id, latency_measure delta): big-endian uint64
+
+import csv
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_COL = "Sample in Buffer"  # Vivado default
+
+MASK32 = np.uint64(0xFFFF_FFFF)
+
+
+class IlaActions(NamedTuple):
+    """Strategy actions (parallel arrays, one entry per selected sample)."""
+    sample: np.ndarray   # "Sample in Buffer" index
+    side: np.ndarray     # 0 = BUY, 1 = SELL
+    price: np.ndarray    # round(price_f32 * price_scale), int64
+    qty: np.ndarray      # round(qty_f32 * qty_scale), int64
+
+
+class IlaLatency(NamedTuple):
+    """latency_measure deltas (parallel arrays, one entry per selected sample)."""
+    sample: np.ndarray     # "Sample in Buffer" index of the valid strobe
+    update_id: np.ndarray  # uint64
+    delta: np.ndarray      # int64 (pl_now - ts_ns, two's complement)
+    ts_ns: Optional[np.ndarray] = None  # uint64 at the strobe, when ts_col is given
+
+
+class IlaDepthEvents(NamedTuple):
+    """Unpacked depth events (parallel arrays, one entry per selected sample)."""
+    sample: np.ndarray
+    update_id: np.ndarray  # uint64
+    price: np.ndarray      # uint32 (float32 bit pattern on the wire)
+    qty: np.ndarray        # uint32
+
+
+def resolve_column(header: List[str], name: str) -> str:
+    """
+    Exact header match, else the unique column whose probe name (path and
+    bit range stripped, e.g. "u_core/latency[63:0]" -> "latency") or
+    path-qualified name ("u_core/latency") equals `name`.
+    """
+    if name in header:
+        return name
+    hits = []
+    for col in header:
+        bare = re.sub(r"\[\d+:\d+\]$", "", col)
+        if name in (bare, bare.rsplit("/", 1)[-1]):
+            hits.append(col)
+    if len(hits) != 1:
+        raise ValueError(f"column {name!r}: {'ambiguous ' + str(hits) if hits else 'not found'}")
+    return hits[0]
+
+
+def read_header(csv_path: str) -> List[str]:
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f))
+
+
+def count_radix_rows(csv_path: str) -> int:
+    """Number of "Radix - ..." rows Vivado wrote right after the header."""
+    n = 0
+    with open(csv_path, "r", encoding="utf-8") as f:
+        f.readline()
+        for line in f:
+            if not line.startswith("Radix"):
+                break
+            n += 1
+    return n
+
+
+def read_ila_columns(csv_path: str, numeric: Sequence[str] = (),
+                     hex_cols: Sequence[str] = ()) -> Dict[str, np.ndarray]:
+    """
+    Read SAMPLE_COL, the numeric probe columns (strobes, 1-bit sides) as int64
+    and the hex probe columns as str. Returns {column: ndarray}.
+    """
+    wanted = list(dict.fromkeys([SAMPLE_COL, *numeric, *hex_cols]))
+    n_radix = count_radix_rows(csv_path)
+    df = pd.read_csv(
+        csv_path,
+        usecols=wanted,
+        skiprows=range(1, 1 + n_radix),
+        dtype={c: str for c in hex_cols},
+        keep_default_na=False,
+    )
+    return {c: df[c].to_numpy(dtype=str if c in hex_cols else np.int64) for c in wanted}
+
+
+def valid_indices(valid: np.ndarray, mode: str = "rising") -> np.ndarray:
+    """Row indices selected by a 0/1 strobe column."""
+    v = np.asarray(valid, dtype=np.int64) != 0
+    if mode == "level":
+        return np.flatnonzero(v)
+    if mode != "rising":
+        raise ValueError(f"unknown mode {mode!r}")
+    prev = np.empty_like(v)
+    prev[0:1] = False
+    prev[1:] = v[:-1]
+    return np.flatnonzero(v & ~prev)
+
+
+def _hex_to_be_words(values: np.ndarray, n_hex: int, dtype: str) -> np.ndarray:
+    if len(values) == 0:
+        return np.zeros(0, dtype=dtype)
+    s = np.char.zfill(np.char.strip(np.asarray(values, dtype=str)), n_hex)
+    if (np.char.str_len(s) != n_hex).any():
+        raise ValueError(f"probe value wider than {n_hex} hex digits")
+    return np.frombuffer(bytes.fromhex("".join(s.tolist())), dtype=dtype)
+
+
+def hex_to_u32(values: np.ndarray) -> np.ndarray:
+    """Hex strings (up to 8 digits) -> uint32."""
+    return _hex_to_be_words(values, 8, ">u4").astype(np.uint32)
+
+
+def hex_to_u64(values: np.ndarray) -> np.ndarray:
+    """Hex strings (up to 16 digits) -> uint64."""
+    return _hex_to_be_words(values, 16, ">u8").astype(np.uint64)
+
+
+def hex_to_u128_halves(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Hex strings (up to 32 digits) -> (hi, lo) uint64 halves."""
+    words = _hex_to_be_words(values, 32, ">u8").astype(np.uint64).reshape(-1, 2)
+    return words[:, 0], words[:, 1]
+
+
+def f32_bits_to_scaled(bits: np.ndarray, scale: int) -> np.ndarray:
+    """float32 bit patterns -> round(f * scale) as int64 (ties to even, like round())."""
+    f = np.asarray(bits, dtype=np.uint32).view(np.float32).astype(np.float64)
+    return np.rint(f * scale).astype(np.int64)
+
+
+def decode_depth_ev_packed(hi: np.ndarray, lo: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    depth_ev_packed[127:0] = {update_id[55:0], price[31:0], qty[31:0], hdr[7:0]}
+    (update_id keeps the 56 bits that fit after the header byte).
+    """
+    eight = np.uint64(8)
+    update_id = hi >> eight
+    price = ((hi << np.uint64(24)) | (lo >> np.uint64(40))) & MASK32
+    qty = (lo >> eight) & MASK32
+    return update_id, price.astype(np.uint32), qty.astype(np.uint32)
+
+
+def load_strategy_actions(csv_path: str, valid_col: str, side_col: str,
+                          price_col: str, qty_col: str,
+                          price_scale: int, qty_scale: int,
+                          mode: str = "rising") -> IlaActions:
+    """Strategy outputs (strat_valid/side/price/qty probes) as columnar arrays."""
+    cols = read_ila_columns(csv_path, numeric=[valid_col, side_col], hex_cols=[price_col, qty_col])
+    idx = valid_indices(cols[valid_col], mode)
+    return IlaActions(
+        sample=cols[SAMPLE_COL][idx],
+        side=cols[side_col][idx],
+        price=f32_bits_to_scaled(hex_to_u32(cols[price_col][idx]), price_scale),
+        qty=f32_bits_to_scaled(hex_to_u32(cols[qty_col][idx]), qty_scale),
+    )
+
+
+def load_depth_events(csv_path: str, valid_col: str, depth_col: str,
+                      mode: str = "rising") -> IlaDepthEvents:
+    """Packed depth events (unpack_valid + depth_ev_packed probes) as columnar arrays."""
+    cols = read_ila_columns(csv_path, numeric=[valid_col], hex_cols=[depth_col])
+    idx = valid_indices(cols[valid_col], mode)
+    hi, lo = hex_to_u128_halves(cols[depth_col][idx])
+    update_id, price, qty = decode_depth_ev_packed(hi, lo)
+    return IlaDepthEvents(cols[SAMPLE_COL][idx], update_id, price, qty)
+
+
+def load_latency_samples(csv_path: str, valid_col: str, uid_col: str, delta_col: str,
+                         mode: str = "rising", delta_lag: int = 1,
+                         ts_col: Optional[str] = None) -> IlaLatency:
+    """
+    latency_measure output per record: update_id (and ts_ns, if ts_col is
+    given) at the valid strobe, delta `delta_lag` samples later
+    (latency_measure registers delta on the cycle valid is high, so it shows
+    up one sample after the strobe). Strobes too close to the end of the
+    window to have their delta captured are dropped.
+    """
+    hex_cols = [uid_col, delta_col] + ([ts_col] if ts_col else [])
+    cols = read_ila_columns(csv_path, numeric=[valid_col], hex_cols=hex_cols)
+    idx = valid_indices(cols[valid_col], mode)
+    idx = idx[idx + delta_lag < len(cols[valid_col])]
+    return IlaLatency(
+        sample=cols[SAMPLE_COL][idx],
+        update_id=hex_to_u64(cols[uid_col][idx]),
+        delta=hex_to_u64(cols[delta_col][idx + delta_lag]).view(np.int64),
+        ts_ns=hex_to_u64(cols[ts_col][idx]) if ts_col else None,
+    )
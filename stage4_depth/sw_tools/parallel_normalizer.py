@@ -0,0 +1,213 @@
+# parallel_normalizer.py
+#
+# Multi-process normalisation of large depth logs / NDJSON captures.
+#
+#   1. the file is split into byte ranges that start and end on line
+#      boundaries (so no line or JSON message is cut)
+#   2. each range is parsed by a worker process with the depth_cpu_normalizer
+#      batch parsers
+#   3. each worker writes its columns into its own shared-memory block and
+#      returns only (block name, row count); the parent copies the blocks into
+#      the output arrays in range order and unlinks them
+#
+# Output is identical to the single-process batch iterators, in file order.
+# Small files are parsed in-process (pool startup would dominate).
+#
+# Usage:
+#   python parallel_normalizer.py binance_depth.log --out events.npz
+#   python parallel_normalizer.py depth.ndjson --format ndjson --workers 8
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from depth_cpu_normalizer import (
+    DepthEventBatch,
+    parse_binance_depth_lines,
+    parse_depth_log_lines,
+)
+
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024   # below this, parse in-process
+MIN_RANGE_BYTES = 1 * 1024 * 1024
+RANGES_PER_WORKER = 4                  # smaller ranges balance uneven lines
+
+# column order / dtypes in a shared-memory block
+COLUMNS = (
+    ("update_id", np.uint64),
+    ("side", np.uint8),
+    ("price_fp", np.int64),
+    ("qty_fp", np.int64),
+    ("ts_rx_ns", np.int64),
+)
+
+_PARSERS = {
+    "log": parse_depth_log_lines,
+    "ndjson": parse_binance_depth_lines,
+}
+
+
+def detect_format(path: str) -> str:
+    """'ndjson' if the first non-empty line is a JSON object, else 'log'."""
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                return "ndjson" if line.startswith(b"{") else "log"
+    return "log"
+
+
+def split_byte_ranges(path: str, n_ranges: int) -> List[Tuple[int, int]]:
+    """[start, end) byte ranges covering the file, each ending after a newline."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    n_ranges = max(1, min(n_ranges, size // MIN_RANGE_BYTES or 1))
+    bounds = [0]
+    with open(path, "rb") as f:
+        for k in range(1, n_ranges):
+            target = max(size * k // n_ranges, bounds[-1])
+            f.seek(target)
+            f.readline()            # move to the start of the next line
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_range(path: str, start: int, end: int, fmt: str) -> DepthEventBatch:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _PARSERS[fmt](data.decode("utf-8").splitlines())
+
+
+def _block_layout(n: int) -> Tuple[List[int], int]:
+    offsets = []
+    off = 0
+    for _, dtype in COLUMNS:
+        off = (off + 7) & ~7
+        offsets.append(off)
+        off += n * np.dtype(dtype).itemsize
+    return offsets, max(off, 1)
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    # The parent owns the block's lifetime: keep the worker's resource tracker
+    # from unlinking it (or warning about it) when the worker exits.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")  # noqa: SLF001
+    except Exception:
+        pass
+
+
+def _worker(args: Tuple[str, int, int, str]) -> Tuple[Optional[str], int]:
+    path, start, end, fmt = args
+    batch = _parse_range(path, start, end, fmt)
+    n = len(batch)
+    if n == 0:
+        return None, 0
+    offsets, size = _block_layout(n)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    _untrack(shm)
+    try:
+        for (name, dtype), off in zip(COLUMNS, offsets):
+            np.ndarray(n, dtype=dtype, buffer=shm.buf, offset=off)[:] = getattr(batch, name)
+    finally:
+        shm.close()
+    return shm.name, n
+
+
+def _collect(blocks: Sequence[Tuple[Optional[str], int]]) -> DepthEventBatch:
+    total = sum(n for _, n in blocks)
+    out = {name: np.empty(total, dtype=dtype) for name, dtype in COLUMNS}
+    pos = 0
+    for shm_name, n in blocks:
+        if shm_name is None:
+            continue
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            offsets, _ = _block_layout(n)
+            for (name, dtype), off in zip(COLUMNS, offsets):
+                out[name][pos:pos + n] = np.ndarray(n, dtype=dtype, buffer=shm.buf, offset=off)
+        finally:
+            shm.close()
+            shm.unlink()
+        pos += n
+    return DepthEventBatch(**out)
+
+
+def normalize_parallel(path: str, fmt: str = "auto", workers: Optional[int] = None) -> DepthEventBatch:
+    """
+    Normalise a whole depth log ('log') or depthUpdate NDJSON ('ndjson') file
+    into one DepthEventBatch, in file order.
+    """
+    if fmt == "auto":
+        fmt = detect_format(path)
+    if fmt not in _PARSERS:
+        raise ValueError(f"unknown format {fmt!r}")
+
+    size = os.path.getsize(path)
+    if workers is None:
+        workers = (os.cpu_count() or 1) if size >= PARALLEL_MIN_BYTES else 1
+    if workers <= 1:
+        return _parse_range(path, 0, size, fmt)
+
+    ranges = split_byte_ranges(path, workers * RANGES_PER_WORKER)
+    if len(ranges) <= 1:
+        return _parse_range(path, 0, size, fmt)
+
+    tasks = [(path, s, e, fmt) for s, e in ranges]
+    blocks: List[Tuple[Optional[str], int]] = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for block in pool.map(_worker, tasks):
+                blocks.append(block)
+        return _collect(blocks)
+    except BaseException:
+        # do not leak blocks of finished workers
+        for shm_name, _ in blocks:
+            if shm_name is None:
+                continue
+            try:
+                shm = shared_memory.SharedMemory(name=shm_name)
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        raise
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Normalise a large depth log / NDJSON capture with a process pool.")
+    ap.add_argument("input", help="Stage 2 depth log (ts_ns,u,side,price,qty) or depthUpdate NDJSON")
+    ap.add_argument("--format", choices=["auto", "log", "ndjson"], default="auto")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="worker processes (default: all cores for files >= 8 MiB, else 1)")
+    ap.add_argument("--out", default=None, help="write the columns to .npz")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    batch = normalize_parallel(args.input, args.format, args.workers)
+    dt = time.perf_counter() - t0
+
+    size = os.path.getsize(args.input)
+    print(f"events:     {len(batch)}")
+    print(f"bids/asks:  {int((batch.side == 0).sum())} / {int((batch.side == 1).sum())}")
+    print(f"elapsed:    {dt:.3f} s  ({size / max(dt, 1e-9) / 1e6:.1f} MB/s, "
+          f"{len(batch) / max(dt, 1e-9) / 1e6:.2f} M events/s)")
+
+    if args.out:
+        np.savez(args.out, **{name: getattr(batch, name) for name, _ in COLUMNS})
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
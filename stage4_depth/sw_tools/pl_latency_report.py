@@ -0,0 +1,372 @@
+# pl_latency_report.py
+#
+# Latency analytics for the latency_measure block (delta = pl_now - ts_ns,
+# registered on every unpacked record; Stage 3 top_stage3_timestamp probes it
+# as `latency` next to `update_id` and `unpack_valid`).
+#
+# For every ILA CSV export:
+#   - update_id is taken at each valid strobe and delta `--delta-lag` samples
+#     later (1 by default: delta is registered on the strobe cycle);
+#   - records are joined by update_id to the replayed input (depth log or
+#     events.bin), which gives each record its host send time;
+#   - the deltas go into mergeable quantile sketches (quantile_sketch.py):
+#       latency  : delta
+#       jitter   : |delta[i] - delta[i-1]| between consecutive records
+#       by load  : delta, bucketed by offered load = replay records/s in the
+#                  --window-ms window the record was sent in (half-octave bins)
+#     plus the RFC 3550 smoothed jitter J += (|D| - J) / 16 per capture.
+#
+# Estimates are printed after each capture (running totals), so long capture
+# series can be watched as they are processed. --sketch-out saves the merged
+# sketches as JSON; sketch files can be passed back in as inputs next to CSVs,
+# so any number of sessions can be combined without the raw exports.
+#
+# Raw deltas mix a PL cycle counter with host epoch ns. --clock applies a
+# session fit from clock_sync.py (needs the ts_ns probe) and reports ns that
+# compare across sessions and boards; without one, --offset (raw ticks, added
+# in int64 so nothing is lost at 1e18 magnitudes) and --scale are applied.
+# Clock-sync records (replay --sync-every) are left out of the statistics.
+#
+# Usage:
+#   python pl_latency_report.py ila_run1.csv ila_run2.csv --replay binance_depth_small.log
+#   python pl_latency_report.py ila_run3.csv run12.sketch.json --replay ... --sketch-out all.sketch.json
+#   python pl_latency_report.py ila.csv --delta-col u_core/latency --valid-col u_core/unpack_valid
+#   python pl_latency_report.py ila.csv --clock session1.clock.json --sketch-out session1.json
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from depth_cpu_ref_gen import load_log_columns
+from clock_sync import ClockFit, is_sync
+from ila_csv_loader import IlaLatency, load_latency_samples, read_header, resolve_column
+from quantile_sketch import DEFAULT_ACCURACY, QuantileSketch
+
+PHASE3_TOOLS = Path(__file__).resolve().parents[2] / "stage7_ps_pl_stream" / "phase3_demo_ready" / "tools"
+EVENTS_MAGICS = (b"EVT0BIN\x00", b"EVT1BIN\x00")
+
+DEFAULT_WINDOW_MS = 100.0
+LOAD_BINS_PER_OCTAVE = 2
+SKETCH_SCHEMA = "pl-latency-sketch.v2"   # v2: values carry their units
+
+
+# ---------------------------------------------------------------------------
+# inputs
+# ---------------------------------------------------------------------------
+
+class ReplaySchedule(NamedTuple):
+    """Host side of a replay, times in seconds from the first record (÷ speed)."""
+    uids: np.ndarray      # sorted unique update_id
+    uid_t: np.ndarray     # send time of each uid's first record
+    t: np.ndarray         # send time of every record, sorted
+
+
+def load_replay(path: str, speed: float = 1.0) -> ReplaySchedule:
+    """Depth log (ts_ns,updateId,...) or events.bin (E ms, u) -> ReplaySchedule."""
+    with open(path, "rb") as f:
+        magic = f.read(8)
+    if magic in EVENTS_MAGICS:
+        if str(PHASE3_TOOLS) not in sys.path:
+            sys.path.append(str(PHASE3_TOOLS))
+        from record_codecs import EventsFile
+
+        with EventsFile(Path(path)) as ev:
+            ts_ns = ev.records["E"].astype(np.int64) * 1_000_000
+            uid = ev.records["u"].astype(np.uint64)
+    else:
+        cols = load_log_columns(path)
+        ts_ns, uid = cols.ts_ns, cols.update_id
+
+    if len(ts_ns) == 0:
+        raise SystemExit(f"{path}: no records")
+    t = (ts_ns - ts_ns.min()) / 1e9 / speed
+    uids, first = np.unique(uid, return_index=True)
+    return ReplaySchedule(uids, t[first], np.sort(t))
+
+
+# ---------------------------------------------------------------------------
+# aggregation
+# ---------------------------------------------------------------------------
+
+def load_bin(rate: np.ndarray) -> np.ndarray:
+    """Half-octave bin index of a records/s rate (> 0)."""
+    return np.floor(np.log2(rate) * LOAD_BINS_PER_OCTAVE).astype(np.int64)
+
+
+def load_bin_range(b: int):
+    return 2.0 ** (b / LOAD_BINS_PER_OCTAVE), 2.0 ** ((b + 1) / LOAD_BINS_PER_OCTAVE)
+
+
+def rfc3550_jitter(step: np.ndarray) -> float:
+    """Smoothed interarrival jitter (RFC 3550 6.4.1) from |D| = |delta[i] - delta[i-1]|."""
+    j = 0.0
+    for d in step.tolist():
+        j += (d - j) / 16.0
+    return j
+
+
+def value_units(unit: str, scale: float, offset: int, clock: Optional[ClockFit]) -> dict:
+    """
+    What the sketched values are: normalised ns with a clock fit (comparable
+    across sessions), else (delta + offset) * scale in `unit`.
+    """
+    if clock is not None:
+        return {"unit": "ns", "clock_fit": True}
+    return {"unit": unit, "clock_fit": False, "scale": scale, "offset": offset}
+
+
+class LatencyStats:
+    """
+    Mergeable totals over any number of captures. units (value_units())
+    says what the values are; merge() refuses stats in other units. None
+    (an empty total) takes the units of the first merge.
+    """
+
+    def __init__(self, accuracy: float = DEFAULT_ACCURACY, units: Optional[dict] = None) -> None:
+        self.accuracy = accuracy
+        self.units = units
+        self.latency = QuantileSketch(accuracy)
+        self.jitter = QuantileSketch(accuracy)
+        self.by_load: Dict[int, QuantileSketch] = {}
+        self.windows_by_load: Dict[int, int] = {}
+        self.captures = 0
+        self.unmatched = 0
+
+    def merge(self, other: "LatencyStats") -> None:
+        if self.units is None:
+            self.units = other.units
+        elif other.units != self.units:
+            raise ValueError(f"cannot merge latencies in {other.units} into {self.units}")
+        self.latency.merge(other.latency)
+        self.jitter.merge(other.jitter)
+        for b, sk in other.by_load.items():
+            self.by_load.setdefault(b, QuantileSketch(self.accuracy)).merge(sk)
+        for b, n in other.windows_by_load.items():
+            self.windows_by_load[b] = self.windows_by_load.get(b, 0) + n
+        self.captures += other.captures
+        self.unmatched += other.unmatched
+
+    def to_dict(self) -> dict:
+        return {
+            "schema": SKETCH_SCHEMA,
+            "accuracy": self.accuracy,
+            "units": self.units,
+            "captures": self.captures,
+            "unmatched": self.unmatched,
+            "latency": self.latency.to_dict(),
+            "jitter": self.jitter.to_dict(),
+            "by_load": {str(b): sk.to_dict() for b, sk in sorted(self.by_load.items())},
+            "windows_by_load": {str(b): n for b, n in sorted(self.windows_by_load.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LatencyStats":
+        if d.get("schema") != SKETCH_SCHEMA:
+            raise ValueError(f"not a {SKETCH_SCHEMA} latency sketch file (older files have no units: re-run)")
+        s = cls(d["accuracy"], d["units"])
+        s.captures = d["captures"]
+        s.unmatched = d["unmatched"]
+        s.latency = QuantileSketch.from_dict(d["latency"])
+        s.jitter = QuantileSketch.from_dict(d["jitter"])
+        s.by_load = {int(b): QuantileSketch.from_dict(v) for b, v in d["by_load"].items()}
+        s.windows_by_load = {int(b): n for b, n in d["windows_by_load"].items()}
+        return s
+
+
+def analyse_capture(lat: IlaLatency, replay: Optional[ReplaySchedule], window_s: float,
+                    scale: float = 1.0, offset: int = 0,
+                    accuracy: float = DEFAULT_ACCURACY,
+                    clock: Optional[ClockFit] = None, unit: str = "ticks") -> Tuple[LatencyStats, dict]:
+    """
+    One capture -> (its LatencyStats, per-capture summary). Reported values
+    are clock.latency_ns() with a clock fit, else (delta + offset) * scale;
+    offset and the consecutive differences are then taken in int64 before
+    converting to float.
+    """
+    stats = LatencyStats(accuracy, value_units(unit, scale, offset, clock))
+    stats.captures = 1
+    sync = is_sync(lat.update_id)
+    lat = IlaLatency(*(a[~sync] if a is not None else None for a in lat))
+    if clock is not None:
+        raw = None
+        delta = clock.latency_ns(lat.ts_ns, lat.delta)
+    else:
+        raw = lat.delta + np.int64(offset)
+        delta = raw.astype(np.float64) * scale
+    info = {"records": int(len(delta)), "sync_records": int(sync.sum())}
+
+    if replay is not None and len(delta):
+        pos = np.searchsorted(replay.uids, lat.update_id)
+        pos_c = np.minimum(pos, len(replay.uids) - 1)
+        matched = replay.uids[pos_c] == lat.update_id
+        stats.unmatched = int((~matched).sum())
+        info["unmatched"] = stats.unmatched
+        if raw is not None:
+            raw = raw[matched]
+        delta = delta[matched]
+        send_t = replay.uid_t[pos_c[matched]]
+
+        # offered load: replay records sent in each record's window
+        win = np.floor(send_t / window_s).astype(np.int64)
+        lo = np.searchsorted(replay.t, win * window_s, side="left")
+        hi = np.searchsorted(replay.t, (win + 1) * window_s, side="left")
+        rate = (hi - lo) / window_s
+        bins = load_bin(np.maximum(rate, 1e-9))
+        for b in np.unique(bins).tolist():
+            sel = bins == b
+            stats.by_load.setdefault(b, QuantileSketch(accuracy)).add(delta[sel])
+            stats.windows_by_load[b] = stats.windows_by_load.get(b, 0) + len(np.unique(win[sel]))
+
+    stats.latency.add(delta)
+    if len(delta) > 1:
+        if raw is not None:
+            step = np.abs(np.diff(raw).astype(np.float64)) * scale
+        else:
+            step = np.abs(np.diff(delta))
+        stats.jitter.add(step)
+        info["rfc3550_jitter"] = rfc3550_jitter(step)
+    info["latency"] = stats.latency.summary()
+    return stats, info
+
+
+# ---------------------------------------------------------------------------
+# reporting
+# ---------------------------------------------------------------------------
+
+def _g(v: Optional[float]) -> str:
+    return f"{v:.6g}" if v is not None else "-"
+
+
+def format_summary(label: str, sk: QuantileSketch) -> str:
+    s = sk.summary()
+    if not s["count"]:
+        return f"{label}: no samples"
+    return (f"{label}: n={s['count']} min={_g(s['min'])} p50={_g(s['p50'])} p90={_g(s['p90'])} "
+            f"p99={_g(s['p99'])} p99.9={_g(s['p99.9'])} max={_g(s['max'])} "
+            f"mean={_g(s['mean'])} stdev={_g(s['stdev'])}")
+
+
+def print_report(stats: LatencyStats, unit: str) -> None:
+    print(f"[latency] captures={stats.captures} unmatched={stats.unmatched} "
+          f"(accuracy {stats.accuracy:.2%}, unit {unit})")
+    print("  " + format_summary("latency", stats.latency))
+    print("  " + format_summary("jitter |d[i]-d[i-1]|", stats.jitter))
+    if stats.by_load:
+        print("  latency vs offered load (records/s of the send window):")
+        print(f"    {'load':>19} {'windows':>8} {'records':>8} {'p50':>11} {'p90':>11} {'p99':>11} {'max':>11}")
+        for b in sorted(stats.by_load):
+            sk = stats.by_load[b]
+            lo, hi = load_bin_range(b)
+            print(f"    {lo:8.1f} - {hi:8.1f} {stats.windows_by_load.get(b, 0):8d} {sk.count:8d} "
+                  f"{_g(sk.quantile(0.5)):>11} {_g(sk.quantile(0.9)):>11} "
+                  f"{_g(sk.quantile(0.99)):>11} {_g(sk.max):>11}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="latency_measure delta analytics from ILA CSV exports.")
+    ap.add_argument("inputs", nargs="+",
+                    help="ILA CSV exports and/or sketch JSON files from earlier runs")
+    ap.add_argument("--replay", type=str, default=None,
+                    help="replayed depth log or events.bin (join by update_id, offered load)")
+    ap.add_argument("--speed", type=float, default=1.0,
+                    help="replay acceleration factor (send times = log times / speed)")
+    ap.add_argument("--valid-col", default="unpack_valid")
+    ap.add_argument("--uid-col", default="update_id")
+    ap.add_argument("--delta-col", default="latency")
+    ap.add_argument("--valid-mode", choices=["rising", "level"], default="rising")
+    ap.add_argument("--delta-lag", type=int, default=1,
+                    help="samples between the valid strobe and the registered delta")
+    ap.add_argument("--clock", type=str, default=None,
+                    help="clock_sync.py fit of the session: report normalised ns")
+    ap.add_argument("--ts-col", default="ts_ns", help="ts_ns probe (used with --clock)")
+    ap.add_argument("--offset", type=int, default=0, help="added to the raw delta (ticks) before --scale")
+    ap.add_argument("--scale", type=float, default=1.0, help="delta multiplier (e.g. ns per PL tick)")
+    ap.add_argument("--unit", default="ticks", help="label for the delta unit in the report")
+    ap.add_argument("--window-ms", type=float, default=DEFAULT_WINDOW_MS,
+                    help="offered-load window")
+    ap.add_argument("--accuracy", type=float, default=DEFAULT_ACCURACY,
+                    help="relative accuracy of the quantile sketches")
+    ap.add_argument("--sketch-out", type=str, default=None, help="write the merged sketches as JSON")
+    ap.add_argument("--json-out", type=str, default=None, help="write per-capture and total summaries")
+    args = ap.parse_args()
+
+    clock = ClockFit.load(args.clock) if args.clock else None
+    if clock is not None:
+        args.unit = "ns"
+        print(f"[latency] clock fit {args.clock}: PL {clock.pl_hz:,.1f} Hz "
+              f"({clock.drift_ppm:+.2f} ppm), floor {clock.floor_ns:.0f} ns, wire {clock.wire_ns:.0f} ns")
+
+    replay = load_replay(args.replay, args.speed) if args.replay else None
+    if replay is not None:
+        print(f"[latency] replay {args.replay}: {len(replay.t)} records, "
+              f"{len(replay.uids)} update ids, {replay.t[-1]:.3f} s")
+
+    total = LatencyStats(args.accuracy)
+    per_input = []
+    for path in args.inputs:
+        if path.endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                try:
+                    stats = LatencyStats.from_dict(json.load(f))
+                except ValueError as e:
+                    raise SystemExit(f"[latency] {path}: {e}")
+            info = {"sketch": True, "captures": stats.captures, "latency": stats.latency.summary()}
+        else:
+            header = read_header(path)
+            lat = load_latency_samples(
+                path,
+                valid_col=resolve_column(header, args.valid_col),
+                uid_col=resolve_column(header, args.uid_col),
+                delta_col=resolve_column(header, args.delta_col),
+                mode=args.valid_mode,
+                delta_lag=args.delta_lag,
+                ts_col=resolve_column(header, args.ts_col) if clock is not None else None,
+            )
+            stats, info = analyse_capture(lat, replay, args.window_ms / 1e3,
+                                          args.scale, args.offset, args.accuracy, clock, args.unit)
+        try:
+            total.merge(stats)
+        except ValueError as e:
+            raise SystemExit(f"[latency] {path}: {e}")
+        per_input.append({"input": path, **info})
+
+        # running estimate after each input
+        print(f"[latency] {path}: {format_summary('n', stats.latency)}"
+              + (f" jitterJ={info['rfc3550_jitter']:.6g}" if "rfc3550_jitter" in info else ""))
+        if len(args.inputs) > 1:
+            print(f"          running  p50={_g(total.latency.quantile(0.5))} "
+                  f"p99={_g(total.latency.quantile(0.99))} over {total.latency.count} records")
+
+    unit = total.units["unit"] if total.units else args.unit
+    print_report(total, unit)
+
+    if args.sketch_out:
+        Path(args.sketch_out).write_text(json.dumps(total.to_dict()) + "\n", encoding="utf-8")
+        print(f"[latency] sketches -> {args.sketch_out}")
+    if args.json_out:
+        report = {
+            "unit": unit,
+            "units": total.units,
+            "inputs": per_input,
+            "total": {
+                "captures": total.captures,
+                "unmatched": total.unmatched,
+                "latency": total.latency.summary(),
+                "jitter": total.jitter.summary(),
+                "by_load": [
+                    {"load_lo": load_bin_range(b)[0], "load_hi": load_bin_range(b)[1],
+                     "windows": total.windows_by_load.get(b, 0), **sk.summary()}
+                    for b, sk in sorted(total.by_load.items())
+                ],
+            },
+        }
+        Path(args.json_out).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"[latency] report -> {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
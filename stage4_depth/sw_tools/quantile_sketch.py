@@ -0,0 +1,155 @@
+# quantile_sketch.py
+#
+# Mergeable quantile sketch with relative-error guarantees (library module,
+# no CLI). Same idea as DDSketch:
+#
+#   gamma  = (1 + a) / (1 - a)          a = relative accuracy (default 1%)
+#   bucket = ceil(log_gamma(|v|))       one bucket per factor of gamma
+#   estimate of bucket i = 2 * gamma^i / (gamma + 1)
+#
+# so every quantile read back is within a * |true value|, whatever the
+# distribution. Positive and negative values keep separate bucket maps, zero
+# has its own count (raw latency_measure deltas can be negative: host ns epoch
+# vs a PL cycle counter).
+#
+# Two sketches with the same accuracy merge by adding bucket counts, so each
+# capture can be summarised on its own (to_dict() -> JSON) and any number of
+# captures combined later without the raw samples. Values are added in bulk
+# with numpy (np.unique over bucket indices).
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+DEFAULT_ACCURACY = 0.01
+
+
+class QuantileSketch:
+    def __init__(self, accuracy: float = DEFAULT_ACCURACY) -> None:
+        if not 0.0 < accuracy < 1.0:
+            raise ValueError("accuracy must be in (0, 1)")
+        self.accuracy = accuracy
+        self.gamma = (1.0 + accuracy) / (1.0 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.pos: Dict[int, int] = {}
+        self.neg: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # -- building --------------------------------------------------------
+
+    def _add_buckets(self, store: Dict[int, int], mags: np.ndarray) -> None:
+        if len(mags) == 0:
+            return
+        idx = np.ceil(np.log(mags) / self._log_gamma).astype(np.int64)
+        keys, counts = np.unique(idx, return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            store[k] = store.get(k, 0) + c
+
+    def add(self, values) -> None:
+        """Add a batch of values (any array-like of numbers)."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        if len(v) == 0:
+            return
+        self._add_buckets(self.pos, v[v > 0])
+        self._add_buckets(self.neg, -v[v < 0])
+        self.zero += int(np.count_nonzero(v == 0))
+        self.count += len(v)
+        self.sum += float(v.sum())
+        self.sumsq += float(np.dot(v, v))
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if not math.isclose(other.accuracy, self.accuracy):
+            raise ValueError(f"cannot merge sketches of accuracy {self.accuracy} and {other.accuracy}")
+        for mine, theirs in ((self.pos, other.pos), (self.neg, other.neg)):
+            for k, c in theirs.items():
+                mine[k] = mine.get(k, 0) + c
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    # -- reading ---------------------------------------------------------
+
+    def _value(self, index: int) -> float:
+        return 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the q-quantile (0 <= q <= 1), None when empty."""
+        if self.count == 0:
+            return None
+        if q <= 0.0:
+            return self.min
+        if q >= 1.0:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        # most negative first: largest magnitude index of the negative store
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if rank < seen:
+                return min(max(-self._value(k), self.min), self.max)
+        seen += self.zero
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if rank < seen:
+                return min(max(self._value(k), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def stdev(self) -> Optional[float]:
+        if self.count < 2:
+            return None
+        var = (self.sumsq - self.sum * self.sum / self.count) / (self.count - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99, 0.999)) -> dict:
+        out = {"count": self.count}
+        if self.count:
+            out.update(min=self.min, mean=self.mean, stdev=self.stdev, max=self.max)
+            for q in quantiles:
+                out[f"p{q * 100:g}"] = self.quantile(q)
+        return out
+
+    # -- persistence -----------------------------------------------------
+
+    def to_dict(self) -> dict:
+        return {
+            "accuracy": self.accuracy,
+            "pos": {str(k): c for k, c in sorted(self.pos.items())},
+            "neg": {str(k): c for k, c in sorted(self.neg.items())},
+            "zero": self.zero,
+            "count": self.count,
+            "sum": self.sum,
+            "sumsq": self.sumsq,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketch":
+        s = cls(d["accuracy"])
+        s.pos = {int(k): int(c) for k, c in d["pos"].items()}
+        s.neg = {int(k): int(c) for k, c in d["neg"].items()}
+        s.zero = int(d["zero"])
+        s.count = int(d["count"])
+        s.sum = float(d["sum"])
+        s.sumsq = float(d["sumsq"])
+        s.min = d["min"] if d["min"] is not None else math.inf
+        s.max = d["max"] if d["max"] is not None else -math.inf
+        return s
@@ -2,19 +2,15 @@
 
 import argparse
 import os
-import struct
 import time
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Optional
 
 import serial
 from serial.tools import list_ports
 import sys
 import pathlib
 
-# depth_cpu_ref support
-import csv
-
 # Support running both as a package module and as a standalone script
 if __package__ in (None, ""):
     this_dir = pathlib.Path(__file__).resolve().parent
@@ -26,7 +22,10 @@ if __package__ in (None, ""):
         UART_RTSCTS,
         DEFAULT_MODE,
         DEFAULT_SPEED,
+        SYNC_EVERY_S,
     )
+    # depth_cpu_ref support (generated in bulk before the send loop)
+    from depth_cpu_ref_gen import DEFAULT_CSV, RECORD_DTYPE, load_log_columns, pack_records, write_reference
 else:
     from .config import (
         UART_PORT,
@@ -34,48 +33,20 @@ else:
         UART_RTSCTS,
         DEFAULT_MODE,
         DEFAULT_SPEED,
+        SYNC_EVERY_S,
     )
+    from .depth_cpu_ref_gen import DEFAULT_CSV, RECORD_DTYPE, load_log_columns, pack_records, write_reference
 
-# 32-byte record: <QQBffxxxxxxx
-# ts_ns:   uint64
-# updateId:uint64
-# side:    uint8  (0=bid,1=ask)
-# price:   float32
-# qty:     float32
-# padding: 7 bytes
-RECORD_STRUCT = struct.Struct("<QQBffxxxxxxx")  # 32 bytes
-
+# Shared metrics layer (stage2_feed_replay/telemetry)
+STAGE2_DIR = pathlib.Path(__file__).resolve().parents[2] / "stage2_feed_replay"
+if str(STAGE2_DIR) not in sys.path:
+    sys.path.append(str(STAGE2_DIR))
+from telemetry import Telemetry, add_cli_args as add_telemetry_args
+from replay.replay_uart import ReplayMetrics
+from replay.sync_records import RECORD_STRUCT, SyncSender
 
-def parse_log_lines(path: Path) -> Iterable[Tuple[int, int, int, float, float]]:
-    """
-    Parse log file lines into records suitable for binary packing.
-
-    Input line format:
-    - Snapshot line:
-        #SNAP {"lastUpdateId": ..., "bids": [...], "asks": [...]}
-      (ignored by replay)
-
-    - Event line:
-        ts_ns,updateId,side,price,qty
-    """
-    with path.open("r") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line or line.startswith("#SNAP"):
-                continue
-
-            try:
-                ts_str, uid_str, side_str, price_str, qty_str = line.split(",")
-                ts_ns = int(ts_str)
-                update_id = int(uid_str)
-                side_code = 0 if side_str == "B" else 1  # 0 = bid, 1 = ask
-                price = float(price_str)
-                qty = float(qty_str)
-            except ValueError:
-                # Skip malformed lines
-                continue
-
-            yield ts_ns, update_id, side_code, price, qty
+# 32-byte record (layout in replay/sync_records.py, record_codecs "uart32")
+assert RECORD_DTYPE.itemsize == RECORD_STRUCT.size
 
 
 def replay_uart(
@@ -85,6 +56,11 @@ def replay_uart(
     port: str,
     baudrate: int,
     rtscts: bool,
+    ref_csv: str = DEFAULT_CSV,
+    ref_npz: Optional[str] = None,
+    tm: Optional[Telemetry] = None,
+    sync_every: float = 0.0,
+    stamp_send: bool = False,
 ) -> None:
     """
     Replay records from log_path over UART.
@@ -94,12 +70,31 @@ def replay_uart(
         sleep for the original delta between consecutive ts_ns
     - accelerated:
         sleep for delta / speed
+
+    All 32-byte records and the CPU reference (ref_csv / ref_npz, float32 bit
+    patterns of price/qty) are produced before sending starts.
+
+    Metrics go to `tm`: records / bytes sent, ser.write time, how far each
+    sleep overshot (send_lateness_seconds) and the UART driver's queue.
+
+    sync_every > 0 interleaves clock-sync records for clock_sync.py;
+    stamp_send overwrites each record's ts_ns with time.time_ns() at write
+    (pacing still follows the logged timestamps).
     """
-    records = list(parse_log_lines(log_path))
-    if not records:
+    metrics = ReplayMetrics(tm or Telemetry("replay"))
+    sync = SyncSender(sync_every)
+
+    cols = load_log_columns(str(log_path))
+    n_records = len(cols.ts_ns)
+    if not n_records:
         print("[replay] No records to replay.")
         return
 
+    payloads = pack_records(cols).tobytes()
+    if stamp_send:
+        payloads = bytearray(payloads)
+    timestamps = cols.ts_ns.tolist()
+
     try:
         ser = serial.Serial(
             port=port,
@@ -119,63 +114,64 @@ def replay_uart(
         return
 
     print(f"[replay] Opened UART {port} at {baudrate} baud")
-    print(f"[replay] Records to send: {len(records)}")
+    print(f"[replay] Records to send: {n_records}")
     print(f"[replay] Mode={mode}, speed={speed}")
+    if sync_every > 0 or stamp_send:
+        print(f"[replay] sync every {sync_every:g}s, stamp_send={stamp_send}")
 
+    # CPU REF: match FPGA price_f32 / qty_f32 bit patterns
+    if ref_csv or ref_npz:
+        write_reference(cols, ref_csv, ref_npz)
+        print(f"[replay] CPU reference: {', '.join(p for p in (ref_csv, ref_npz) if p)}")
+
+    rec_size = RECORD_STRUCT.size
     prev_ts_ns = None
     start_wall = time.time()
 
-    # OPEN CPU REF CSV HERE
-    with open("depth_cpu_ref.csv", "w", newline="") as f_csv:
-        writer = csv.writer(f_csv)
-        writer.writerow(["update_id", "price_fp", "qty_fp"])
-
-        try:
-            for idx, (ts_ns, update_id, side_code, price, qty) in enumerate(records):
-                # Timing
-                if prev_ts_ns is not None:
-                    delta_ns = ts_ns - prev_ts_ns
-                    if delta_ns < 0:
-                        delta_ns = 0
-
-                    if mode == "realtime":
-                        sleep_s = delta_ns / 1e9
-                    elif mode == "accelerated":
-                        sleep_s = (delta_ns / speed) / 1e9 if speed > 0 else 0.0
-                    else:
-                        sleep_s = 0.0
-
-                    if sleep_s > 0:
-                        time.sleep(sleep_s)
-
-                prev_ts_ns = ts_ns
-
-                # Pack record into 32 bytes (price/qty cast to float32 by struct)
-                payload = RECORD_STRUCT.pack(
-                    ts_ns,
-                    update_id,
-                    side_code,
-                    float(price),
-                    float(qty),
+    try:
+        for idx, ts_ns in enumerate(timestamps):
+            # Timing
+            if prev_ts_ns is not None:
+                delta_ns = ts_ns - prev_ts_ns
+                if delta_ns < 0:
+                    delta_ns = 0
+
+                if mode == "realtime":
+                    sleep_s = delta_ns / 1e9
+                elif mode == "accelerated":
+                    sleep_s = (delta_ns / speed) / 1e9 if speed > 0 else 0.0
+                else:
+                    sleep_s = 0.0
+
+                if sleep_s > 0:
+                    t_sleep = time.perf_counter()
+                    time.sleep(sleep_s)
+                    metrics.lateness_s.observe(time.perf_counter() - t_sleep - sleep_s)
+
+            prev_ts_ns = ts_ns
+            metrics.send_sync(sync, ser)
+
+            # Send the pre-packed 32-byte record over UART
+            if stamp_send:
+                payloads[idx * rec_size:idx * rec_size + 8] = time.time_ns().to_bytes(8, "little")
+            t_write = time.perf_counter()
+            ser.write(payloads[idx * rec_size:(idx + 1) * rec_size])
+            metrics.write_s.observe(time.perf_counter() - t_write)
+            metrics.records.inc()
+            metrics.bytes.inc(rec_size)
+            if idx % ReplayMetrics.OUT_WAITING_EVERY == 0:
+                metrics.sample_out_waiting(ser)
+
+            if (idx + 1) % 1000 == 0:
+                elapsed = time.time() - start_wall
+                rate = (idx + 1) / elapsed if elapsed > 0 else 0.0
+                print(
+                    f"[replay] sent={idx + 1}/{n_records} ({rate:.0f} rec/s)"
                 )
-
-                # Send over UART
-                ser.write(payload)
-
-                # CPU REF ROW: match FPGA price_f32 / qty_f32 bit patterns
-                price_bits = struct.unpack("<I", struct.pack("<f", float(price)))[0]
-                qty_bits   = struct.unpack("<I", struct.pack("<f", float(qty)))[0]
-                writer.writerow([update_id, price_bits, qty_bits])
-
-                if (idx + 1) % 1000 == 0:
-                    elapsed = time.time() - start_wall
-                    rate = (idx + 1) / elapsed if elapsed > 0 else 0.0
-                    print(
-                        f"[replay] sent={idx + 1}/{len(records)} ({rate:.0f} rec/s)"
-                    )
-        finally:
-            ser.close()
-            print("[replay] UART closed.")
+        metrics.send_sync(sync, ser, final=True)
+    finally:
+        ser.close()
+        print("[replay] UART closed.")
 
 
 def main() -> None:
@@ -217,6 +213,30 @@ def main() -> None:
         action="store_true",
         help="Enable RTS/CTS flow control",
     )
+    parser.add_argument(
+        "--ref-csv",
+        type=str,
+        default=DEFAULT_CSV,
+        help="CPU reference CSV written before sending ('' to skip)",
+    )
+    parser.add_argument(
+        "--ref-npz",
+        type=str,
+        default=None,
+        help="Also write the CPU reference as .npz",
+    )
+    parser.add_argument(
+        "--sync-every",
+        type=float,
+        default=SYNC_EVERY_S,
+        help="Send a clock-sync record at most every N seconds (0 = off)",
+    )
+    parser.add_argument(
+        "--stamp-send",
+        action="store_true",
+        help="Overwrite ts_ns with the host time at write (latency runs)",
+    )
+    add_telemetry_args(parser)
 
     args = parser.parse_args()
     log_path = Path(args.logfile)
@@ -238,14 +258,23 @@ def main() -> None:
     )
     rtscts = args.rtscts or (os.getenv("UART_RTSCTS", str(UART_RTSCTS)).lower() in ("1", "true", "yes"))
 
-    replay_uart(
-        log_path=log_path,
-        mode=args.mode,
-        speed=args.speed,
-        port=port,
-        baudrate=baud,
-        rtscts=rtscts,
-    )
+    tm = Telemetry.from_args("replay", args)
+    try:
+        replay_uart(
+            log_path=log_path,
+            mode=args.mode,
+            speed=args.speed,
+            port=port,
+            baudrate=baud,
+            rtscts=rtscts,
+            ref_csv=args.ref_csv,
+            ref_npz=args.ref_npz,
+            tm=tm,
+            sync_every=args.sync_every,
+            stamp_send=args.stamp_send,
+        )
+    finally:
+        tm.close()
 
 
 if __name__ == "__main__":
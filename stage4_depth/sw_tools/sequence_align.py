@@ -0,0 +1,296 @@
+# sequence_align.py
+#
+# Gap-tolerant alignment of an FPGA event/action window against the CPU
+# reference stream (library module, no CLI).
+#
+#   1. every element (tuple of ints) is hashed to a uint64, and every k-tuple
+#      of consecutive elements to a polynomial rolling hash
+#   2. FPGA k-grams are looked up in the sorted CPU k-gram index; k-grams that
+#      repeat a lot in the CPU stream (e.g. the same action over and over) only
+#      keep the hits closest to the dominant offset of the rare ones
+#   3. hits on the same diagonal (cpu_idx - fpga_idx) are merged into exact
+#      runs, and a monotone chain of runs is picked longest-first
+#   4. the gaps between chained runs (and the two ends) are filled with a
+#      small edit-distance DP, so drops / extra samples / corrupted samples
+#      show up as dropped / inserted / mismatched instead of shifting every
+#      later comparison
+#
+# The CPU stream before the first and after the last aligned element is not
+# part of the capture window and is not reported as dropped.
+#
+# Cost is ~linear in the stream lengths when the streams mostly agree; only
+# the gaps are aligned quadratically.
+
+from bisect import bisect_right
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+KIND_MATCH = 0
+KIND_MISMATCH = 1
+KIND_INSERTED = 2  # in the FPGA stream, not in the CPU stream
+KIND_DROPPED = 3   # in the CPU stream, missing from the FPGA stream
+
+DEFAULT_K = 8
+DEFAULT_SLACK = 64            # extra CPU elements considered around each end
+DEFAULT_MAX_HITS = 4          # hits kept per repeated k-gram
+DEFAULT_MAX_GAP_CELLS = 4_000_000
+MIN_RUN = 4                   # shorter exact runs are too ambiguous to anchor on
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_KGRAM_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+
+class Alignment(NamedTuple):
+    """One entry per alignment step; -1 marks the missing side."""
+    fpga_idx: np.ndarray  # int64
+    cpu_idx: np.ndarray   # int64
+    kind: np.ndarray      # int8, KIND_*
+
+
+def _as_rows(seq) -> np.ndarray:
+    rows = np.asarray(seq, dtype=np.uint64)
+    if rows.size == 0:
+        return np.zeros((0, 1), dtype=np.uint64)
+    return rows.reshape(len(rows), -1)
+
+
+def element_hashes(rows: np.ndarray) -> np.ndarray:
+    """FNV-style mix of each row's columns plus a splitmix64 finaliser."""
+    h = np.full(len(rows), _FNV_OFFSET, dtype=np.uint64)
+    for c in range(rows.shape[1]):
+        h = (h ^ rows[:, c]) * _FNV_PRIME
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xFF51AFD7ED558CCD)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xC4CEB9FE1A85EC53)
+    h ^= h >> np.uint64(33)
+    return h
+
+
+def kgram_hashes(e: np.ndarray, k: int) -> np.ndarray:
+    """Hash of e[i:i+k] for every i (len(e) - k + 1 values)."""
+    n = len(e) - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    h = np.zeros(n, dtype=np.uint64)
+    for t in range(k):
+        h = h * _KGRAM_BASE + e[t:t + n]
+    return h
+
+
+def _anchor_hits(hf: np.ndarray, hc: np.ndarray, max_hits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(fpga_pos, cpu_pos) pairs of equal k-gram hashes."""
+    order = np.argsort(hc, kind="stable")      # equal hashes keep ascending cpu_pos
+    sc = hc[order]
+    lo = np.searchsorted(sc, hf, "left")
+    hi = np.searchsorted(sc, hf, "right")
+    cnt = hi - lo
+
+    def expand(sel, first, count):
+        total = int(count.sum())
+        fi = np.repeat(sel, count)
+        k = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+        return fi, order[np.repeat(first, count) + k]
+
+    rare = np.flatnonzero((cnt > 0) & (cnt <= max_hits))
+    fi, cj = expand(rare, lo[rare], cnt[rare])
+
+    common = np.flatnonzero(cnt > max_hits)
+    if len(common):
+        # expected cpu position = fpga position + dominant rare offset
+        if len(fi):
+            diag, votes = np.unique(cj - fi, return_counts=True)
+            d_est = int(diag[np.argmax(votes)])
+        else:
+            d_est = int(order[lo[common[0]]]) - int(common[0])  # first-match fallback
+        # nearest max_hits CPU positions inside each k-gram's group: groups are
+        # contiguous in `order` and sorted by cpu_pos, so one searchsorted on
+        # (group rank, cpu_pos) keys finds them all
+        uniq = np.unique(sc)
+        stride = len(hc) + 1
+        key = np.searchsorted(uniq, sc).astype(np.int64) * stride + order
+        target = np.clip(common + d_est, 0, len(hc))
+        mid = np.searchsorted(key, np.searchsorted(uniq, hf[common]).astype(np.int64) * stride + target)
+        first = np.clip(mid - max_hits // 2, lo[common], hi[common] - max_hits)
+        fi2, cj2 = expand(common, first, np.full(len(common), max_hits))
+        fi = np.concatenate([fi, fi2])
+        cj = np.concatenate([cj, cj2])
+    return fi.astype(np.int64), cj.astype(np.int64)
+
+
+def _runs(fi: np.ndarray, cj: np.ndarray, k: int) -> np.ndarray:
+    """Merge hits on one diagonal with consecutive positions: rows (i0, j0, length)."""
+    if len(fi) == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+    d = cj - fi
+    o = np.lexsort((fi, d))
+    d, fi, cj = d[o], fi[o], cj[o]
+    brk = np.ones(len(fi), dtype=bool)
+    brk[1:] = (d[1:] != d[:-1]) | (fi[1:] != fi[:-1] + 1)
+    starts = np.flatnonzero(brk)
+    lengths = np.diff(np.r_[starts, len(fi)]) + k - 1
+    return np.stack([fi[starts], cj[starts], lengths], axis=1)
+
+
+def _chain(runs: np.ndarray, min_len: int) -> List[Tuple[int, int, int]]:
+    """Monotone, non-overlapping subset of runs, longest first (earliest CPU wins ties)."""
+    order = np.lexsort((runs[:, 1], -runs[:, 2]))
+    acc_i: List[int] = []
+    acc: List[Tuple[int, int, int]] = []
+    for i0, j0, length in runs[order].tolist():
+        p = bisect_right(acc_i, i0)
+        if p > 0:
+            pi, pj, pl = acc[p - 1]
+            shift = max(0, pi + pl - i0, pj + pl - j0)
+            i0 += shift
+            j0 += shift
+            length -= shift
+        if p < len(acc):
+            ni, nj, _ = acc[p]
+            length = min(length, ni - i0, nj - j0)
+        if length < min_len:
+            continue
+        p = bisect_right(acc_i, i0)
+        acc_i.insert(p, i0)
+        acc.insert(p, (i0, j0, length))
+    return acc
+
+
+def _align_block(ef: np.ndarray, ec: np.ndarray, free_prefix: bool, free_suffix: bool,
+                 max_cells: int) -> List[Tuple[int, int]]:
+    """
+    Edit-distance alignment of two short element-hash arrays.
+    Returns (fpga_local or -1, cpu_local or -1) steps in order.
+    """
+    a, b = len(ef), len(ec)
+    if a == 0 and (free_prefix or free_suffix):
+        return []
+    if (a + 1) * (b + 1) > max_cells:
+        # too large to align: compare positionally
+        n = min(a, b)
+        steps = [(i, i) for i in range(n)]
+        steps += [(i, -1) for i in range(n, a)]
+        if not (free_prefix or free_suffix):
+            steps += [(-1, j) for j in range(n, b)]
+        return steps
+
+    # Lexicographic costs: fewest edits first, then fewest gap steps (a
+    # mismatch beats an insert + drop pair, and on ties pairing wins).
+    w = a + b + 1
+    gap = w + 1
+    jj = np.arange(b + 1, dtype=np.int64) * gap
+    moves = np.zeros((a + 1, b + 1), dtype=np.uint8)   # 0 diag, 1 up (inserted), 2 left (dropped)
+    prev = np.zeros(b + 1, dtype=np.int64) if free_prefix else jj.copy()
+    moves[0, 1:] = 2
+    moves[1:, 0] = 1
+    for i in range(1, a + 1):
+        up = prev + gap
+        c = up.copy()
+        diag = prev[:-1] + w * (ec != ef[i - 1])
+        use_diag = diag <= up[1:]
+        c[1:] = np.where(use_diag, diag, up[1:])
+        row = jj + np.minimum.accumulate(c - jj)
+        mv = np.where(row < c, 2, 1).astype(np.uint8)
+        mv[1:][(row[1:] == c[1:]) & use_diag] = 0
+        mv[0] = 1
+        moves[i] = mv
+        prev = row
+
+    j = int(np.argmin(prev)) if free_suffix else b
+    i = a
+    steps: List[Tuple[int, int]] = []
+    while i > 0 or j > 0:
+        if i == 0 and free_prefix:
+            break
+        mv = moves[i, j]
+        if mv == 0:
+            i -= 1
+            j -= 1
+            steps.append((i, j))
+        elif mv == 1:
+            i -= 1
+            steps.append((i, -1))
+        else:
+            j -= 1
+            steps.append((-1, j))
+    steps.reverse()
+    return steps
+
+
+def align_events(cpu: Sequence, fpga: Sequence, k: int = DEFAULT_K,
+                 slack: int = DEFAULT_SLACK, max_hits: int = DEFAULT_MAX_HITS,
+                 max_gap_cells: int = DEFAULT_MAX_GAP_CELLS) -> Alignment:
+    """
+    Align an FPGA window against the CPU stream. Elements are equal-width
+    tuples of non-negative ints (e.g. (update_id, price, qty)).
+    """
+    rows_c = _as_rows(cpu)
+    rows_f = _as_rows(fpga)
+    n, m = len(rows_c), len(rows_f)
+    if m == 0:
+        z = np.zeros(0, dtype=np.int64)
+        return Alignment(z, z, np.zeros(0, dtype=np.int8))
+
+    ec = element_hashes(rows_c)
+    ef = element_hashes(rows_f)
+
+    k = max(1, min(k, m))
+    runs = _runs(*_anchor_hits(kgram_hashes(ef, k), kgram_hashes(ec, k), max_hits), k)
+    chain = _chain(runs, max(k, MIN_RUN)) if len(runs) else []
+
+    f_out: List[int] = []
+    c_out: List[int] = []
+
+    def block(i0, i1, j0, j1, free_prefix, free_suffix):
+        for fl, cl in _align_block(ef[i0:i1], ec[j0:j1], free_prefix, free_suffix, max_gap_cells):
+            f_out.append(i0 + fl if fl >= 0 else -1)
+            c_out.append(j0 + cl if cl >= 0 else -1)
+
+    if not chain:
+        block(0, m, 0, n, True, True)
+    else:
+        i0, j0, _ = chain[0]
+        block(0, i0, max(0, j0 - i0 - slack), j0, True, False)
+        for idx, (ri, rj, rl) in enumerate(chain):
+            f_out.extend(range(ri, ri + rl))
+            c_out.extend(range(rj, rj + rl))
+            if idx + 1 < len(chain):
+                ni, nj, _ = chain[idx + 1]
+                block(ri + rl, ni, rj + rl, nj, False, False)
+        li, lj, ll = chain[-1]
+        i_end, j_end = li + ll, lj + ll
+        block(i_end, m, j_end, min(n, j_end + (m - i_end) + slack), False, True)
+
+    fi = np.asarray(f_out, dtype=np.int64)
+    ci = np.asarray(c_out, dtype=np.int64)
+    kind = np.full(len(fi), KIND_MISMATCH, dtype=np.int8)
+    kind[ci < 0] = KIND_INSERTED
+    kind[fi < 0] = KIND_DROPPED
+    both = np.flatnonzero((fi >= 0) & (ci >= 0))
+    same = (rows_f[fi[both]] == rows_c[ci[both]]).all(axis=1)
+    kind[both[same]] = KIND_MATCH
+    return Alignment(fi, ci, kind)
+
+
+def alignment_counts(al: Alignment) -> Dict[str, int]:
+    counts = np.bincount(al.kind.astype(np.int64), minlength=4)
+    paired = int(counts[KIND_MATCH] + counts[KIND_MISMATCH])
+    cpu_span = al.cpu_idx[al.cpu_idx >= 0]
+    return {
+        "compared": paired,
+        "matches": int(counts[KIND_MATCH]),
+        "mismatches": int(counts[KIND_MISMATCH]),
+        "inserted": int(counts[KIND_INSERTED]),
+        "dropped": int(counts[KIND_DROPPED]),
+        "cpu_start": int(cpu_span[0]) if len(cpu_span) else -1,
+        "cpu_end": int(cpu_span[-1]) + 1 if len(cpu_span) else -1,
+    }
+
+
+def paired_elements(al: Alignment, cpu: Sequence, fpga: Sequence) -> Tuple[list, list]:
+    """(cpu_aligned, fpga_aligned): the elements of every paired step, in order."""
+    both = (al.fpga_idx >= 0) & (al.cpu_idx >= 0)
+    return ([cpu[j] for j in al.cpu_idx[both].tolist()],
+            [fpga[i] for i in al.fpga_idx[both].tolist()])
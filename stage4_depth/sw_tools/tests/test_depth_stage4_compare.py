@@ -0,0 +1,50 @@
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SW_TOOLS = Path(__file__).resolve().parents[1]
+if str(SW_TOOLS) not in sys.path:
+    sys.path.insert(0, str(SW_TOOLS))
+
+import depth_stage4_compare as cmp  # noqa: E402
+from clock_sync import is_sync  # noqa: E402
+from ila_csv_loader import decode_depth_ev_packed  # noqa: E402
+from replay.sync_records import SYNC_SIDE, SYNC_UID_FLAG  # noqa: E402
+
+
+def f32_bits(x: float) -> int:
+    return struct.unpack("<I", struct.pack("<f", x))[0]
+
+
+def packed(update_id: int, price: float, qty: float, hdr: int = 0) -> int:
+    """depth_ev_packed[127:0] = {update_id[55:0], price[31:0], qty[31:0], hdr[7:0]}"""
+    uid56 = update_id & ((1 << 56) - 1)
+    return (uid56 << 72) | (f32_bits(price) << 40) | (f32_bits(qty) << 8) | hdr
+
+
+def write_ila_csv(path: Path, rows) -> None:
+    lines = [f"Sample in Buffer,Sample in Window,TRIGGER,{cmp.VALID_COL},{cmp.DEPTH_COL}",
+             "Radix - UNSIGNED,UNSIGNED,UNSIGNED,HEX,HEX"]
+    for i, value in enumerate(rows):
+        lines.append(f"{i},{i},0,1,{value:032x}")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_packed_sync_record_keeps_its_flag():
+    value = packed(SYNC_UID_FLAG | 5, 0.0, 0.0, hdr=SYNC_SIDE)
+    hi = np.array([value >> 64], dtype=np.uint64)
+    lo = np.array([value & ((1 << 64) - 1)], dtype=np.uint64)
+    update_id, price, qty = decode_depth_ev_packed(hi, lo)
+    assert is_sync(update_id).tolist() == [True]
+    assert int(price[0]) == 0 and int(qty[0]) == 0
+
+
+def test_sync_rows_left_out_of_fpga_events(tmp_path):
+    data = [packed(80857163021, 95349.0, 0.5), packed(80857163022, 95350.0, 0.0)]
+    csv_path = tmp_path / "ila.csv"
+    write_ila_csv(csv_path, [data[0], packed(SYNC_UID_FLAG | 7, 0.0, 0.0, hdr=SYNC_SIDE), data[1]])
+    events, n_sync = cmp.load_fpga_events(str(csv_path), cache=None)
+    assert n_sync == 1
+    assert [e[0] for e in events] == [80857163021, 80857163022]
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SW_TOOLS = Path(__file__).resolve().parents[1]
+if str(SW_TOOLS) not in sys.path:
+    sys.path.insert(0, str(SW_TOOLS))
+
+import parallel_normalizer  # noqa: E402
+from depth_cpu_normalizer import iter_binance_depth_events  # noqa: E402
+
+REPO = SW_TOOLS.parents[1]
+SAMPLE_NDJSON = REPO / "stage7_ps_pl_stream" / "phase3_demo_ready" / "data" / "sample_btcusdt_depth.ndjson"
+
+
+def _reference():
+    events = list(iter_binance_depth_events(str(SAMPLE_NDJSON)))
+    return (
+        np.array([e.update_id for e in events], dtype=np.uint64),
+        np.array([0 if e.side == "BID" else 1 for e in events], dtype=np.uint8),
+        np.array([e.price_fp for e in events], dtype=np.int64),
+        np.array([e.qty_fp for e in events], dtype=np.int64),
+    )
+
+
+def _check(batch):
+    uid, side, price, qty = _reference()
+    assert len(batch) == len(uid) == 2735   # the records of sample_btcusdt_depth.events.bin
+    np.testing.assert_array_equal(batch.update_id, uid)
+    np.testing.assert_array_equal(batch.side, side)
+    np.testing.assert_array_equal(batch.price_fp, price)
+    np.testing.assert_array_equal(batch.qty_fp, qty)
+
+
+def test_sample_capture_in_process():
+    # the capture starts with a meta line and a subscribe ack: both skipped
+    assert parallel_normalizer.detect_format(str(SAMPLE_NDJSON)) == "ndjson"
+    _check(parallel_normalizer.normalize_parallel(str(SAMPLE_NDJSON)))
+
+
+def test_sample_capture_across_workers(monkeypatch):
+    monkeypatch.setattr(parallel_normalizer, "MIN_RANGE_BYTES", 4096)
+    assert len(parallel_normalizer.split_byte_ranges(str(SAMPLE_NDJSON), 8)) > 1
+    _check(parallel_normalizer.normalize_parallel(str(SAMPLE_NDJSON), workers=2))
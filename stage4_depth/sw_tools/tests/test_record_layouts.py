@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SW_TOOLS = Path(__file__).resolve().parents[1]
+if str(SW_TOOLS) not in sys.path:
+    sys.path.insert(0, str(SW_TOOLS))
+
+REPO = SW_TOOLS.parents[1]
+STAGE2_DIR = REPO / "stage2_feed_replay"
+if str(STAGE2_DIR) not in sys.path:
+    sys.path.append(str(STAGE2_DIR))
+
+import depth_cpu_ref_gen  # noqa: E402
+from record_codecs import get_codec  # noqa: E402
+from replay.sync_records import RECORD_STRUCT  # noqa: E402
+
+
+def test_uart32_layout_is_the_registry_one():
+    codec = get_codec("uart32")
+    assert depth_cpu_ref_gen.RECORD_DTYPE is codec.dtype
+    # the numpy-free stage2 struct is the only other definition
+    assert RECORD_STRUCT.format == codec.struct_fmt
+    assert RECORD_STRUCT.size == codec.size == 32
+
+
+def test_struct_and_dtype_pack_the_same_bytes():
+    arr = np.zeros(1, dtype=depth_cpu_ref_gen.RECORD_DTYPE)
+    arr[0] = (1_700_000_000_123_456_789, 42, 1, 100.5, 0.25)
+    assert arr.tobytes() == RECORD_STRUCT.pack(1_700_000_000_123_456_789, 42, 1, 100.5, 0.25)
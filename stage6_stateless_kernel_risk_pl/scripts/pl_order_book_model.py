@@ -0,0 +1,308 @@
+# pl_order_book_model.py
+#
+# Bit-accurate Python model of rtl/pl_order_book.sv, run side by side with a
+# full CPU book to measure where the PL top of book diverges.
+#
+# The PL datapath works on IEEE-754 float32 *bit patterns*: binance_depth_parser
+# copies price_f32/qty_f32 straight into depth_ev.price_fp/qty_fp, and the book
+# compares them as unsigned 32-bit integers (monotonic for positive floats).
+# The model therefore takes uint32 bit patterns and reproduces:
+#   - reset state: bid = (0, 0), ask = (0xFFFF_FFFF, 0)  (empty-ask sentinel)
+#   - insert/update: replace best only if side empty (qty == 0) or strictly better
+#     (a qty change AT the best price is ignored)
+#   - delete (qty == 0): clear best only if price == best, no rescan
+#
+# The reference book runs on the same float32 keys, so divergence is purely the
+# PL's best-only state, not float32 rounding (reported separately as collisions).
+#
+# Usage (from stage6_stateless_kernel_risk_pl/scripts):
+#   python3 pl_order_book_model.py binance_depth_tiny.log
+#   python3 pl_order_book_model.py ../../stage4_depth/sw_tools/binance_depth_small.log \
+#       --topk 1,2,4,8,16,32 --csv divergence.csv
+
+import argparse
+import os
+import sys
+from bisect import bisect_left, insort
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+STAGE4_SWTOOLS = os.path.join(HERE, "..", "..", "stage4_depth", "sw_tools")
+if STAGE4_SWTOOLS not in sys.path:
+    sys.path.append(STAGE4_SWTOOLS)
+
+from cpu_order_book import CpuOrderBook, SIDE_ASK, SIDE_BID, TopOfBook
+
+PRICE_WIDTH = 32
+QTY_WIDTH = 32
+EMPTY_ASK_PRICE = (1 << PRICE_WIDTH) - 1  # {PRICE_WIDTH{1'b1}}
+
+KIND_OK = 0
+KIND_EMPTY = 1         # PL side cleared by a delete, true book still has levels
+KIND_QTY = 2           # same best price, different qty (missed update at best)
+KIND_PRICE = 3         # different best price
+
+KIND_NAMES = {KIND_OK: "ok", KIND_EMPTY: "pl_empty", KIND_QTY: "qty", KIND_PRICE: "price"}
+
+
+class DepthLogF32(NamedTuple):
+    update_id: np.ndarray   # uint64
+    side: np.ndarray        # uint8, 0 = BID, 1 = ASK
+    price_bits: np.ndarray  # uint32 float32 bit pattern
+    qty_bits: np.ndarray    # uint32
+    price: np.ndarray       # float64 as parsed from the log
+
+
+def to_f32_bits(x) -> np.ndarray:
+    """float64 -> float32 (round to nearest even, as struct.pack('<f')) -> uint32 bits."""
+    return np.asarray(x, dtype=np.float64).astype(np.float32).view(np.uint32)
+
+
+def load_depth_log_f32(path: str) -> DepthLogF32:
+    """Parse a Stage 2 depth log (ts_ns,updateId,side,price,qty) into PL input arrays."""
+    uids: List[int] = []
+    sides: List[int] = []
+    prices: List[float] = []
+    qtys: List[float] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line or line[0] not in "0123456789":
+                continue  # blank / #SNAP
+            parts = line.rstrip("\n").split(",")
+            if len(parts) != 5:
+                continue
+            side_char = parts[2]
+            if side_char == "B":
+                side = SIDE_BID
+            elif side_char == "A":
+                side = SIDE_ASK
+            else:
+                continue
+            try:
+                uid = int(parts[1])
+                price = float(parts[3])
+                qty = float(parts[4])
+            except ValueError:
+                continue
+            uids.append(uid)
+            sides.append(side)
+            prices.append(price)
+            qtys.append(qty)
+
+    price = np.asarray(prices, dtype=np.float64)
+    return DepthLogF32(
+        np.asarray(uids, dtype=np.uint64),
+        np.asarray(sides, dtype=np.uint8),
+        to_f32_bits(price),
+        to_f32_bits(qtys),
+        price,
+    )
+
+
+def simulate_pl_order_book(side, price_bits, qty_bits) -> TopOfBook:
+    """
+    Cycle-by-cycle model of pl_order_book: one depth_valid per event, outputs
+    sampled after the registered update. Returns uint32 arrays.
+
+    The state update is a data-dependent recurrence (a delete only clears the
+    best if it hits the *current* best), so it runs as one tight scalar loop;
+    input conversion and the analysis around it are vectorised.
+    """
+    sides = np.asarray(side).tolist()
+    prices = np.asarray(price_bits, dtype=np.uint32).tolist()
+    qtys = np.asarray(qty_bits, dtype=np.uint32).tolist()
+    n = len(sides)
+
+    out_bp = [0] * n
+    out_bq = [0] * n
+    out_ap = [0] * n
+    out_aq = [0] * n
+
+    bid_p, bid_q = 0, 0
+    ask_p, ask_q = EMPTY_ASK_PRICE, 0
+
+    for i in range(n):
+        p = prices[i]
+        q = qtys[i]
+        if sides[i] == SIDE_BID:
+            if q == 0:
+                if p == bid_p:
+                    bid_p, bid_q = 0, 0
+                # else ignore for now (no rescan)
+            elif bid_q == 0 or p > bid_p:
+                bid_p, bid_q = p, q
+        else:
+            if q == 0:
+                if p == ask_p:
+                    ask_p, ask_q = EMPTY_ASK_PRICE, 0
+            elif ask_q == 0 or p < ask_p:
+                ask_p, ask_q = p, q
+        out_bp[i] = bid_p
+        out_bq[i] = bid_q
+        out_ap[i] = ask_p
+        out_aq[i] = ask_q
+
+    return TopOfBook(
+        np.asarray(out_bp, dtype=np.uint32),
+        np.asarray(out_bq, dtype=np.uint32),
+        np.asarray(out_ap, dtype=np.uint32),
+        np.asarray(out_aq, dtype=np.uint32),
+    )
+
+
+def reference_top_of_book(side, price_bits, qty_bits) -> TopOfBook:
+    """Full book on the same float32 keys, with the PL's empty-side encoding."""
+    tob = CpuOrderBook().apply_batch(side, price_bits, qty_bits)
+    ask_p = np.where(tob.ask_qty == 0, EMPTY_ASK_PRICE, tob.ask_price)
+    return TopOfBook(
+        tob.bid_price.astype(np.uint32),
+        tob.bid_qty.astype(np.uint32),
+        ask_p.astype(np.uint32),
+        tob.ask_qty.astype(np.uint32),
+    )
+
+
+def simulate_topk_book(side, price_bits, qty_bits, k: int) -> TopOfBook:
+    """
+    A PL book that stores only the best k levels per side (k BRAM entries):
+    levels that fall outside the top k are forgotten and cannot come back.
+    """
+    sides = np.asarray(side).tolist()
+    prices = np.asarray(price_bits, dtype=np.uint32).tolist()
+    qtys = np.asarray(qty_bits, dtype=np.uint32).tolist()
+    n = len(sides)
+
+    # keys ascending, best at the end (bids +price, asks -price)
+    book = {SIDE_BID: ([], {}), SIDE_ASK: ([], {})}
+    out = np.zeros((4, n), dtype=np.int64)
+    out[2, :] = EMPTY_ASK_PRICE
+
+    bkeys, bqty = book[SIDE_BID]
+    akeys, aqty = book[SIDE_ASK]
+    for i in range(n):
+        s = sides[i]
+        p = prices[i]
+        q = qtys[i]
+        keys, qty = book[s]
+        key = p if s == SIDE_BID else -p
+        if q == 0:
+            if qty.pop(p, None) is not None:
+                del keys[bisect_left(keys, key)]
+        elif p in qty:
+            qty[p] = q
+        elif len(keys) < k or key > keys[0]:
+            insort(keys, key)
+            qty[p] = q
+            if len(keys) > k:
+                worst = keys.pop(0)
+                del qty[worst if s == SIDE_BID else -worst]
+        if bkeys:
+            out[0, i] = bkeys[-1]
+            out[1, i] = bqty[bkeys[-1]]
+        if akeys:
+            out[2, i] = -akeys[-1]
+            out[3, i] = aqty[-akeys[-1]]
+
+    return TopOfBook(*(row.astype(np.uint32) for row in out))
+
+
+def classify_side(pl_p: np.ndarray, pl_q: np.ndarray, ref_p: np.ndarray, ref_q: np.ndarray) -> np.ndarray:
+    kind = np.full(len(pl_p), KIND_OK, dtype=np.uint8)
+    price_ne = pl_p != ref_p
+    kind[(pl_p == ref_p) & (pl_q != ref_q)] = KIND_QTY
+    kind[price_ne] = KIND_PRICE
+    kind[price_ne & (pl_q == 0) & (ref_q != 0)] = KIND_EMPTY
+    return kind
+
+
+def divergence_runs(mask: np.ndarray) -> np.ndarray:
+    """Lengths of consecutive True runs."""
+    if not mask.any():
+        return np.zeros(0, dtype=np.int64)
+    m = np.concatenate(([False], mask, [False])).astype(np.int8)
+    d = np.diff(m)
+    return np.flatnonzero(d == -1) - np.flatnonzero(d == 1)
+
+
+def summarize(name: str, kind: np.ndarray) -> None:
+    n = len(kind)
+    bad = kind != KIND_OK
+    runs = divergence_runs(bad)
+    counts = np.bincount(kind, minlength=4)
+    first = int(np.argmax(bad)) if bad.any() else -1
+    rate = bad.sum() / n * 100 if n else 0.0
+    print(f"  {name}: diverged={int(bad.sum())}/{n} ({rate:.2f}%) first_idx={first} "
+          f"episodes={len(runs)} longest={int(runs.max()) if len(runs) else 0}")
+    print("    by kind: " + " ".join(f"{KIND_NAMES[k]}={int(counts[k])}" for k in (1, 2, 3)))
+
+
+def compare_books(pl: TopOfBook, ref: TopOfBook):
+    bid_kind = classify_side(pl.bid_price, pl.bid_qty, ref.bid_price, ref.bid_qty)
+    ask_kind = classify_side(pl.ask_price, pl.ask_qty, ref.ask_price, ref.ask_qty)
+    return bid_kind, ask_kind
+
+
+def write_divergence_csv(path: str, log: DepthLogF32, pl: TopOfBook, ref: TopOfBook,
+                         bid_kind: np.ndarray, ask_kind: np.ndarray) -> int:
+    idx = np.flatnonzero((bid_kind != KIND_OK) | (ask_kind != KIND_OK))
+    f32 = lambda a: a[idx].view(np.float32).astype(np.float64)
+    cols = [
+        idx, log.update_id[idx], log.side[idx],
+        bid_kind[idx], f32(pl.bid_price), f32(pl.bid_qty), f32(ref.bid_price), f32(ref.bid_qty),
+        ask_kind[idx], f32(pl.ask_price), f32(pl.ask_qty), f32(ref.ask_price), f32(ref.ask_qty),
+    ]
+    header = ("idx,update_id,side,bid_kind,pl_bid_price,pl_bid_qty,ref_bid_price,ref_bid_qty,"
+              "ask_kind,pl_ask_price,pl_ask_qty,ref_ask_price,ref_ask_qty")
+    table = np.column_stack([c.astype(object) for c in cols])
+    np.savetxt(path, table, fmt="%s", delimiter=",", header=header, comments="")
+    return len(idx)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(
+        description="Bit-accurate pl_order_book model vs full book: top-of-book divergence report."
+    )
+    ap.add_argument("logfile", help="Stage 2 depth log (ts_ns,updateId,side,price,qty)")
+    ap.add_argument("--topk", default="1,2,4,8,16,32,64,128",
+                    help="comma-separated level counts for the bounded-book (BRAM sizing) sweep")
+    ap.add_argument("--csv", default=None, help="write every diverging event to this CSV")
+    args = ap.parse_args(argv)
+
+    log = load_depth_log_f32(args.logfile)
+    n = len(log.side)
+    print(f"events: {n}")
+    if n == 0:
+        return
+
+    pl = simulate_pl_order_book(log.side, log.price_bits, log.qty_bits)
+    ref = reference_top_of_book(log.side, log.price_bits, log.qty_bits)
+
+    # float32 quantisation: distinct decimal prices merged into one PL key
+    n_dec = len(np.unique(log.price))
+    n_f32 = len(np.unique(log.price_bits))
+    print(f"float32 price collisions: {n_dec - n_f32} ({n_dec} decimal -> {n_f32} float32 keys)")
+
+    print("pl_order_book vs full book:")
+    bid_kind, ask_kind = compare_books(pl, ref)
+    summarize("bid", bid_kind)
+    summarize("ask", ask_kind)
+    either = (bid_kind != KIND_OK) | (ask_kind != KIND_OK)
+    print(f"  top of book diverged on {int(either.sum())}/{n} events ({either.mean() * 100:.2f}%)")
+
+    if args.topk:
+        print("bounded top-K book vs full book (levels per side -> diverged events):")
+        for k in [int(x) for x in args.topk.split(",") if x.strip()]:
+            tk = simulate_topk_book(log.side, log.price_bits, log.qty_bits, k)
+            kb, ka = compare_books(tk, ref)
+            bad = (kb != KIND_OK) | (ka != KIND_OK)
+            print(f"  K={k:5d}: {int(bad.sum()):8d} ({bad.mean() * 100:6.2f}%)")
+
+    if args.csv:
+        rows = write_divergence_csv(args.csv, log, pl, ref, bid_kind, ask_kind)
+        print(f"wrote {rows} diverging rows to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
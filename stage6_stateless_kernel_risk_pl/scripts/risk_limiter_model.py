@@ -0,0 +1,266 @@
+# risk_limiter_model.py
+#
+# Cycle-accurate model of rtl/risk_limiter_simple.sv, driven by the replay
+# timestamps of the depth log.
+#
+# RTL behaviour reproduced:
+#   - fixed windows of WINDOW_CYCLES cycles counted from reset
+#   - out_valid = in_valid && kill_enable && (action_count < MAX_ACTIONS_PER_WINDOW),
+#     i.e. EVERY cycle with in_valid high is a request, approved or throttled
+#   - action_count clears on the last cycle of a window, except that the
+#     "if (out_valid) action_count <= action_count + 1" assignment comes later in
+#     the same always_ff and wins: an action approved on the last cycle of a
+#     window carries its count into the next window
+#
+# strategy_kernel_simple registers strat_valid from combinational book state,
+# so strat_valid is a LEVEL that stays high while the book is imbalanced
+# ("level" mode). "pulse" mode feeds one cycle per acting event instead, which
+# is what the Stage 6 compare counts as an action (rising edges).
+#
+# Timing: event i reaches the PL at
+#   cycle_i = (ts_i - ts_0) / speed * f_clk,
+# but never earlier than one UART record time after event i-1 (the replay
+# writes 32-byte records back to back), plus the book + strategy register
+# latency.
+#
+# Everything works on interval arrays, so the cost scales with the number of
+# in_valid intervals and touched windows, not with cycles.
+#
+# Usage (from stage6_stateless_kernel_risk_pl/scripts):
+#   python3 risk_limiter_model.py binance_depth_tiny.log
+#   python3 risk_limiter_model.py binance_depth_tiny.log --mode pulse --speed 5
+#   python3 risk_limiter_model.py big.log --sweep-windows 50000,500000,5000000 --sweep-limits 1,5,20
+
+import argparse
+import csv
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from stage6_actions_compare import IMB_DEN, IMB_NUM, cpu_event_arrays, strategy_kernel_decisions
+from cpu_order_book import CpuOrderBook
+
+CLK_HZ = 50_000_000             # constr: create_clock -period 20.000 (50 MHz)
+UART_BAUD = 115_200             # top_stage5_orderbook uart_rx_serial BAUD
+UART_BITS_PER_RECORD = 32 * 10  # 32-byte record, 8N1
+WINDOW_CYCLES = 500_000         # risk_limiter_simple defaults
+MAX_ACTIONS_PER_WINDOW = 5
+# depth_valid -> pl_order_book regs -> strategy_kernel_simple strat_valid reg
+PIPELINE_LATENCY_CYCLES = 2
+
+
+class LimiterResult(NamedTuple):
+    window: np.ndarray        # window index (only windows with in_valid high)
+    requested: np.ndarray     # in_valid-high cycles per window
+    approved: np.ndarray      # out_valid cycles per window
+    throttled: np.ndarray     # rate-limited cycles per window
+    killed: np.ndarray        # blocked by kill_enable == 0
+    carry_in: np.ndarray      # action_count at the window's first cycle
+    interval_approved: np.ndarray  # approved cycles per input interval
+
+
+def uart_record_cycles(clk_hz: int = CLK_HZ, baud: int = UART_BAUD) -> int:
+    # uart_rx_serial samples with CLKS_PER_BIT = CLK_FREQ_HZ / BAUD (integer)
+    return UART_BITS_PER_RECORD * (clk_hz // baud) if baud > 0 else 0
+
+
+def events_to_cycles(ts_ns, clk_hz: float = CLK_HZ, speed: float = 1.0,
+                     min_spacing_cycles: int = 0, offset_cycles: int = 0) -> np.ndarray:
+    """Map host timestamps to PL cycles since reset (strictly ordered, spaced)."""
+    ts = np.asarray(ts_ns, dtype=np.int64)
+    if len(ts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if speed <= 0:
+        raise ValueError("speed must be > 0")
+    rel = np.maximum(ts - ts[0], 0).astype(np.float64)
+    cycles = np.floor(rel / speed * (clk_hz / 1e9)).astype(np.int64)
+    # cycles never decrease, and consecutive events are >= spacing apart:
+    # c'_i = max_{j<=i}(c_j - j*s) + i*s
+    s = max(int(min_spacing_cycles), 0)
+    ramp = np.arange(len(cycles), dtype=np.int64) * s
+    cycles = np.maximum.accumulate(cycles - ramp) + ramp
+    return cycles + int(offset_cycles)
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge sorted half-open [start, end) intervals that touch or overlap."""
+    if len(starts) == 0:
+        return starts, ends
+    prev_end = np.maximum.accumulate(ends)
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = starts[1:] > prev_end[:-1]
+    idx = np.flatnonzero(new)
+    return starts[idx], np.maximum.reduceat(ends, idx)
+
+
+def strategy_valid_intervals(cycles: np.ndarray, act: np.ndarray, mode: str = "level",
+                             latency: int = PIPELINE_LATENCY_CYCLES,
+                             tail_cycles: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    in_valid-high intervals of the limiter for per-event strategy decisions.
+
+    level: strat_valid holds from event i until event i+1 changes the book
+           (the last event holds for tail_cycles)
+    pulse: one cycle per acting event
+    """
+    cycles = np.asarray(cycles, dtype=np.int64)
+    act = np.asarray(act, dtype=bool)
+    starts = cycles + latency
+    if mode == "pulse":
+        s = starts[act]
+        return merge_intervals(s, s + 1)
+    if mode != "level":
+        raise ValueError(f"unknown mode {mode!r}")
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:]
+    if len(ends):
+        ends[-1] = starts[-1] + max(int(tail_cycles), 1)
+    keep = act & (ends > starts)
+    return merge_intervals(starts[keep], ends[keep])
+
+
+def _split_by_window(starts: np.ndarray, ends: np.ndarray, window_cycles: int):
+    w0 = starts // window_cycles
+    w1 = (ends - 1) // window_cycles
+    nseg = (w1 - w0 + 1).astype(np.int64)
+    seg_iv = np.repeat(np.arange(len(starts)), nseg)
+    k = np.arange(len(seg_iv)) - np.repeat(np.cumsum(nseg) - nseg, nseg)
+    seg_w = w0[seg_iv] + k
+    seg_s = np.maximum(starts[seg_iv], seg_w * window_cycles)
+    seg_e = np.minimum(ends[seg_iv], (seg_w + 1) * window_cycles)
+    return seg_iv, seg_w, seg_s, seg_e
+
+
+def simulate_risk_limiter(starts, ends, window_cycles: int = WINDOW_CYCLES,
+                          max_actions: int = MAX_ACTIONS_PER_WINDOW,
+                          kill_enable: bool = True, _split=None) -> LimiterResult:
+    """
+    Run the limiter over sorted, non-overlapping in_valid intervals [start, end)
+    (cycles since reset).
+    """
+    if window_cycles < 1:
+        raise ValueError("window_cycles must be >= 1")
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    seg_iv, seg_w, seg_s, seg_e = _split if _split is not None else \
+        _split_by_window(starts, ends, window_cycles)
+    seg_len = seg_e - seg_s
+
+    if len(seg_w) == 0:
+        z = np.zeros(0, dtype=np.int64)
+        return LimiterResult(z, z, z, z, z, z, np.zeros(len(starts), dtype=np.int64))
+
+    first = np.flatnonzero(np.r_[True, seg_w[1:] != seg_w[:-1]])
+    last = np.r_[first[1:] - 1, len(seg_w) - 1]
+    win = seg_w[first]
+    requested = np.add.reduceat(seg_len, first)
+    seg_win = np.repeat(np.arange(len(win)), np.diff(np.r_[first, len(seg_w)]))
+
+    carry = np.zeros(len(win), dtype=np.int64)
+    if not kill_enable:
+        z = np.zeros(len(win), dtype=np.int64)
+        return LimiterResult(win, requested, z, z.copy(), requested.copy(), carry,
+                             np.zeros(len(starts), dtype=np.int64))
+
+    # Carry: only a window whose last cycle is high AND approved (all its
+    # requests fit under the limit) leaks its count into the next window.
+    last_high = seg_e[last] == (win + 1) * window_cycles
+    for i in np.flatnonzero(last_high & (requested <= max_actions)):
+        if requested[i] <= max_actions - carry[i] and i + 1 < len(win) and win[i + 1] == win[i] + 1:
+            carry[i + 1] = carry[i] + requested[i]
+
+    allow = np.maximum(max_actions - carry, 0)
+    before = np.cumsum(seg_len) - seg_len
+    before -= before[first][seg_win]
+    seg_app = np.clip(allow[seg_win] - before, 0, seg_len)
+
+    approved = np.add.reduceat(seg_app, first)
+    interval_approved = np.bincount(seg_iv, weights=seg_app, minlength=len(starts)).astype(np.int64)
+    return LimiterResult(win, requested, approved, requested - approved,
+                         np.zeros(len(win), dtype=np.int64), carry, interval_approved)
+
+
+def sweep_limiter(starts, ends, windows: Sequence[int], limits: Sequence[int],
+                  kill_enable: bool = True) -> List[Tuple[int, int, int, int, int, int]]:
+    """Rows: (window_cycles, max_actions, requested, approved, throttled, windows_throttling)."""
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    rows = []
+    for w in windows:
+        split = _split_by_window(starts, ends, w)
+        for m in limits:
+            r = simulate_risk_limiter(starts, ends, w, m, kill_enable, _split=split)
+            rows.append((w, m, int(r.requested.sum()), int(r.approved.sum()),
+                         int(r.throttled.sum()), int((r.throttled > 0).sum())))
+    return rows
+
+
+def _int_list(spec: str) -> List[int]:
+    return [int(float(x)) for x in spec.split(",") if x.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(
+        description="Cycle-accurate risk_limiter_simple model driven by depth-log replay timestamps."
+    )
+    ap.add_argument("logfile", help="Stage 2 depth log (ts_ns,updateId,side,price,qty)")
+    ap.add_argument("--mode", choices=["level", "pulse"], default="level",
+                    help="strat_valid as RTL level (default) or one pulse per acting event")
+    ap.add_argument("--clk-hz", type=float, default=CLK_HZ)
+    ap.add_argument("--speed", type=float, default=1.0, help="replay acceleration factor")
+    ap.add_argument("--baud", type=int, default=UART_BAUD,
+                    help="UART baud for back-to-back record spacing (0 = no spacing)")
+    ap.add_argument("--latency", type=int, default=PIPELINE_LATENCY_CYCLES,
+                    help="cycles from depth_valid to strat_valid")
+    ap.add_argument("--window", type=int, default=WINDOW_CYCLES, help="WINDOW_CYCLES")
+    ap.add_argument("--max-actions", type=int, default=MAX_ACTIONS_PER_WINDOW,
+                    help="MAX_ACTIONS_PER_WINDOW")
+    ap.add_argument("--kill", action="store_true", help="drive kill_enable = 0 (block everything)")
+    ap.add_argument("--imb-num", type=int, default=IMB_NUM)
+    ap.add_argument("--imb-den", type=int, default=IMB_DEN)
+    ap.add_argument("--sweep-windows", default=None, help="comma list of WINDOW_CYCLES to sweep")
+    ap.add_argument("--sweep-limits", default=None, help="comma list of MAX_ACTIONS_PER_WINDOW to sweep")
+    ap.add_argument("--per-window", default=None, help="write per-window counts to CSV")
+    args = ap.parse_args(argv)
+
+    ts, sides, prices, qtys = cpu_event_arrays(args.logfile)
+    tob = CpuOrderBook().apply_batch(sides, prices, qtys)
+    buy, sell = strategy_kernel_decisions(tob, args.imb_num, args.imb_den)
+
+    spacing = uart_record_cycles(int(args.clk_hz), args.baud)
+    cycles = events_to_cycles(ts, args.clk_hz, args.speed, spacing)
+    starts, ends = strategy_valid_intervals(cycles, buy | sell, args.mode, args.latency,
+                                            tail_cycles=max(spacing, 1))
+
+    print(f"events: {len(ts)}  acting events: {int((buy | sell).sum())}  "
+          f"in_valid intervals: {len(starts)}  span_cycles: {int(ends[-1]) if len(ends) else 0}")
+
+    if args.sweep_windows or args.sweep_limits:
+        windows = _int_list(args.sweep_windows) if args.sweep_windows else [args.window]
+        limits = _int_list(args.sweep_limits) if args.sweep_limits else [args.max_actions]
+        print(f"{'WINDOW':>10} {'MAX':>5} {'requested':>12} {'approved':>10} {'throttled':>12} {'win_thr':>8}")
+        for w, m, req, app, thr, nthr in sweep_limiter(starts, ends, windows, limits, not args.kill):
+            print(f"{w:10d} {m:5d} {req:12d} {app:10d} {thr:12d} {nthr:8d}")
+        return
+
+    r = simulate_risk_limiter(starts, ends, args.window, args.max_actions, not args.kill)
+    print(f"WINDOW_CYCLES={args.window} MAX_ACTIONS_PER_WINDOW={args.max_actions} "
+          f"kill_enable={0 if args.kill else 1}")
+    print(f"active windows: {len(r.window)}  windows throttling: {int((r.throttled > 0).sum())}  "
+          f"carry-ins: {int((r.carry_in > 0).sum())}")
+    print(f"requested: {int(r.requested.sum())}  approved: {int(r.approved.sum())}  "
+          f"throttled: {int(r.throttled.sum())}  killed: {int(r.killed.sum())}")
+
+    if args.per_window:
+        with open(args.per_window, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["window", "start_cycle", "requested", "approved", "throttled", "killed", "carry_in"])
+            for row in zip(r.window.tolist(), (r.window * args.window).tolist(), r.requested.tolist(),
+                           r.approved.tolist(), r.throttled.tolist(), r.killed.tolist(),
+                           r.carry_in.tolist()):
+                w.writerow(row)
+        print(f"wrote {args.per_window}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,12 @@
 #
 # This only checks the STRATEGY output, not the final risk_limiter gating.
 
+import argparse
 import os
 import sys
 from typing import List, Tuple
 
-import pandas as pd
+import numpy as np
 
 # ----------------------------------------------------------------------
 # Config: adjust these paths / column names to your setup
@@ -34,190 +35,103 @@ STRAT_SIDE_COL   = "strat_side"
 STRAT_PRICE_COL  = "strat_price[31:0]"
 STRAT_QTY_COL    = "strat_qty[31:0]"
 
-# Name of the "Sample in Buffer" column (Vivado default)
-SAMPLE_COL = "Sample in Buffer"
-
 # ----------------------------------------------------------------------
-# Import depth_cpu_normalizer to reuse the Binance log decoder
+# Stage 4 sw_tools: Binance log decoder, CPU book, ILA loader
 # ----------------------------------------------------------------------
 
 STAGE4_SWTOOLS = os.path.join(HERE, "..", "..", "stage4_depth", "sw_tools")
 if STAGE4_SWTOOLS not in sys.path:
     sys.path.append(STAGE4_SWTOOLS)
 
-from depth_cpu_normalizer import DepthEvent
-
-import struct  # add this
+from cpu_order_book import CpuOrderBook, TopOfBook
+from parallel_normalizer import normalize_parallel
+from ila_csv_loader import load_strategy_actions
+from artifact_cache import cached_arrays, default_cache
+from sequence_align import align_events, alignment_counts, paired_elements
 
 PRICE_SCALE = 1_000_000  # same as FPGA: 1e-6
 QTY_SCALE   = 1_000_000
 
-def iter_csv_depth_events(log_path: str):
-    """
-    Parse binance_depth_tiny.log style CSV lines:
-
-        ts_ns, update_id, side(B/A), price, qty
-
-    Yield DepthEvent(update_id, side, price_fp, qty_fp) with the
-    same fixed-point scale as the FPGA.
-    """
-    with open(log_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Skip garbage / JSON-fragment first line if present
-            if line[0] not in "0123456789":
-                continue
-
-            parts = line.split(",")
-            if len(parts) != 5:
-                # Not a data line; skip
-                continue
-
-            ts_ns_str, update_id_str, side_char, price_str, qty_str = parts
-
-            try:
-                update_id = int(update_id_str)
-                price = float(price_str)
-                qty = float(qty_str)
-            except ValueError:
-                # Malformed line; skip
-                continue
-
-            if side_char == "B":
-                side = "BID"
-            elif side_char == "A":
-                side = "ASK"
-            else:
-                # Unknown side; skip
-                continue
-
-            price_fp = int(round(price * PRICE_SCALE))
-            qty_fp   = int(round(qty   * QTY_SCALE))
-
-            yield DepthEvent(
-                update_id=update_id,
-                side=side,
-                price_fp=price_fp,
-                qty_fp=qty_fp,
-            )
-
 # ----------------------------------------------------------------------
 # CPU reference: order book + strategy kernel
 # ----------------------------------------------------------------------
 
-def best_level(levels: dict, reverse: bool) -> Tuple[int, int]:
-    """
-    Return (price_fp, qty_fp) for best level.
+# IMB_THRESHOLD_NUM = 1, IMB_THRESHOLD_DEN = 1 in your Stage 6 instantiation
+IMB_NUM = 1
+IMB_DEN = 1
 
-    reverse = True  -> max price  (best bid)
-    reverse = False -> min price  (best ask)
 
-    Returns (0, 0) if no levels are present.
+def cpu_event_arrays(log_path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Depth events of the log as parallel arrays (ts_ns, side, price_fp, qty_fp),
+    side encoded like binance_depth_types::side_t (0 = BID, 1 = ASK).
     """
-    if not levels:
-        return 0, 0
-    price = max(levels.keys()) if reverse else min(levels.keys())
-    qty = levels[price]
-    if qty <= 0:
-        return 0, 0
-    return price, qty
+    # large logs are split across worker processes; small ones parse in-process
+    ev = normalize_parallel(log_path, fmt="log")
+    return ev.ts_rx_ns, ev.side, ev.price_fp, ev.qty_fp
 
 
-def simulate_cpu_strategy(log_path: str) -> List[Tuple[int, int, int]]:
+def cpu_top_of_book(log_path: str, cache=None) -> TopOfBook:
     """
-    Rebuild a simple book from binance_depth_tiny.log and run the same
-    imbalance strategy as strategy_kernel_simple (IMB = 1:1).
-
-    Returns a list of CPU actions:
-        [(side, price_fp, qty_fp), ...]
-    where side = 0 (BUY), 1 (SELL).
+    Best bid / ask after every depth event of the log (empty side -> (0, 0)).
+    Compute this once and evaluate any number of strategy parameters on it.
     """
-    bids = {}  # price_fp -> qty_fp
-    asks = {}
+    def build():
+        return CpuOrderBook().apply_events(normalize_parallel(log_path, fmt="log"))._asdict()
 
-    actions: List[Tuple[int, int, int]] = []
+    params = {"version": 1, "price_scale": PRICE_SCALE, "qty_scale": QTY_SCALE}
+    return TopOfBook(**cached_arrays(cache, "stage6_cpu_tob", params, (log_path,), build))
 
-    # IMB_THRESHOLD_NUM = 1, IMB_THRESHOLD_DEN = 1 in your Stage 6 instantiation
-    IMB_NUM = 1
-    IMB_DEN = 1
 
-    for ev in iter_csv_depth_events(log_path):
-        # Update book
-        if ev.side == "BID":
-            book = bids
-        elif ev.side == "ASK":
-            book = asks
-        else:
-            continue
+def strategy_kernel_decisions(tob: TopOfBook, imb_num: int = IMB_NUM,
+                              imb_den: int = IMB_DEN) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorised strategy_kernel_simple over a top-of-book series.
 
-        if ev.qty_fp == 0:
-            book.pop(ev.price_fp, None)
-        else:
-            book[ev.price_fp] = ev.qty_fp
+    Returns (buy, sell) boolean masks, one entry per event:
+        BUY  if bid_qty * DEN > ask_qty * NUM
+        SELL if ask_qty * DEN > bid_qty * NUM   (only when not BUY)
+    both gated by book_ready.
+    """
+    # int64 products must not overflow (the RTL widens to 64 bits as well)
+    max_qty = int(max(tob.bid_qty.max(initial=0), tob.ask_qty.max(initial=0)))
+    if max_qty * max(imb_num, imb_den) >= (1 << 63):
+        raise ValueError(f"qty * threshold overflows int64 (NUM={imb_num}, DEN={imb_den})")
 
-        # Compute best bid / ask
-        best_bid_price, best_bid_qty = best_level(bids, reverse=True)
-        best_ask_price, best_ask_qty = best_level(asks, reverse=False)
+    # book_ready condition from strategy_kernel_simple
+    book_ready = (tob.bid_price != 0) & (tob.ask_price != 0xFFFF_FFFF)
 
-        # book_ready condition from strategy_kernel_simple
-        book_ready = (best_bid_price != 0) and (best_ask_price != 0xFFFF_FFFF)
+    buy = book_ready & (tob.bid_qty * imb_den > tob.ask_qty * imb_num)
+    sell = book_ready & ~buy & (tob.ask_qty * imb_den > tob.bid_qty * imb_num)
+    return buy, sell
 
-        if not book_ready:
-            continue
 
-        # Imbalance logic (DEN=NUM=1)
-        # BUY if bid_qty * DEN > ask_qty * NUM  => bid_qty > ask_qty
-        # SELL if ask_qty * DEN > bid_qty * NUM => ask_qty > bid_qty
-        buy_cond = (best_bid_qty * IMB_DEN) > (best_ask_qty * IMB_NUM)
-        sell_cond = (best_ask_qty * IMB_DEN) > (best_bid_qty * IMB_NUM)
+def simulate_cpu_strategy(log_path: str, cache=None) -> List[Tuple[int, int, int]]:
+    """
+    Rebuild a simple book from binance_depth_tiny.log and run the same
+    imbalance strategy as strategy_kernel_simple (IMB = 1:1).
 
-        if buy_cond:
-            side = 0
-            price = best_ask_price
-            qty = best_bid_qty
-            actions.append((side, price, qty))
-        elif sell_cond:
-            side = 1
-            price = best_bid_price
-            qty = best_ask_qty
-            actions.append((side, price, qty))
+    Returns a list of CPU actions:
+        [(side, price_fp, qty_fp), ...]
+    where side = 0 (BUY), 1 (SELL).
+    """
+    tob = cpu_top_of_book(log_path, cache)
+    buy, sell = strategy_kernel_decisions(tob)
+
+    act = buy | sell
+    # BUY crosses at the ask with bid qty, SELL crosses at the bid with ask qty
+    side = np.where(buy, 0, 1)[act]
+    price = np.where(buy, tob.ask_price, tob.bid_price)[act]
+    qty = np.where(buy, tob.bid_qty, tob.ask_qty)[act]
 
-    return actions
+    return list(zip(side.tolist(), price.tolist(), qty.tolist()))
 
 
 # ----------------------------------------------------------------------
 # FPGA actions from ILA CSV
 # ----------------------------------------------------------------------
 
-def ila_hex_to_scaled_int(value: str, scale: int) -> int:
-    """
-    Convert a 32-bit IEEE-754 float stored as hex (Vivado ILA export)
-    into a scaled integer: round(float * scale).
-
-    Examples:
-        "47bb05a0" -> 95755.25  -> 95755250000  (scale = 1e6)
-        "3dd0ea9e" -> 0.10201.. -> 102010       (scale = 1e6)
-    """
-    s = str(value).strip()
-    if not s or s == "0":
-        return 0
-
-    # Vivado ILA dumps hex like '47bb05a0'
-    try:
-        raw = int(s, 16)
-    except ValueError:
-        # If for some reason the CSV already has a decimal number
-        return int(float(s))
-
-    # Interpret raw bits as IEEE-754 single-precision float (big-endian)
-    f = struct.unpack("!f", raw.to_bytes(4, byteorder="big"))[0]
-    return int(round(f * scale))
-
-
-def load_fpga_actions(csv_path: str):
+def load_fpga_actions(csv_path: str, cache=None):
     """
     Parse FPGA strategy actions from ILA CSV.
 
@@ -225,33 +139,21 @@ def load_fpga_actions(csv_path: str):
     - Decode price/qty from IEEE-754 float hex into scaled ints
       consistent with CPU (price * 1e6, qty * 1e6).
     """
-    df = pd.read_csv(csv_path)
-
-    # Drop the radix row if present (first row often has 'Radix - UNSIGNED')
-    if isinstance(df.iloc[0]["Sample in Buffer"], str) and \
-       df.iloc[0]["Sample in Buffer"].startswith("Radix"):
-        df = df.iloc[1:, :].copy()
-
-    # Ensure strat_valid is integer 0/1
-    df[STRAT_VALID_COL] = df[STRAT_VALID_COL].astype(int)
-
-    actions = []
-    prev_valid = 0
-
-    for _, row in df.iterrows():
-        curr_valid = int(row[STRAT_VALID_COL])
-
-        # Rising edge = new action
-        if curr_valid == 1 and prev_valid == 0:
-            side  = int(row[STRAT_SIDE_COL])
-            price = ila_hex_to_scaled_int(row[STRAT_PRICE_COL], PRICE_SCALE)
-            qty   = ila_hex_to_scaled_int(row[STRAT_QTY_COL],   QTY_SCALE)
-            actions.append((side, price, qty))
-
-        prev_valid = curr_valid
-
-    return actions
-
+    def parse():
+        return load_strategy_actions(
+            csv_path, STRAT_VALID_COL, STRAT_SIDE_COL, STRAT_PRICE_COL, STRAT_QTY_COL,
+            PRICE_SCALE, QTY_SCALE, mode="rising",
+        )._asdict()
+
+    params = {
+        "version": 1,
+        "cols": [STRAT_VALID_COL, STRAT_SIDE_COL, STRAT_PRICE_COL, STRAT_QTY_COL],
+        "price_scale": PRICE_SCALE,
+        "qty_scale": QTY_SCALE,
+        "mode": "rising",
+    }
+    acts = cached_arrays(cache, "stage6_fpga_actions", params, (csv_path,), parse)
+    return list(zip(acts["side"].tolist(), acts["price"].tolist(), acts["qty"].tolist()))
 
 
 # ----------------------------------------------------------------------
@@ -260,36 +162,24 @@ def load_fpga_actions(csv_path: str):
 
 def align_sequences(cpu: List[Tuple[int, int, int]],
                     fpga: List[Tuple[int, int, int]]) -> Tuple[List[Tuple[int,int,int]],
-                                                               List[Tuple[int,int,int]]]:
+                                                               List[Tuple[int,int,int]],
+                                                               dict]:
     """
-    Align CPU and FPGA action lists by looking for the first exact match.
+    Align CPU and FPGA action lists with sequence_align (k-gram anchors +
+    gap DP), so a missed or extra strat_valid edge costs one step instead of
+    shifting the rest of the capture.
 
-    Returns (cpu_aligned, fpga_aligned) with equal length.
+    Returns (cpu_aligned, fpga_aligned, counts): the paired actions in order,
+    plus match / inserted / dropped totals.
     """
-    if not fpga:
-        return [], []
-
-    target = fpga[0]
-    start = None
-
-    # Look for exact triple match
-    for i, triple in enumerate(cpu):
-        if triple == target:
-            start = i
-            break
-
-    if start is None:
-        # No alignment possible – return as-is
-        return cpu, fpga
-
-    cpu_slice = cpu[start:start + len(fpga)]
-    fpga_slice = fpga[:len(cpu_slice)]
-    return cpu_slice, fpga_slice
+    al = align_events(cpu, fpga)
+    cpu_aligned, fpga_aligned = paired_elements(al, cpu, fpga)
+    return cpu_aligned, fpga_aligned, alignment_counts(al)
 
 
 def compare_actions(cpu: List[Tuple[int, int, int]],
                     fpga: List[Tuple[int, int, int]]) -> None:
-    cpu_aligned, fpga_aligned = align_sequences(cpu, fpga)
+    cpu_aligned, fpga_aligned, counts = align_sequences(cpu, fpga)
 
     total = min(len(cpu_aligned), len(fpga_aligned))
     matches = 0
@@ -309,6 +199,8 @@ def compare_actions(cpu: List[Tuple[int, int, int]],
     print(f"Matches:      {matches}")
     if total > 0:
         print(f"Match ratio:  {matches/total:.3f}")
+    print(f"Inserted:     {counts['inserted']} (FPGA only)")
+    print(f"Dropped:      {counts['dropped']} (CPU only)")
 
     if mismatches:
         print("First 10 mismatches (index, cpu(side,price,qty), fpga(side,price,qty)):")
@@ -317,12 +209,20 @@ def compare_actions(cpu: List[Tuple[int, int, int]],
 
 
 def main():
+    ap = argparse.ArgumentParser(description="Compare Stage 6 ILA strategy actions against the CPU reference.")
+    ap.add_argument("--log", default=LOG_PATH, help="depth log replayed into the board")
+    ap.add_argument("--ila", default=ILA_CSV, help="Vivado ILA CSV export")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="always reparse (cache dir: $AX_COMPARE_CACHE, 'off' disables)")
+    args = ap.parse_args()
+    cache = default_cache(not args.no_cache)
+
     print("Loading CPU reference actions...")
-    cpu_actions = simulate_cpu_strategy(LOG_PATH)
+    cpu_actions = simulate_cpu_strategy(args.log, cache)
     print(f"CPU actions: {len(cpu_actions)}")
 
     print("Loading FPGA actions from ILA CSV...")
-    fpga_actions = load_fpga_actions(ILA_CSV)
+    fpga_actions = load_fpga_actions(args.ila, cache)
     print(f"FPGA actions: {len(fpga_actions)}")
 
     compare_actions(cpu_actions, fpga_actions)
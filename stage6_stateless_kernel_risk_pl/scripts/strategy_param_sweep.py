@@ -0,0 +1,163 @@
+# strategy_param_sweep.py
+#
+# Sweep strategy_kernel_simple thresholds (IMB_THRESHOLD_NUM / IMB_THRESHOLD_DEN)
+# over ONE pass of the CPU book:
+#   1. the top-of-book series is computed once from the log,
+#   2. each (NUM, DEN) pair is a handful of vectorised numpy comparisons,
+#   3. large grids are split across a process pool (the series is shipped to
+#      each worker once, via the pool initializer).
+#
+# Output: one row per pair with action counts, buy/sell split and turnover
+# (sum of price * qty of the emitted actions, in quote units).
+#
+# Usage (from stage6_stateless_kernel_risk_pl/scripts):
+#   python3 strategy_param_sweep.py binance_depth_tiny.log --num 1:8 --den 1:8
+#   python3 strategy_param_sweep.py big.log --pairs 3/2,5/4,2/1 --out sweep.csv
+
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# stage6_actions_compare puts stage4_depth/sw_tools on sys.path
+from stage6_actions_compare import (
+    PRICE_SCALE,
+    QTY_SCALE,
+    cpu_top_of_book,
+    strategy_kernel_decisions,
+)
+from cpu_order_book import TopOfBook
+
+# Below this many (pairs * events) the pool startup costs more than it saves.
+PARALLEL_MIN_WORK = 50_000_000
+
+
+class SweepRow(NamedTuple):
+    num: int
+    den: int
+    actions: int
+    buys: int
+    sells: int
+    turnover: float
+
+
+def evaluate_pair(tob: TopOfBook, num: int, den: int) -> SweepRow:
+    buy, sell = strategy_kernel_decisions(tob, num, den)
+    # BUY: price = ask, qty = bid_qty; SELL: price = bid, qty = ask_qty
+    notional = (
+        np.dot(tob.ask_price[buy].astype(np.float64), tob.bid_qty[buy].astype(np.float64))
+        + np.dot(tob.bid_price[sell].astype(np.float64), tob.ask_qty[sell].astype(np.float64))
+    )
+    n_buy = int(buy.sum())
+    n_sell = int(sell.sum())
+    return SweepRow(num, den, n_buy + n_sell, n_buy, n_sell,
+                    float(notional) / (PRICE_SCALE * QTY_SCALE))
+
+
+_worker_tob: Optional[TopOfBook] = None
+
+
+def _init_worker(tob: TopOfBook) -> None:
+    global _worker_tob
+    _worker_tob = tob
+
+
+def _evaluate_chunk(pairs: Sequence[Tuple[int, int]]) -> List[SweepRow]:
+    return [evaluate_pair(_worker_tob, n, d) for n, d in pairs]
+
+
+def sweep(tob: TopOfBook, pairs: Sequence[Tuple[int, int]],
+          workers: Optional[int] = None) -> List[SweepRow]:
+    """Evaluate every (NUM, DEN) pair; rows are returned in input order."""
+    n_events = len(tob.bid_price)
+    if workers is None:
+        large = len(pairs) * n_events >= PARALLEL_MIN_WORK
+        workers = (os.cpu_count() or 1) if large else 1
+    if workers <= 1 or len(pairs) < 2:
+        return [evaluate_pair(tob, n, d) for n, d in pairs]
+
+    # A few chunks per worker keeps the pool busy when pair costs vary.
+    n_chunks = min(len(pairs), workers * 4)
+    chunks = [list(pairs[i::n_chunks]) for i in range(n_chunks)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(tob,)) as pool:
+        results = list(pool.map(_evaluate_chunk, chunks))
+
+    # undo the strided split
+    rows: List[Optional[SweepRow]] = [None] * len(pairs)
+    for i, chunk_rows in enumerate(results):
+        rows[i::n_chunks] = chunk_rows
+    return rows
+
+
+def parse_range(spec: str) -> List[int]:
+    """'4' -> [4], '1:8' -> [1..8], '2:16:2' -> [2, 4, .., 16], '1,3,5' -> [1, 3, 5]."""
+    if "," in spec:
+        return [int(x) for x in spec.split(",") if x.strip()]
+    parts = [int(x) for x in spec.split(":")]
+    if len(parts) == 1:
+        return parts
+    step = parts[2] if len(parts) > 2 else 1
+    return list(range(parts[0], parts[1] + 1, step))
+
+
+def parse_pairs(spec: str) -> List[Tuple[int, int]]:
+    pairs = []
+    for item in spec.split(","):
+        num, den = item.strip().split("/")
+        pairs.append((int(num), int(den)))
+    return pairs
+
+
+def write_rows(path: str, rows: Sequence[SweepRow]) -> None:
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["num", "den", "ratio", "actions", "buys", "sells", "buy_frac", "turnover"])
+        for r in rows:
+            buy_frac = r.buys / r.actions if r.actions else 0.0
+            w.writerow([r.num, r.den, f"{r.num / r.den:.6f}", r.actions, r.buys, r.sells,
+                        f"{buy_frac:.6f}", f"{r.turnover:.6f}"])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(
+        description="Sweep strategy_kernel_simple IMB thresholds over one CPU book pass."
+    )
+    ap.add_argument("logfile", help="Stage 2 depth log (ts_ns,updateId,side,price,qty)")
+    ap.add_argument("--num", default="1:4", help="NUM values: N | A:B[:STEP] | a,b,c")
+    ap.add_argument("--den", default="1:4", help="DEN values: N | A:B[:STEP] | a,b,c")
+    ap.add_argument("--pairs", default=None, help="explicit NUM/DEN list, e.g. 3/2,5/4 (overrides --num/--den)")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="process pool size (default: all cores for large grids, else 1)")
+    ap.add_argument("--out", default=None, help="write the full table to CSV")
+    ap.add_argument("--show", type=int, default=20, help="rows to print")
+    args = ap.parse_args(argv)
+
+    if args.pairs:
+        pairs = parse_pairs(args.pairs)
+    else:
+        pairs = [(n, d) for n in parse_range(args.num) for d in parse_range(args.den)]
+    if any(n < 0 or d < 0 for n, d in pairs) or any(d == 0 for _, d in pairs):
+        raise SystemExit("NUM must be >= 0 and DEN must be >= 1")
+
+    tob = cpu_top_of_book(args.logfile)
+    print(f"events: {len(tob.bid_price)}  pairs: {len(pairs)}")
+
+    rows = sweep(tob, pairs, args.workers)
+
+    print(f"{'NUM':>5} {'DEN':>5} {'ratio':>8} {'actions':>9} {'buys':>8} {'sells':>8} {'turnover':>16}")
+    for r in rows[:args.show]:
+        print(f"{r.num:5d} {r.den:5d} {r.num / r.den:8.3f} {r.actions:9d} {r.buys:8d} {r.sells:8d} {r.turnover:16.4f}")
+    if len(rows) > args.show:
+        print(f"... ({len(rows) - args.show} more rows)")
+
+    if args.out:
+        write_rows(args.out, rows)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
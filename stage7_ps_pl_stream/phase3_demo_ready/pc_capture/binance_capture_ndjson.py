@@ -2,14 +2,36 @@
 import argparse
 import asyncio
 import json
+import sys
 import time
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
 
 import websockets
 
+# Shared metrics layer (stage2_feed_replay/telemetry)
+STAGE2_DIR = Path(__file__).resolve().parents[3] / "stage2_feed_replay"
+if str(STAGE2_DIR) not in sys.path:
+    sys.path.append(str(STAGE2_DIR))
+from telemetry import Telemetry, add_cli_args as add_telemetry_args, ws_queue_depth
+
 BINANCE_WS_BASE = "wss://stream.binance.com:9443/ws"
 
-async def capture(symbol: str, seconds: int, out_path: str):
+def event_time_ms(msg: str) -> Optional[int]:
+    """Exchange event time E, sliced out of the raw message (no full JSON parse)."""
+    i = msg.find('"E":')
+    if i < 0:
+        return None
+    i += 4
+    while i < len(msg) and msg[i] == " ":
+        i += 1
+    j = i
+    while j < len(msg) and msg[j].isdigit():
+        j += 1
+    return int(msg[i:j]) if j > i else None
+
+async def capture(symbol: str, seconds: int, out_path: str, tm: Optional[Telemetry] = None):
     symbol_lc = symbol.lower()
     stream = f"{symbol_lc}@depth"  # diff depth
     url = BINANCE_WS_BASE
@@ -28,6 +50,13 @@ async def capture(symbol: str, seconds: int, out_path: str):
     deadline = time.time() + seconds
     n = 0
 
+    tm = tm or Telemetry("capture")
+    msgs = tm.counter("messages_total", "websocket messages written")
+    rx_bytes = tm.counter("bytes_total", "websocket payload bytes received")
+    queue_depth = tm.gauge("ws_queue_depth", "received websocket messages not yet processed")
+    write_s = tm.histogram("write_seconds", "NDJSON line write time")
+    lag_s = tm.histogram("event_lag_seconds", "receive time minus exchange event time E")
+
     async with websockets.connect(url, ping_interval=20, ping_timeout=20) as ws:
         sub = {"method": "SUBSCRIBE", "params": [stream], "id": 1}
         await ws.send(json.dumps(sub))
@@ -37,10 +66,22 @@ async def capture(symbol: str, seconds: int, out_path: str):
 
             while time.time() < deadline:
                 msg = await ws.recv()
+                t_rx = time.time()
                 # msg is a JSON string
+                t0 = time.perf_counter()
                 f.write(msg.strip() + "\n")
+                write_s.observe(time.perf_counter() - t0)
                 n += 1
 
+                msgs.inc()
+                rx_bytes.inc(len(msg))
+                depth = ws_queue_depth(ws)
+                if depth is not None:
+                    queue_depth.set(depth)
+                e_ms = event_time_ms(msg)
+                if e_ms is not None:
+                    lag_s.observe(t_rx - e_ms / 1e3)
+
     end_ms = int(time.time() * 1000)
     print(f"captured_messages={n} duration_s={seconds} start_ms={start_ms} end_ms={end_ms} out={out_path}")
 
@@ -49,13 +90,18 @@ def main():
     ap.add_argument("--symbol", default="BTCUSDT")
     ap.add_argument("--seconds", type=int, default=30)
     ap.add_argument("--out", default=None)
+    add_telemetry_args(ap)
     args = ap.parse_args()
 
     if args.out is None:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         args.out = f"sample_{args.symbol.lower()}_{ts}.ndjson"
 
-    asyncio.run(capture(args.symbol, args.seconds, args.out))
+    tm = Telemetry.from_args("capture", args)
+    try:
+        asyncio.run(capture(args.symbol, args.seconds, args.out, tm))
+    finally:
+        tm.close()
 
 if __name__ == "__main__":
     main()
@@ -22,11 +22,12 @@ OUT_LOOP="${2:-${DATA_DIR}/sample_btcusdt_depth.events.loopback.bin}"
 EXPECTED_LAST_HASH="${EXPECTED_LAST_HASH:-0x651E42BC}"
 
 # Parse events.bin header to compute expectations (no hard-coded record counts).
-# Header layout (little-endian, 64 bytes total):
+# Header layout (little-endian, 64 bytes total for v0):
 #   magic[8], ver(u32), recsz(u32), price_scale(u64), qty_scale(u64), symbol[16], padding...
+# v1 (EVT1BIN) replaces symbol[16] with n_symbols(u32), header_size(u32) + a symbol table.
 read_header() {
   python3 - "$IN_BIN" <<'PY'
-import os, struct, sys
+import os, shlex, struct, sys
 p = sys.argv[1]
 b = open(p, "rb").read(64)
 if len(b) < 64:
@@ -35,14 +36,23 @@ magic = b[0:8]
 ver, recsz = struct.unpack_from("<II", b, 8)
 price_scale = struct.unpack_from("<Q", b, 16)[0]
 qty_scale   = struct.unpack_from("<Q", b, 24)[0]
-sym_raw = b[32:48]
-symbol = sym_raw.split(b"\x00", 1)[0].decode("ascii", errors="replace")
+hdr_size = 64
+if magic == b"EVT1BIN\x00":
+    # multi-symbol container: n_symbols @32, header_size @36, symbol table follows
+    nsym, hdr_size = struct.unpack_from("<II", b, 32)
+    if hdr_size != 64 + 16 * nsym:
+        raise SystemExit(f"bad header_size {hdr_size} for n_symbols={nsym}")
+    symbol = f"multi_{nsym}"
+else:
+    sym_raw = b[32:48]
+    symbol = sym_raw.split(b"\x00", 1)[0].decode("ascii", errors="replace")
 size = os.path.getsize(p)
-payload = size - 64
+payload = size - hdr_size
 if recsz == 0 or payload < 0 or payload % recsz != 0:
     raise SystemExit(f"bad header: recsz={recsz} payload={payload}")
 total = payload // recsz
-print(f"magic_hex={magic.hex()} version={ver} symbol={symbol} price_scale={price_scale} qty_scale={qty_scale}")
+# this line is eval'd by the shell: keep every value a single safe word
+print(f"magic_hex={magic.hex()} version={ver} symbol={shlex.quote(symbol)} price_scale={price_scale} qty_scale={qty_scale}")
 print(f"record_size_bytes={recsz}")
 print(f"total_records={total}")
 print(f"payload_bytes={payload}")
@@ -1,8 +1,8 @@
 # stage7_ps_pl_stream/phase3_demo_ready/scripts/xsct_replay_events_loopback.tcl
 #
-# Replay event_t v0 records from events.bin into AXI FIFO MM-S TX,
+# Replay event_t v0/v1 records from events.bin into AXI FIFO MM-S TX,
 # read them back from RX (requires a TX->RX loopback path in the programmed bitstream),
-# and write a new events.bin to OUT (same 64B header + payload).
+# and write a new events.bin to OUT (same header + payload).
 #
 # Usage:
 #   xsct xsct_replay_events_loopback.tcl \
@@ -15,37 +15,18 @@
 # - Record size is 48 bytes => 12 x 32-bit words per record.
 # - Chunk size must fit TX vacancy (TDFV). With typical TDFV~0x1FC=508 words,
 #   chunk_records=40 => 480 words is safe.
+# - v1 (EVT1BIN, multi-symbol) headers carry a symbol table; it is copied to OUT
+#   unchanged and only the 48-byte records go through the FIFO.
 # - Avoids RLR(0x24) completely.
 # - Robustly parses XSCT `mrd` output: always uses the value after ":" when present.
+# - Can be sourced into a running xsct session (set ::REPLAY_EVENTS_LIBRARY 1 first)
+#   to call replay_events_loopback without reconnecting; see run_demo_tap_checkpoint.py.
 
 proc usage {} {
   puts "Usage: xsct xsct_replay_events_loopback.tcl -base <hex> -in <events.bin> -out <loopback.bin> -chunk_records <N>"
   exit 1
 }
 
-# ---------------- args ----------------
-set BASE ""
-set IN_PATH ""
-set OUT_PATH ""
-set CHUNK_RECORDS 40
-
-for {set i 0} {$i < $argc} {incr i} {
-  set a [lindex $argv $i]
-  if {$a eq "-base"} {
-    incr i; set BASE [lindex $argv $i]
-  } elseif {$a eq "-in"} {
-    incr i; set IN_PATH [lindex $argv $i]
-  } elseif {$a eq "-out"} {
-    incr i; set OUT_PATH [lindex $argv $i]
-  } elseif {$a eq "-chunk_records"} {
-    incr i; set CHUNK_RECORDS [lindex $argv $i]
-  } else {
-    puts "Unknown arg: $a"
-    usage
-  }
-}
-if {$BASE eq "" || $IN_PATH eq "" || $OUT_PATH eq ""} { usage }
-
 # ---------------- constants ----------------
 set HDR_SIZE 64
 set REC_SIZE 48
@@ -184,107 +165,161 @@ proc u32_list_to_bytes_le {lst} {
   return $out
 }
 
-# ---------------- main ----------------
-set base [u32 $BASE]
-
-puts "=== connect ==="
-connect
-puts "=== targets ==="
-targets
-puts "=== target -set 1 (APU) ==="
-target -set 1
+# ---------------- replay (also callable from a long-lived xsct session) ----------------
+# Expects an open connection with the APU selected and FIFO memmap set.
+# Returns {total_records elapsed_us}; elapsed_us covers the chunk loop only.
+proc replay_events_loopback {base in_path out_path chunk_records_arg} {
+  global HDR_SIZE REC_SIZE RESET_KEY TDFR TDFV TDFD TLR RDFR RDFO RDFD
+
+  puts "=== reset FIFO TX/RX ==="
+  wr_u32 [format 0x%08X [expr {$base + $TDFR}]] $RESET_KEY
+  wr_u32 [format 0x%08X [expr {$base + $RDFR}]] $RESET_KEY
+  sleep_ms 10
+
+  set in_sz [file_size $in_path]
+  if {$in_sz < $HDR_SIZE} { error "input too small: $in_sz" }
+
+  set fin [open $in_path "rb"]
+  fconfigure $fin -translation binary -encoding binary
+  set hdr [read_bytes_exact $fin $HDR_SIZE]
+
+  set hp [parse_header $hdr]
+  lassign $hp magic ver recsz pscale qscale sym
+
+  binary scan $magic H16 magichex
+
+  if {$magic eq "EVT0BIN\x00"} {
+    if {$ver != 0} { error "unsupported version $ver" }
+    set hdr_size $HDR_SIZE
+  } elseif {$magic eq "EVT1BIN\x00"} {
+    # Multi-symbol container: n_symbols @32, header_size @36, symbol table follows.
+    if {$ver != 1} { error "unsupported version $ver" }
+    set nsym     [u32_le_from_hex8 [hex8_of_bytes [string range $hdr 32 35]]]
+    set hdr_size [u32_le_from_hex8 [hex8_of_bytes [string range $hdr 36 39]]]
+    if {$hdr_size != $HDR_SIZE + 16 * $nsym} { error "bad header_size $hdr_size for n_symbols=$nsym" }
+    append hdr [read_bytes_exact $fin [expr {$hdr_size - $HDR_SIZE}]]
+    set sym "multi($nsym)"
+  } else {
+    error "bad magic"
+  }
+  puts "HEADER magichex=$magichex ver=$ver recsz=$recsz symbol=$sym price_scale=$pscale qty_scale=$qscale header_size=$hdr_size"
 
-puts "=== memmap set (FIFO only) ==="
-memmap -addr $base -size 0x10000 -flags 3
+  if {$recsz != $REC_SIZE} { error "unexpected record_size $recsz (expected $REC_SIZE)" }
 
-puts "=== reset FIFO TX/RX ==="
-wr_u32 [format 0x%08X [expr {$base + $TDFR}]] $RESET_KEY
-wr_u32 [format 0x%08X [expr {$base + $RDFR}]] $RESET_KEY
-sleep_ms 10
+  set payload_sz [expr {$in_sz - $hdr_size}]
+  if {$payload_sz < 0 || $payload_sz % $REC_SIZE != 0} {
+    error "payload size not multiple of record size: payload=$payload_sz rec=$REC_SIZE"
+  }
+  set total_records [expr {$payload_sz / $REC_SIZE}]
 
-set in_sz [file_size $IN_PATH]
-if {$in_sz < $HDR_SIZE} { error "input too small: $in_sz" }
+  puts "=== input ==="
+  puts "IN=$in_path size=$in_sz payload=$payload_sz total_records=$total_records chunk_records=$chunk_records_arg"
 
-set payload_sz [expr {$in_sz - $HDR_SIZE}]
-if {$payload_sz % $REC_SIZE != 0} {
-  error "payload size not multiple of record size: payload=$payload_sz rec=$REC_SIZE"
-}
-set total_records [expr {$payload_sz / $REC_SIZE}]
+  set fout [open $out_path "wb"]
+  fconfigure $fout -translation binary -encoding binary
+  puts -nonewline $fout $hdr
 
-puts "=== input ==="
-puts "IN=$IN_PATH size=$in_sz payload=$payload_sz total_records=$total_records chunk_records=$CHUNK_RECORDS"
+  # Clamp chunk_records to safe range for typical TDFV~508 words.
+  set chunk_records $chunk_records_arg
+  if {$chunk_records < 1} { error "chunk_records must be >= 1" }
+  if {$chunk_records > 40} {
+    puts "WARN: chunk_records=$chunk_records clamped to 40 (TX vacancy safe default)"
+    set chunk_records 40
+  }
 
-set fin [open $IN_PATH "rb"]
-fconfigure $fin -translation binary -encoding binary
-set hdr [read_bytes_exact $fin $HDR_SIZE]
+  set t0_us [clock microseconds]
+  set sent 0
+  while {$sent < $total_records} {
+    set remain [expr {$total_records - $sent}]
+    set this_recs [expr {($remain < $chunk_records) ? $remain : $chunk_records}]
+    set this_bytes [expr {$this_recs * $REC_SIZE}]
 
-set hp [parse_header $hdr]
-lassign $hp magic ver recsz pscale qscale sym
+    set chunk [read_bytes_exact $fin $this_bytes]
+    set words [bytes_to_u32_list_le $chunk]
 
-binary scan $magic H16 magichex
-puts "HEADER magichex=$magichex ver=$ver recsz=$recsz symbol=$sym price_scale=$pscale qty_scale=$qscale"
+    # TX write
+    foreach w $words {
+      wr_u32 [format 0x%08X [expr {$base + $TDFD}]] $w
+    }
 
-if {$magic ne "EVT0BIN\x00"} { error "bad magic" }
-if {$ver != 0} { error "unsupported version $ver" }
-if {$recsz != $REC_SIZE} { error "unexpected record_size $recsz (expected $REC_SIZE)" }
+    # Commit packet length (bytes)
+    wr_u32 [format 0x%08X [expr {$base + $TLR}]] $this_bytes
+
+    # Wait RX occupancy
+    set need_words [expr {$this_bytes / 4}]
+    set tries 0
+    while {1} {
+      set rdfo [mrd_u32 [format 0x%08X [expr {$base + $RDFO}]]]
+      if {$rdfo >= $need_words} { break }
+      incr tries
+      if {$tries > 5000} {
+        error "timeout waiting RDFO >= $need_words (got $rdfo). Check loopback wiring in bitstream."
+      }
+      sleep_ms 1
+    }
 
-set fout [open $OUT_PATH "wb"]
-fconfigure $fout -translation binary -encoding binary
-puts -nonewline $fout $hdr
+    # RX read
+    set rx_words {}
+    for {set k 0} {$k < $need_words} {incr k} {
+      set v [mrd_u32 [format 0x%08X [expr {$base + $RDFD}]]]
+      lappend rx_words $v
+    }
 
-# Clamp chunk_records to safe range for typical TDFV~508 words.
-set chunk_records $CHUNK_RECORDS
-if {$chunk_records < 1} { error "chunk_records must be >= 1" }
-if {$chunk_records > 40} {
-  puts "WARN: chunk_records=$chunk_records clamped to 40 (TX vacancy safe default)"
-  set chunk_records 40
-}
+    puts -nonewline $fout [u32_list_to_bytes_le $rx_words]
 
-set sent 0
-while {$sent < $total_records} {
-  set remain [expr {$total_records - $sent}]
-  set this_recs [expr {($remain < $chunk_records) ? $remain : $chunk_records}]
-  set this_bytes [expr {$this_recs * $REC_SIZE}]
+    set sent [expr {$sent + $this_recs}]
+    puts "chunk sent_records=$sent / $total_records packet_bytes=$this_bytes"
+  }
 
-  set chunk [read_bytes_exact $fin $this_bytes]
-  set words [bytes_to_u32_list_le $chunk]
+  close $fin
+  close $fout
 
-  # TX write
-  foreach w $words {
-    wr_u32 [format 0x%08X [expr {$base + $TDFD}]] $w
-  }
+  set t1_us [clock microseconds]
+  puts "REPLAY_total_records=$total_records"
+  puts "REPLAY_elapsed_us=[expr {$t1_us - $t0_us}]"
+  return [list $total_records [expr {$t1_us - $t0_us}]]
+}
 
-  # Commit packet length (bytes)
-  wr_u32 [format 0x%08X [expr {$base + $TLR}]] $this_bytes
-
-  # Wait RX occupancy
-  set need_words [expr {$this_bytes / 4}]
-  set tries 0
-  while {1} {
-    set rdfo [mrd_u32 [format 0x%08X [expr {$base + $RDFO}]]]
-    if {$rdfo >= $need_words} { break }
-    incr tries
-    if {$tries > 5000} {
-      error "timeout waiting RDFO >= $need_words (got $rdfo). Check loopback wiring in bitstream."
+# ---------------- main ----------------
+# A session that only wants the procs sets ::REPLAY_EVENTS_LIBRARY before `source`.
+if {![info exists ::REPLAY_EVENTS_LIBRARY]} {
+  # ---------------- args ----------------
+  set BASE ""
+  set IN_PATH ""
+  set OUT_PATH ""
+  set CHUNK_RECORDS 40
+
+  for {set i 0} {$i < $argc} {incr i} {
+    set a [lindex $argv $i]
+    if {$a eq "-base"} {
+      incr i; set BASE [lindex $argv $i]
+    } elseif {$a eq "-in"} {
+      incr i; set IN_PATH [lindex $argv $i]
+    } elseif {$a eq "-out"} {
+      incr i; set OUT_PATH [lindex $argv $i]
+    } elseif {$a eq "-chunk_records"} {
+      incr i; set CHUNK_RECORDS [lindex $argv $i]
+    } else {
+      puts "Unknown arg: $a"
+      usage
     }
-    sleep_ms 1
   }
+  if {$BASE eq "" || $IN_PATH eq "" || $OUT_PATH eq ""} { usage }
 
-  # RX read
-  set rx_words {}
-  for {set k 0} {$k < $need_words} {incr k} {
-    set v [mrd_u32 [format 0x%08X [expr {$base + $RDFD}]]]
-    lappend rx_words $v
-  }
+  set base [u32 $BASE]
 
-  puts -nonewline $fout [u32_list_to_bytes_le $rx_words]
+  puts "=== connect ==="
+  connect
+  puts "=== targets ==="
+  targets
+  puts "=== target -set 1 (APU) ==="
+  target -set 1
 
-  set sent [expr {$sent + $this_recs}]
-  puts "chunk sent_records=$sent / $total_records packet_bytes=$this_bytes"
-}
+  puts "=== memmap set (FIFO only) ==="
+  memmap -addr $base -size 0x10000 -flags 3
 
-close $fin
-close $fout
+  replay_events_loopback $base $IN_PATH $OUT_PATH $CHUNK_RECORDS
 
-puts "DONE: wrote loopback file: $OUT_PATH"
-exit 0
+  puts "DONE: wrote loopback file: $OUT_PATH"
+  exit 0
+}
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# stage7_ps_pl_stream/phase3_demo_ready/tools/axi_fifo_driver.py
+#
+# events.bin replay through the AXI FIFO MM-S from Zynq PS Linux, with direct
+# register access (mmap of /dev/mem) instead of XSCT mwr/mrd over JTAG, so the
+# reported events/s measures the PS->PL path rather than the debugger.
+#
+# Same flow as xsct_replay_events_loopback.tcl:
+#   - reset TX/RX (TDFR/RDFR <- 0xA5)
+#   - per chunk: wait for TX vacancy (TDFV), write the words to TDFD,
+#     commit the packet length in bytes to TLR, wait for RX occupancy (RDFO),
+#     read the words back from RDFD into the loopback file
+#   - RLR (0x24) is never read, as in the tcl
+# plus TAP regs (last_hash / word_count / pkt_count) read before and after and
+# checked against the expectation for the chunking actually used.
+#
+# Chunking:
+#   fixed     : --chunk-records N per packet (default 40, the frozen-hash setup)
+#   adaptive  : --adaptive reads TDFV before each packet and sends the largest
+#               whole-record chunk that fits (capped by --chunk-records)
+#   sweep     : --sweep 1:42 times fixed replays per size and reports the best
+#
+# Register backends:
+#   MmioBus  : mmap of a device (default /dev/mem) at a physical base
+#   FileBus  : the same mmap access over a regular file, mapped at the same
+#              offset as the physical base (sparse file); no FIFO behaviour (TX
+#              vacancy is seeded so the write path runs) and no TAP behaviour,
+#              so the TAP check is skipped. Use --no-loopback.
+#   --sim    : fifo_tap_sim.FifoTapSim, behavioural FIFO + loopback + TAP model
+#
+# Usage (on the board, as root):
+#   python3 axi_fifo_driver.py --in ../data/sample_btcusdt_depth.events.bin \
+#       --out ../data/sample_btcusdt_depth.events.loopback.bin
+# Off-board smoke test of the register path:
+#   python3 axi_fifo_driver.py --in ../data/sample_btcusdt_depth.events.bin \
+#       --fifo-dev /tmp/fifo.regs --tap-dev /tmp/tap.regs --no-loopback
+#   python3 axi_fifo_driver.py --in ../data/sample_btcusdt_depth.events.bin --sim
+#   python3 axi_fifo_driver.py --in ../data/sample_btcusdt_depth.events.bin --sim \
+#       --adaptive
+#   python3 axi_fifo_driver.py --in ../data/sample_btcusdt_depth.events.bin --sim --sweep 1:42
+
+import argparse
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from record_codecs import EventsFile
+
+FIFO_BASE = 0x43C00000
+TAP_BASE = 0x40000000
+REG_SPAN = 0x10000
+
+# AXI FIFO MM-S register offsets (bytes)
+ISR = 0x00
+TDFR = 0x08   # TX reset (write RESET_KEY)
+TDFV = 0x0C   # TX vacancy, words
+TDFD = 0x10   # TX data
+TLR = 0x14    # TX length, bytes (commits the packet)
+RDFR = 0x18   # RX reset (write RESET_KEY)
+RDFO = 0x1C   # RX occupancy, words
+RDFD = 0x20   # RX data
+RLR = 0x24    # RX length (not used, as in the tcl replay)
+RESET_KEY = 0xA5
+
+# TAP (axil_ro_regs.v) offsets
+TAP_LAST_HASH = 0x00
+TAP_WORD_COUNT = 0x04
+TAP_PKT_COUNT = 0x08
+
+# axis_tap_hash.v: FNV-1a over 32-bit words, reset per packet
+FNV_INIT = 0x811C9DC5
+FNV_PRIME = 0x01000193
+
+TYPICAL_TDFV = 0x1FC          # 508 words after reset on the demo bitstream
+RECORD_WORDS = 12             # 48-byte events.bin record
+DEFAULT_CHUNK_RECORDS = 40    # 480 words <= TYPICAL_TDFV
+DEFAULT_TIMEOUT_S = 5.0
+
+
+class MmioBus:
+    """32-bit register access to [base, base + size) of a mappable file."""
+
+    def __init__(self, path: str = "/dev/mem", base: int = 0, size: int = REG_SPAN):
+        page = mmap.ALLOCATIONGRANULARITY
+        self.path = path
+        self.base = base
+        self._delta = base % page
+        flags = os.O_RDWR | getattr(os, "O_SYNC", 0)
+        self._fd = os.open(path, flags)
+        try:
+            self._mm = mmap.mmap(self._fd, self._delta + size, mmap.MAP_SHARED,
+                                 mmap.PROT_READ | mmap.PROT_WRITE, offset=base - self._delta)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._u32 = memoryview(self._mm).cast("I")
+
+    def read32(self, off: int) -> int:
+        return self._u32[(self._delta + off) >> 2]
+
+    def write32(self, off: int, value: int) -> None:
+        self._u32[(self._delta + off) >> 2] = value & 0xFFFFFFFF
+
+    def write32_repeat(self, off: int, words: np.ndarray) -> None:
+        """Burst of 32-bit stores to one register (a FIFO data port)."""
+        u32 = self._u32
+        idx = (self._delta + off) >> 2
+        for w in words.tolist():
+            u32[idx] = w
+
+    def read32_repeat(self, off: int, n: int) -> np.ndarray:
+        """n 32-bit loads from one register (a FIFO data port)."""
+        u32 = self._u32
+        idx = (self._delta + off) >> 2
+        return np.fromiter((u32[idx] for _ in range(n)), dtype=np.uint32, count=n)
+
+    def close(self) -> None:
+        self._u32.release()
+        self._mm.close()
+        os.close(self._fd)
+
+
+class FileBus(MmioBus):
+    """
+    MmioBus over a regular file, extended (sparse) to cover base + size and
+    mapped at base, like /dev/mem, so FIFO and TAP windows in one file do not
+    overlap. Registers are plain memory: TX vacancy is seeded to `vacancy` so
+    writes proceed, nothing drains, RX stays empty and TAP counters never move.
+    """
+
+    def __init__(self, path: str, base: int = 0, size: int = REG_SPAN, vacancy: Optional[int] = None):
+        with open(path, "ab") as f:
+            if f.tell() < base + size:
+                f.truncate(base + size)
+        super().__init__(path, base, size)
+        if vacancy is not None:
+            self.write32(TDFV, vacancy)
+
+
+def open_bus(dev: str, base: int, size: int = REG_SPAN, vacancy: Optional[int] = None) -> MmioBus:
+    """/dev/mem (or another character device) at base, else a FileBus (TDFV seeded to vacancy)."""
+    if os.path.exists(dev) and not os.path.isfile(dev):
+        return MmioBus(dev, base, size)
+    return FileBus(dev, base, size, vacancy)
+
+
+class AxiFifo:
+    """AXI FIFO MM-S (AXI4-Lite data interface) on a register bus."""
+
+    def __init__(self, bus, timeout_s: float = DEFAULT_TIMEOUT_S):
+        self.bus = bus
+        self.timeout_s = timeout_s
+
+    def reset(self) -> None:
+        self.bus.write32(TDFR, RESET_KEY)
+        self.bus.write32(RDFR, RESET_KEY)
+
+    def tx_vacancy(self) -> int:
+        return self.bus.read32(TDFV)
+
+    def rx_occupancy(self) -> int:
+        return self.bus.read32(RDFO)
+
+    def _wait(self, reg: int, need: int, what: str) -> int:
+        read32 = self.bus.read32
+        v = read32(reg)
+        if v >= need:
+            return v
+        deadline = time.monotonic() + self.timeout_s
+        while True:
+            v = read32(reg)
+            if v >= need:
+                return v
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"timeout waiting {what} >= {need} (got {v})")
+
+    def wait_tx_vacancy(self, n_words: int) -> int:
+        return self._wait(TDFV, n_words, "TDFV")
+
+    def send_packet(self, words: np.ndarray) -> None:
+        """Write one packet (caller has checked vacancy) and commit it via TLR."""
+        self.bus.write32_repeat(TDFD, words)
+        self.bus.write32(TLR, 4 * len(words))
+
+    def recv_words(self, n_words: int) -> np.ndarray:
+        self._wait(RDFO, n_words, "RDFO")
+        return self.bus.read32_repeat(RDFD, n_words)
+
+
+class TapState(NamedTuple):
+    last_hash: int
+    word_count: int
+    pkt_count: int
+
+
+def read_tap(bus) -> TapState:
+    return TapState(bus.read32(TAP_LAST_HASH), bus.read32(TAP_WORD_COUNT), bus.read32(TAP_PKT_COUNT))
+
+
+def fnv1a_words(words: Sequence[int], h: int = FNV_INIT) -> int:
+    """axis_tap_hash over one run of words (continuing from h)."""
+    for w in words:
+        h = ((h ^ w) * FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+class ReplayResult(NamedTuple):
+    records: int
+    words: int
+    packets: int
+    elapsed_s: float
+    loopback: Optional[np.ndarray]   # RX words, None without loopback
+    chunks: np.ndarray               # records per packet, in send order
+    chunk_ns: np.ndarray             # per-packet time (vacancy wait + TX + RX drain)
+
+    @property
+    def events_per_s(self) -> float:
+        return self.records / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def replay_words(fifo: AxiFifo, words: np.ndarray, chunk_records: int = DEFAULT_CHUNK_RECORDS,
+                 loopback: bool = True, record_words: int = RECORD_WORDS,
+                 adaptive: bool = False) -> ReplayResult:
+    """
+    Stream events.bin payload words as packets, waiting for TX vacancy before
+    each packet and draining RX after it.
+
+    Fixed mode sends chunk_records records per packet (deterministic
+    packetisation, hence TAP pkt_count / last_hash). Adaptive mode reads TDFV
+    before each packet and sends as many whole records as fit, capped at
+    chunk_records; the chunking used is returned in .chunks.
+    """
+    if chunk_records < 1:
+        raise ValueError("chunk_records must be >= 1")
+    n_words = len(words)
+    if n_words % record_words:
+        raise ValueError("payload is not a whole number of records")
+    n_records = n_words // record_words
+    rx = np.empty(n_words, dtype=np.uint32) if loopback else None
+
+    chunks: List[int] = []
+    chunk_ns: List[int] = []
+    clock = time.perf_counter_ns
+    sent = 0
+    t0 = time.perf_counter()
+    while sent < n_records:
+        tc = clock()
+        if adaptive:
+            vacancy = fifo.wait_tx_vacancy(record_words)
+            n = min(vacancy // record_words, chunk_records, n_records - sent)
+        else:
+            n = min(chunk_records, n_records - sent)
+            fifo.wait_tx_vacancy(n * record_words)
+        lo, hi = sent * record_words, (sent + n) * record_words
+        fifo.send_packet(words[lo:hi])
+        if rx is not None:
+            rx[lo:hi] = fifo.recv_words(hi - lo)
+        sent += n
+        chunks.append(n)
+        chunk_ns.append(clock() - tc)
+    elapsed = time.perf_counter() - t0
+    return ReplayResult(n_records, n_words, len(chunks), elapsed, rx,
+                        np.array(chunks, dtype=np.int64), np.array(chunk_ns, dtype=np.int64))
+
+
+def expected_packets(total_records: int, chunk_records: int) -> int:
+    return (total_records + chunk_records - 1) // chunk_records
+
+
+def fixed_chunks(total_records: int, chunk_records: int) -> np.ndarray:
+    """Records per packet for fixed chunking (last packet may be shorter)."""
+    n_pkts = expected_packets(total_records, chunk_records)
+    chunks = np.full(n_pkts, chunk_records, dtype=np.int64)
+    if n_pkts:
+        chunks[-1] = total_records - chunk_records * (n_pkts - 1)
+    return chunks
+
+
+def expected_tap(words: np.ndarray, chunks: np.ndarray, record_words: int = RECORD_WORDS) -> TapState:
+    """
+    TAP deltas for a replay packetised as `chunks` (records per packet):
+    (last_hash of the final packet, delta word_count, delta pkt_count).
+    """
+    if len(chunks) == 0:
+        return TapState(0, 0, 0)
+    last = int(chunks[-1]) * record_words
+    return TapState(fnv1a_words(words[len(words) - last:].tolist()), len(words), len(chunks))
+
+
+class SweepPoint(NamedTuple):
+    chunk_records: int
+    packets: int
+    events_per_s: float
+    chunk_us_p50: float
+    chunk_us_p99: float
+    chunk_us_max: float
+
+
+def sweep_chunk_sizes(make_fifo: Callable[[], AxiFifo], words: np.ndarray, sizes: Sequence[int],
+                      repeats: int = 3, loopback: bool = True) -> Tuple[List[SweepPoint], Dict[int, str]]:
+    """
+    Fixed-chunk replay for each size (best of `repeats` runs by events/s).
+    Sizes whose packet does not fit the TX vacancy after reset are skipped;
+    sizes whose replay times out are returned as failed ({size: error}).
+    """
+    points: List[SweepPoint] = []
+    failed: Dict[int, str] = {}
+    for size in sizes:
+        best = None
+        for _ in range(max(repeats, 1)):
+            fifo = make_fifo()
+            fifo.reset()
+            if size * RECORD_WORDS > fifo.tx_vacancy():
+                break
+            try:
+                res = replay_words(fifo, words, size, loopback=loopback)
+            except TimeoutError as e:
+                failed[size] = str(e)
+                best = None
+                break
+            if best is None or res.events_per_s > best.events_per_s:
+                best = res
+        if best is None:
+            continue
+        us = best.chunk_ns / 1e3
+        points.append(SweepPoint(size, best.packets, best.events_per_s,
+                                 float(np.percentile(us, 50)), float(np.percentile(us, 99)), float(us.max())))
+    return points, failed
+
+
+def parse_sizes(spec: str) -> List[int]:
+    """'8,16,40' or 'lo:hi' (inclusive) or 'lo:hi:step'."""
+    if ":" in spec:
+        parts = [int(x) for x in spec.split(":")]
+        lo, hi = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(range(lo, hi + 1, step))
+    return [int(x) for x in spec.split(",") if x]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay events.bin through the AXI FIFO MM-S via mmap'd registers.")
+    ap.add_argument("--in", dest="in_path", required=True, help="events.bin (v0 or v1)")
+    ap.add_argument("--out", dest="out_path", default=None, help="loopback events.bin (header + RX payload)")
+    ap.add_argument("--fifo-base", type=lambda s: int(s, 0), default=FIFO_BASE)
+    ap.add_argument("--tap-base", type=lambda s: int(s, 0), default=TAP_BASE)
+    ap.add_argument("--fifo-dev", default="/dev/mem", help="device or regular file (file-backed stand-in)")
+    ap.add_argument("--tap-dev", default=None, help="device or file for TAP regs (default: --fifo-dev)")
+    ap.add_argument("--no-tap", action="store_true", help="do not read TAP regs")
+    ap.add_argument("--sim", action="store_true", help="use the behavioural FIFO + TAP model (fifo_tap_sim.py)")
+    ap.add_argument("--chunk-records", type=int, default=None,
+                    help=f"records per packet (fixed, default {DEFAULT_CHUNK_RECORDS}), or a cap with --adaptive")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="size each packet from TDFV (largest whole-record chunk that fits)")
+    ap.add_argument("--sweep", default=None, metavar="SIZES",
+                    help="measure events/s per fixed chunk size, e.g. 8,16,40 or 1:42")
+    ap.add_argument("--repeats", type=int, default=3, help="runs per size in --sweep (best kept)")
+    ap.add_argument("--expected-last-hash", type=lambda s: int(s, 0), default=None,
+                    help="frozen hash to check as well (only meaningful for the chunking it was frozen with)")
+    ap.add_argument("--no-loopback", action="store_true", help="TX only (no RX drain, no --out)")
+    ap.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_S, help="vacancy/occupancy wait, seconds")
+    args = ap.parse_args()
+
+    with EventsFile(args.in_path) as ev:
+        header_size = ev.header.header_size
+        words = np.array(ev.records.view("<u4"))
+    with open(args.in_path, "rb") as f:
+        header = f.read(header_size)
+
+    if args.sim:
+        from fifo_tap_sim import FifoTapSim
+        fifo_bus = FifoTapSim()
+        tap_bus = None if args.no_tap else fifo_bus.tap_bus
+    else:
+        fifo_bus = open_bus(args.fifo_dev, args.fifo_base, vacancy=TYPICAL_TDFV)
+        tap_bus = None
+        if not args.no_tap:
+            tap_bus = open_bus(args.tap_dev or args.fifo_dev, args.tap_base)
+            if isinstance(fifo_bus, FileBus) or isinstance(tap_bus, FileBus):
+                # plain memory: the TAP counters cannot move, the check could only fail
+                print("TAP check skipped: register file has no TAP behaviour (use the board or --sim)")
+                tap_bus.close()
+                tap_bus = None
+    try:
+        if args.sweep:
+            if args.sim:
+                from fifo_tap_sim import FifoTapSim
+                make_fifo = lambda: AxiFifo(FifoTapSim(), args.timeout)  # noqa: E731
+            else:
+                make_fifo = lambda: AxiFifo(fifo_bus, args.timeout)  # noqa: E731
+            points, failed = sweep_chunk_sizes(make_fifo, words, parse_sizes(args.sweep), args.repeats,
+                                               loopback=not args.no_loopback)
+            _print_sweep(points, parse_sizes(args.sweep), failed)
+            if failed:
+                raise SystemExit(1)
+            return
+
+        chunk_records = args.chunk_records
+        if chunk_records is None:
+            chunk_records = max(len(words) // RECORD_WORDS, 1) if args.adaptive else DEFAULT_CHUNK_RECORDS
+
+        fifo = AxiFifo(fifo_bus, args.timeout)
+        fifo.reset()
+        before = read_tap(tap_bus) if tap_bus else None
+        try:
+            res = replay_words(fifo, words, chunk_records, loopback=not args.no_loopback,
+                               adaptive=args.adaptive)
+        except TimeoutError as e:
+            raise SystemExit(f"FAIL: {e}. Check loopback wiring in bitstream (or use --no-loopback).")
+        after = read_tap(tap_bus) if tap_bus else None
+    finally:
+        fifo_bus.close()
+        if tap_bus is not None:
+            tap_bus.close()
+
+    mode = "adaptive" if args.adaptive else "fixed"
+    sizes = np.unique(res.chunks)
+    print(f"records={res.records} words={res.words} packets={res.packets} mode={mode} "
+          f"chunk_sizes={','.join(str(x) for x in sizes)}")
+    print(f"metric: elapsed_s={res.elapsed_s:.6f} events_per_s={res.events_per_s:.1f} (events={res.records})")
+
+    if res.loopback is not None and args.out_path:
+        out = Path(args.out_path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_bytes(header + res.loopback.astype("<u4").tobytes())
+        same = np.array_equal(res.loopback, words)
+        print(f"loopback: wrote {out} ({'identical' if same else 'DIFFERS'})")
+
+    if before is None:
+        return
+    exp = expected_tap(words, res.chunks)
+    d_words = (after.word_count - before.word_count) & 0xFFFFFFFF
+    d_pkts = (after.pkt_count - before.pkt_count) & 0xFFFFFFFF
+    print(f"TAP_before last_hash=0x{before.last_hash:08X} word_count={before.word_count} pkt_count={before.pkt_count}")
+    print(f"TAP_after  last_hash=0x{after.last_hash:08X} word_count={after.word_count} pkt_count={after.pkt_count}")
+    print(f"delta_words={d_words} expected={exp.word_count}")
+    print(f"delta_pkts={d_pkts}  expected={exp.pkt_count}")
+    print(f"last_hash=0x{after.last_hash:08X} expected=0x{exp.last_hash:08X}")
+    fail = d_words != exp.word_count or d_pkts != exp.pkt_count or after.last_hash != exp.last_hash
+    if args.expected_last_hash is not None and after.last_hash != args.expected_last_hash:
+        print(f"last_hash != frozen 0x{args.expected_last_hash:08X}")
+        fail = True
+    if fail:
+        raise SystemExit("FAIL: TAP delta / last_hash mismatch")
+    print("PASS: TAP delta + last_hash matched.")
+
+
+def _print_sweep(points: Sequence[SweepPoint], sizes: Sequence[int], failed: Dict[int, str]) -> None:
+    skipped = sorted(set(sizes) - {p.chunk_records for p in points} - set(failed))
+    print("chunk_records packets events_per_s chunk_us_p50 chunk_us_p99 chunk_us_max")
+    for p in points:
+        print(f"{p.chunk_records:13d} {p.packets:7d} {p.events_per_s:12.1f} "
+              f"{p.chunk_us_p50:12.1f} {p.chunk_us_p99:12.1f} {p.chunk_us_max:12.1f}")
+    if skipped:
+        print(f"skipped (packet larger than TX vacancy): {','.join(str(x) for x in skipped)}")
+    for size, err in sorted(failed.items()):
+        print(f"FAIL chunk_records={size}: {err}")
+    if points:
+        best = max(points, key=lambda p: p.events_per_s)
+        print(f"best: chunk_records={best.chunk_records} events_per_s={best.events_per_s:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import struct
 from pathlib import Path
 
 MAGIC = b"EVT0BIN\x00"
+MAGIC_V1 = b"EVT1BIN\x00"
 HEADER_SIZE = 64
 RECORD_SIZE = 48
 
@@ -26,14 +27,29 @@ def main():
             raise SystemExit("file too small for header")
 
         magic, version, rec_size, price_scale, qty_scale, sym16, _ = HDR_STRUCT.unpack(hdr)
-        if magic != MAGIC:
+        if magic == MAGIC_V1:
+            # Multi-symbol container: skip the symbol table, checksum the same 48B records.
+            if version != 1:
+                raise SystemExit(f"unsupported version {version}")
+            n_symbols, header_size = struct.unpack_from("<II", hdr, 32)
+            if header_size != HEADER_SIZE + 16 * n_symbols:
+                raise SystemExit(f"bad header_size {header_size} for n_symbols={n_symbols}")
+            table = f.read(header_size - HEADER_SIZE)
+            if len(table) != header_size - HEADER_SIZE:
+                raise SystemExit("truncated symbol table")
+            symbol = ",".join(
+                table[i:i + 16].split(b"\x00", 1)[0].decode("ascii", errors="replace")
+                for i in range(0, len(table), 16)
+            )
+        elif magic != MAGIC:
             raise SystemExit("bad magic")
-        if version != 0:
+        elif version != 0:
             raise SystemExit(f"unsupported version {version}")
+        else:
+            symbol = sym16.split(b"\x00", 1)[0].decode("ascii", errors="replace")
         if rec_size != RECORD_SIZE:
             raise SystemExit(f"unexpected record_size {rec_size}")
 
-        symbol = sym16.split(b"\x00", 1)[0].decode("ascii", errors="replace")
         print(f"symbol={symbol} price_scale={price_scale} qty_scale={qty_scale} every={args.every}")
 
         h = hashlib.sha256()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# stage7_ps_pl_stream/phase3_demo_ready/tools/events_multi_v1.py
+#
+# Multi-symbol events container (event_t v1) + streaming k-way merge of
+# per-symbol events.bin (event_t v0) files.
+#
+# - Inputs are read in fixed-size chunks and merged with a heap, so memory is
+#   bounded by (n_inputs * chunk) records regardless of file sizes.
+# - Merge order: event_time_ms (E), final_update_id (u), symbol_id, then the
+#   record's position in its input file. Same inputs => identical output.
+#
+# Binary format (little-endian):
+# Header (64 bytes fixed part):
+#   magic[8] = b"EVT1BIN\0"
+#   version u32 = 1
+#   record_size u32 = 48
+#   price_scale u64
+#   qty_scale u64
+#   n_symbols u32
+#   header_size u32 (= 64 + 16 * n_symbols)
+#   reserved[24] zeros
+# Symbol table (n_symbols x 16 bytes):
+#   symbol[16] ASCII NUL-padded, index = symbol_id
+#
+# Record (48 bytes, same size and field offsets as v0):
+#   side u8 (0=bid, 1=ask)
+#   pad u8
+#   symbol_id u16
+#   pad[4]
+#   event_time_ms u64 (E)
+#   first_update_id u64 (U)
+#   final_update_id u64 (u)
+#   price_i64 (price * price_scale)
+#   qty_i64   (qty   * qty_scale)
+
+import argparse
+import hashlib
+import heapq
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Sequence, Tuple
+
+V0_MAGIC = b"EVT0BIN\x00"
+V0_HDR_STRUCT = struct.Struct("<8sIIQQ16s16s")  # 64 bytes
+V0_REC_STRUCT = struct.Struct("<B7xQQQqq")      # 48 bytes
+
+MAGIC = b"EVT1BIN\x00"
+VERSION = 1
+HEADER_SIZE = 64
+RECORD_SIZE = 48
+SYMBOL_SIZE = 16
+MAX_SYMBOLS = 0xFFFF
+
+HDR_STRUCT = struct.Struct("<8sIIQQII24s")  # 64 bytes
+REC_STRUCT = struct.Struct("<BxH4xQQQqq")   # 48 bytes
+
+DEFAULT_CHUNK_RECORDS = 4096
+
+# (side, symbol_id, E, U, u, price_i64, qty_i64)
+Record = Tuple[int, int, int, int, int, int, int]
+
+
+def _sym16(symbol: str) -> bytes:
+    symbol_b = symbol.encode("ascii", errors="strict")
+    if len(symbol_b) > SYMBOL_SIZE:
+        raise ValueError(f"symbol too long (max 16 bytes ASCII): {symbol}")
+    return symbol_b + b"\x00" * (SYMBOL_SIZE - len(symbol_b))
+
+
+def _sym_str(sym16: bytes) -> str:
+    return sym16.split(b"\x00", 1)[0].decode("ascii", errors="replace")
+
+
+def read_v0_header(f: BinaryIO) -> Tuple[int, int, str]:
+    """Read and validate an event_t v0 header. Returns (price_scale, qty_scale, symbol)."""
+    hdr = f.read(HEADER_SIZE)
+    if len(hdr) != HEADER_SIZE:
+        raise ValueError("file too small for header")
+    magic, version, rec_size, price_scale, qty_scale, sym16, _ = V0_HDR_STRUCT.unpack(hdr)
+    if magic != V0_MAGIC:
+        raise ValueError("bad magic (not EVT0BIN\\0)")
+    if version != 0:
+        raise ValueError(f"unsupported version {version}")
+    if rec_size != RECORD_SIZE:
+        raise ValueError(f"unexpected record_size {rec_size} (expected {RECORD_SIZE})")
+    return price_scale, qty_scale, _sym_str(sym16)
+
+
+def read_v1_header(f: BinaryIO) -> Tuple[int, int, List[str]]:
+    """Read and validate an event_t v1 header. Returns (price_scale, qty_scale, symbols)."""
+    hdr = f.read(HEADER_SIZE)
+    if len(hdr) != HEADER_SIZE:
+        raise ValueError("file too small for header")
+    magic, version, rec_size, price_scale, qty_scale, n_symbols, header_size, _ = HDR_STRUCT.unpack(hdr)
+    if magic != MAGIC:
+        raise ValueError("bad magic (not EVT1BIN\\0)")
+    if version != VERSION:
+        raise ValueError(f"unsupported version {version}")
+    if rec_size != RECORD_SIZE:
+        raise ValueError(f"unexpected record_size {rec_size} (expected {RECORD_SIZE})")
+    if header_size != HEADER_SIZE + SYMBOL_SIZE * n_symbols:
+        raise ValueError(f"bad header_size {header_size} for n_symbols={n_symbols}")
+
+    table = f.read(SYMBOL_SIZE * n_symbols)
+    if len(table) != SYMBOL_SIZE * n_symbols:
+        raise ValueError("truncated symbol table")
+    symbols = [_sym_str(table[i:i + SYMBOL_SIZE]) for i in range(0, len(table), SYMBOL_SIZE)]
+    return price_scale, qty_scale, symbols
+
+
+def pack_v1_header(price_scale: int, qty_scale: int, symbols: Sequence[str]) -> bytes:
+    if not symbols:
+        raise ValueError("at least one symbol required")
+    if len(symbols) > MAX_SYMBOLS:
+        raise ValueError(f"too many symbols ({len(symbols)} > {MAX_SYMBOLS})")
+    if len(set(symbols)) != len(symbols):
+        raise ValueError(f"duplicate symbols: {list(symbols)}")
+
+    header_size = HEADER_SIZE + SYMBOL_SIZE * len(symbols)
+    fixed = HDR_STRUCT.pack(
+        MAGIC,
+        VERSION,
+        RECORD_SIZE,
+        int(price_scale),
+        int(qty_scale),
+        len(symbols),
+        header_size,
+        b"\x00" * 24,
+    )
+    return fixed + b"".join(_sym16(s) for s in symbols)
+
+
+def _iter_raw_records(f: BinaryIO, chunk_records: int) -> Iterator[bytes]:
+    chunk_bytes = chunk_records * RECORD_SIZE
+    while True:
+        buf = f.read(chunk_bytes)
+        if not buf:
+            return
+        if len(buf) % RECORD_SIZE != 0:
+            raise ValueError("truncated record")
+        yield buf
+
+
+def iter_v0_records(
+    path: Path,
+    symbol_id: int,
+    chunk_records: int = DEFAULT_CHUNK_RECORDS,
+) -> Iterator[Record]:
+    """Stream records from a v0 events.bin, tagging each with symbol_id."""
+    with path.open("rb") as f:
+        read_v0_header(f)
+        for buf in _iter_raw_records(f, chunk_records):
+            for side, E, U, u, p_i, q_i in V0_REC_STRUCT.iter_unpack(buf):
+                yield side, symbol_id, E, U, u, p_i, q_i
+
+
+def iter_v1_records(path: Path, chunk_records: int = DEFAULT_CHUNK_RECORDS) -> Iterator[Record]:
+    """Stream records from a v1 events.bin."""
+    with path.open("rb") as f:
+        read_v1_header(f)
+        for buf in _iter_raw_records(f, chunk_records):
+            yield from REC_STRUCT.iter_unpack(buf)
+
+
+def merge_events_v0_to_v1(
+    in_paths: Sequence[Path],
+    out_path: Path,
+    chunk_records: int = DEFAULT_CHUNK_RECORDS,
+) -> Tuple[str, List[str], List[int]]:
+    """
+    k-way merge per-symbol v0 files into one v1 file.
+
+    All inputs must share price_scale/qty_scale and carry distinct symbols;
+    symbol_id is the input's position in in_paths.
+
+    Returns (sha256 of the output file, symbols, per-symbol record counts).
+    """
+    if not in_paths:
+        raise ValueError("no inputs")
+
+    symbols: List[str] = []
+    scales = None
+    for p in in_paths:
+        with p.open("rb") as f:
+            price_scale, qty_scale, symbol = read_v0_header(f)
+        if scales is None:
+            scales = (price_scale, qty_scale)
+        elif scales != (price_scale, qty_scale):
+            raise ValueError(
+                f"scale mismatch in {p}: price_scale={price_scale} qty_scale={qty_scale} "
+                f"(expected {scales[0]}/{scales[1]})"
+            )
+        symbols.append(symbol)
+
+    header = pack_v1_header(scales[0], scales[1], symbols)
+
+    # Key: (E, u, symbol_id, seq) -- seq keeps each message's level order intact.
+    def keyed(sym_id: int, p: Path) -> Iterator[Tuple[int, int, int, int, Record]]:
+        for seq, rec in enumerate(iter_v0_records(p, sym_id, chunk_records)):
+            yield rec[2], rec[4], sym_id, seq, rec
+
+    streams = [keyed(i, p) for i, p in enumerate(in_paths)]
+
+    sha = hashlib.sha256()
+    counts = [0] * len(symbols)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    pack = REC_STRUCT.pack
+    with out_path.open("wb") as fout:
+        fout.write(header)
+        sha.update(header)
+
+        out_buf = bytearray()
+        flush_bytes = chunk_records * RECORD_SIZE
+        for _, _, sym_id, _, rec in heapq.merge(*streams):
+            out_buf += pack(*rec)
+            counts[sym_id] += 1
+            if len(out_buf) >= flush_bytes:
+                fout.write(out_buf)
+                sha.update(out_buf)
+                out_buf.clear()
+        if out_buf:
+            fout.write(out_buf)
+            sha.update(out_buf)
+
+    return sha.hexdigest(), symbols, counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="Merge per-symbol events.bin (v0) files into one multi-symbol events.bin (v1)."
+    )
+    ap.add_argument("--in", dest="in_paths", action="append", required=True,
+                    help="per-symbol v0 events.bin (repeat once per symbol)")
+    ap.add_argument("--out", dest="out_path", required=True, help="output v1 events.bin path")
+    ap.add_argument("--chunk-records", type=int, default=DEFAULT_CHUNK_RECORDS,
+                    help="records read per input per refill (bounds memory)")
+    ap.add_argument("--sha256-out", default=None, help="write SHA256 hex digest to this file")
+    args = ap.parse_args()
+
+    if args.chunk_records < 1:
+        raise SystemExit("--chunk-records must be >= 1")
+
+    in_paths = [Path(p) for p in args.in_paths]
+    out_path = Path(args.out_path)
+
+    digest, symbols, counts = merge_events_v0_to_v1(in_paths, out_path, args.chunk_records)
+
+    for sym_id, (sym, n) in enumerate(zip(symbols, counts)):
+        print(f"symbol_id={sym_id} symbol={sym} records={n}")
+    print(f"out={out_path} symbols={len(symbols)} records={sum(counts)} sha256={digest}")
+
+    if args.sha256_out:
+        sha_path = Path(args.sha256_out)
+        sha_path.parent.mkdir(parents=True, exist_ok=True)
+        sha_path.write_text(digest + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# stage7_ps_pl_stream/phase3_demo_ready/tools/fifo_tap_sim.py
+#
+# Behavioural model of the phase 3 PS->PL datapath, behind the same register
+# bus interface as axi_fifo_driver.MmioBus (read32 / write32 / burst), so
+# replay drivers and chunking strategies run unchanged on any Linux box:
+#
+#   AXI FIFO MM-S TX --> axis_tap_hash --> AXI FIFO MM-S RX   (loopback)
+#                              |
+#                        axil_ro_regs (last_hash, word_count, pkt_count)
+#
+# FIFO model:
+#   - TDFV  = tx_depth - 4 - words held in TX (0x1FC after reset for 512)
+#   - TDFD  writes are buffered; TLR (bytes) commits them as one packet,
+#           TLAST on the last word. Writing past the vacancy sets ISR.TPOE and
+#           drops the word (strict=True raises instead).
+#   - committed TX words drain through the TAP into RX while RX has room
+#     (RX back-pressure holds them in TX, lowering TDFV)
+#   - RDFO  = words held in RX, RDFD pops one, RLR = byte length of the
+#           packet at the head of RX
+#   - TDFR / RDFR <- 0xA5 empty TX / RX (TAP counters are not reset)
+#   - ISR: TC / RC on packet commit / arrival, TPOE / RPUE on errors;
+#          write 1 to clear
+# TAP model (axis_tap_hash.v): FNV-1a over 32-bit words,
+#   hash = (hash ^ w) * 0x01000193 mod 2^32, from 0x811C9DC5, reset per packet;
+#   last_hash latched on TLAST; word_count / pkt_count count beats / packets.
+#
+# Usage:
+#   python3 fifo_tap_sim.py --in ../data/sample_btcusdt_depth.events.bin --chunk-records 40
+#   (axi_fifo_driver.py --sim runs the driver against this model)
+
+import argparse
+import time
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional
+
+import numpy as np
+
+from axi_fifo_driver import (
+    DEFAULT_CHUNK_RECORDS,
+    FNV_INIT,
+    FNV_PRIME,
+    ISR,
+    RDFD,
+    RDFO,
+    RDFR,
+    RECORD_WORDS,
+    RESET_KEY,
+    RLR,
+    TAP_LAST_HASH,
+    TAP_PKT_COUNT,
+    TAP_WORD_COUNT,
+    TDFD,
+    TDFR,
+    TDFV,
+    TLR,
+    AxiFifo,
+    TapState,
+    fnv1a_words,
+    read_tap,
+    replay_words,
+)
+from record_codecs import EventsFile
+
+DEFAULT_DEPTH_WORDS = 512
+VACANCY_RESERVE = 4       # TDFV reads depth - 4 after reset
+
+# ISR bits (PG080)
+ISR_RPUE = 1 << 29        # receive packet underrun (RDFD read when empty)
+ISR_TPOE = 1 << 28        # transmit packet overrun (TDFD write past vacancy)
+ISR_TC = 1 << 27          # transmit complete
+ISR_RC = 1 << 26          # receive complete
+
+
+class SimBusError(RuntimeError):
+    pass
+
+
+def fnv1a_packets(words: np.ndarray, packet_words: int) -> np.ndarray:
+    """
+    Per-packet TAP hashes for words split into packets of packet_words (the
+    last one may be shorter), vectorised across packets.
+    """
+    words = np.asarray(words, dtype=np.uint32)
+    n_full = len(words) // packet_words
+    out: List[int] = []
+    if n_full:
+        cols = words[:n_full * packet_words].reshape(n_full, packet_words)
+        h = np.full(n_full, FNV_INIT, dtype=np.uint32)
+        prime = np.uint32(FNV_PRIME)
+        for j in range(packet_words):
+            h = (h ^ cols[:, j]) * prime   # uint32 arithmetic wraps mod 2^32
+        out = h.tolist()
+    tail = words[n_full * packet_words:]
+    if len(tail):
+        out.append(fnv1a_words(tail.tolist()))
+    return np.array(out, dtype=np.uint32)
+
+
+class TapModel:
+    """axis_tap_hash + axil_ro_regs."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.hash = FNV_INIT
+        self.last_hash = 0
+        self.word_count = 0
+        self.pkt_count = 0
+
+    def beats(self, words: List[int], tlast: bool) -> None:
+        h = fnv1a_words(words, self.hash)
+        self.word_count = (self.word_count + len(words)) & 0xFFFFFFFF
+        if tlast:
+            self.last_hash = h
+            self.pkt_count = (self.pkt_count + 1) & 0xFFFFFFFF
+            self.hash = FNV_INIT
+        else:
+            self.hash = h
+
+    def state(self) -> TapState:
+        return TapState(self.last_hash, self.word_count, self.pkt_count)
+
+
+class _TapBus:
+    """AXI-Lite view of the TAP registers (writes ignored, like axil_ro_regs)."""
+
+    def __init__(self, tap: TapModel):
+        self.tap = tap
+
+    def read32(self, off: int) -> int:
+        idx = (off >> 2) & 0xF
+        if idx == TAP_LAST_HASH >> 2:
+            return self.tap.last_hash
+        if idx == TAP_WORD_COUNT >> 2:
+            return self.tap.word_count
+        if idx == TAP_PKT_COUNT >> 2:
+            return self.tap.pkt_count
+        return 0
+
+    def write32(self, off: int, value: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FifoTapSim:
+    """
+    AXI FIFO MM-S register map with a TX -> TAP -> RX loopback. Use the
+    instance as the FIFO bus and .tap_bus as the TAP bus.
+    """
+
+    def __init__(self, tx_depth: int = DEFAULT_DEPTH_WORDS, rx_depth: int = DEFAULT_DEPTH_WORDS,
+                 strict: bool = True):
+        self.tx_depth = tx_depth
+        self.rx_depth = rx_depth
+        self.strict = strict
+        self.tap = TapModel()
+        self.tap_bus = _TapBus(self.tap)
+        self.isr = 0
+        self._reset_tx()
+        self._reset_rx()
+
+    # -- state -------------------------------------------------------------
+
+    def _reset_tx(self) -> None:
+        self._tx_open: List[np.ndarray] = []       # written, not yet committed
+        self._tx_open_n = 0
+        self._tx_pkts: Deque[List[int]] = deque()  # committed, not yet drained
+        self._tx_pkts_n = 0
+
+    def _reset_rx(self) -> None:
+        self._rx: Deque[int] = deque()
+        self._rx_lens: Deque[int] = deque()        # words per packet, head first
+        self._rx_partial = 0                       # words of an unfinished packet
+
+    def tx_vacancy(self) -> int:
+        return max(self.tx_depth - VACANCY_RESERVE - self._tx_open_n - self._tx_pkts_n, 0)
+
+    def _drain(self) -> None:
+        """Move committed TX words through the TAP into RX while RX has room."""
+        while self._tx_pkts:
+            room = self.rx_depth - len(self._rx)
+            if room <= 0:
+                return
+            pkt = self._tx_pkts[0]
+            take = pkt[:room]
+            last = len(take) == len(pkt)
+            self.tap.beats(take, tlast=last)
+            self._rx.extend(take)
+            self._tx_pkts_n -= len(take)
+            if last:
+                self._tx_pkts.popleft()
+                self._rx_lens.append(self._rx_partial + len(take))
+                self._rx_partial = 0
+                self.isr |= ISR_RC
+            else:
+                self._tx_pkts[0] = pkt[room:]
+                self._rx_partial += len(take)
+
+    def _push_tx(self, words: np.ndarray) -> None:
+        vac = self.tx_vacancy()
+        if len(words) > vac:
+            if self.strict:
+                raise SimBusError(f"TDFD overrun: {len(words)} words written with TDFV={vac}")
+            self.isr |= ISR_TPOE
+            words = words[:vac]
+        if len(words):
+            self._tx_open.append(words)
+            self._tx_open_n += len(words)
+
+    def _commit(self, n_bytes: int) -> None:
+        n_words = n_bytes // 4
+        if n_words != self._tx_open_n or n_bytes % 4:
+            if self.strict:
+                raise SimBusError(f"TLR={n_bytes} bytes but {self._tx_open_n} words buffered")
+            n_words = min(n_words, self._tx_open_n)
+        if n_words == 0:
+            return
+        pending = np.concatenate(self._tx_open).tolist() if len(self._tx_open) > 1 else self._tx_open[0].tolist()
+        pkt, rest = pending[:n_words], pending[n_words:]
+        self._tx_open = [np.array(rest, dtype=np.uint32)] if rest else []
+        self._tx_open_n = len(rest)
+        self._tx_pkts.append(pkt)
+        self._tx_pkts_n += len(pkt)
+        self.isr |= ISR_TC
+        self._drain()
+
+    def _pop_rx(self, n: int) -> List[int]:
+        if n > len(self._rx):
+            if self.strict:
+                raise SimBusError(f"RDFD underrun: {n} words read with RDFO={len(self._rx)}")
+            self.isr |= ISR_RPUE
+        take = min(n, len(self._rx))
+        rx = self._rx
+        out = [rx.popleft() for _ in range(take)] + [0] * (n - take)
+        left = take
+        while left and self._rx_lens:
+            if self._rx_lens[0] <= left:
+                left -= self._rx_lens.popleft()
+            else:
+                self._rx_lens[0] -= left
+                left = 0
+        self._drain()
+        return out
+
+    # -- register bus --------------------------------------------------------
+
+    def read32(self, off: int) -> int:
+        if off == TDFV:
+            return self.tx_vacancy()
+        if off == RDFO:
+            return len(self._rx)
+        if off == RDFD:
+            return self._pop_rx(1)[0]
+        if off == RLR:
+            return 4 * self._rx_lens[0] if self._rx_lens else 0
+        if off == ISR:
+            return self.isr
+        return 0
+
+    def write32(self, off: int, value: int) -> None:
+        value &= 0xFFFFFFFF
+        if off == TDFD:
+            self._push_tx(np.array([value], dtype=np.uint32))
+        elif off == TLR:
+            self._commit(value)
+        elif off == TDFR and value == RESET_KEY:
+            self._reset_tx()
+        elif off == RDFR and value == RESET_KEY:
+            self._reset_rx()
+            self._drain()
+        elif off == ISR:
+            self.isr &= ~value
+
+    def write32_repeat(self, off: int, words: np.ndarray) -> None:
+        if off == TDFD:
+            self._push_tx(np.array(words, dtype=np.uint32))
+        else:
+            for w in np.asarray(words).tolist():
+                self.write32(off, w)
+
+    def read32_repeat(self, off: int, n: int) -> np.ndarray:
+        if off == RDFD:
+            return np.array(self._pop_rx(n), dtype=np.uint32)
+        return np.fromiter((self.read32(off) for _ in range(n)), dtype=np.uint32, count=n)
+
+    def close(self) -> None:
+        pass
+
+
+class SimRun(NamedTuple):
+    before: TapState
+    after: TapState
+    loopback_ok: bool
+    packets: int
+    elapsed_s: float
+    words_per_s: float
+
+
+def simulate_replay(words: np.ndarray, chunk_records: int = DEFAULT_CHUNK_RECORDS,
+                    sim: Optional[FifoTapSim] = None) -> SimRun:
+    """Run axi_fifo_driver.replay_words against the model; returns TAP deltas and timing."""
+    sim = sim or FifoTapSim()
+    fifo = AxiFifo(sim, timeout_s=0.0)
+    fifo.reset()
+    before = read_tap(sim.tap_bus)
+    res = replay_words(fifo, words, chunk_records, loopback=True)
+    after = read_tap(sim.tap_bus)
+    wps = res.words / res.elapsed_s if res.elapsed_s > 0 else 0.0
+    return SimRun(before, after, bool(np.array_equal(res.loopback, words)), res.packets,
+                  res.elapsed_s, wps)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay events.bin through the behavioural FIFO + TAP model.")
+    ap.add_argument("--in", dest="in_path", required=True, help="events.bin (v0 or v1)")
+    ap.add_argument("--chunk-records", type=int, default=DEFAULT_CHUNK_RECORDS)
+    ap.add_argument("--depth", type=int, default=DEFAULT_DEPTH_WORDS, help="TX/RX FIFO depth, words")
+    ap.add_argument("--expected-last-hash", type=lambda s: int(s, 0), default=None)
+    args = ap.parse_args()
+
+    with EventsFile(args.in_path) as ev:
+        words = np.array(ev.records.view("<u4"))
+
+    t0 = time.perf_counter()
+    run = simulate_replay(words, args.chunk_records, FifoTapSim(args.depth, args.depth))
+    wall = time.perf_counter() - t0
+
+    d_words = (run.after.word_count - run.before.word_count) & 0xFFFFFFFF
+    d_pkts = (run.after.pkt_count - run.before.pkt_count) & 0xFFFFFFFF
+    chunk_words = args.chunk_records * RECORD_WORDS
+    exp_hash = int(fnv1a_packets(words, chunk_words)[-1]) if len(words) else 0
+    exp_pkts = -(-len(words) // chunk_words)
+
+    print(f"words={len(words)} chunk_records={args.chunk_records} depth={args.depth}")
+    print(f"TAP_last_hash=0x{run.after.last_hash:08X} TAP_word_count={run.after.word_count} "
+          f"TAP_pkt_count={run.after.pkt_count}")
+    print(f"delta_words={d_words} expected={len(words)}")
+    print(f"delta_pkts={d_pkts}  expected={exp_pkts}")
+    print(f"loopback={'identical' if run.loopback_ok else 'DIFFERS'}")
+    print(f"metric: elapsed_s={run.elapsed_s:.6f} words_per_s={run.words_per_s:.0f} (wall {wall:.3f} s)")
+
+    expected = args.expected_last_hash if args.expected_last_hash is not None else exp_hash
+    ok = (d_words == len(words) and d_pkts == exp_pkts and run.loopback_ok
+          and run.after.last_hash == expected)
+    print(f"last_hash=0x{run.after.last_hash:08X} expected=0x{expected:08X}")
+    if not ok:
+        raise SystemExit("FAIL")
+    print("PASS: TAP delta + last_hash matched.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+# stage7_ps_pl_stream/phase3_demo_ready/tools/gen_depth_synthetic.py
+#
+# Synthetic Binance-style depth stream for stress datasets, written as any of:
+#   - NDJSON (same shape as pc_capture output: meta line + depthUpdate lines)
+#   - Stage 2 depth log (#SNAP line + "ts_ns,updateId,B|A,price,qty" lines)
+#   - events.bin (event_t v0)
+#
+# Model (per message, all drawn in numpy batches of CHUNK_MESSAGES):
+#   - arrivals: exponential gaps at --rate msgs/s; bursts start with
+#     probability --burst-prob per message, last --burst-len messages and
+#     multiply the rate by --burst-rate-mult and the levels per message by
+#     --burst-size-mult (defaults: ~5% of messages in bursts)
+#   - mid price: Gaussian random walk in ticks, --sigma ticks per sqrt(s)
+#   - levels: 1 + Poisson(--levels - 1) changes per message, side 50/50,
+#     distance from the touch geometric with mean --mean-dist ticks (capped
+#     at --book-depth); --delete-frac of them are deletes (qty 0), the rest
+#     get lognormal quantities around --qty-median
+#   - when the mid moves, the levels it crossed are deleted on the losing
+#     side (asks up to the new mid, bids above it), so the book stays uncrossed
+#   - ids: U = previous u + 1, u = U + levels - 1 + Poisson(--id-gap)
+# Within a message, bids come first (best first), then asks (best first),
+# like Binance. Receive timestamps (ts_ns of the log) are E plus a
+# 20 ms + exponential(5 ms) network lag, kept monotonic.
+#
+# Output is deterministic for a given seed and parameters. All formats come
+# from the same records, so converting the NDJSON with ndjson_to_events_v0.py
+# gives a byte-identical events.bin. Text is rendered without per-line Python
+# formatting: each chunk fills a fixed-width row template (digits eight at a
+# time from a 4-digit lookup table) and the used bytes are taken with one
+# boolean mask.
+#
+# Usage:
+#   python3 gen_depth_synthetic.py --messages 2000000 --events /tmp/synth.events.bin
+#   python3 gen_depth_synthetic.py --messages 100000 --seed 7 \
+#       --ndjson /tmp/synth.ndjson --log /tmp/synth.log --events /tmp/synth.events.bin
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from record_codecs import empty, pack_evt0_header
+
+CHUNK_MESSAGES = 1 << 16
+PRICE_SCALE = 100_000_000
+QTY_SCALE = 100_000_000
+NET_LAG_NS = 20_000_000
+NET_JITTER_NS = 5_000_000
+
+
+class GenParams(NamedTuple):
+    messages: int = 100_000
+    seed: int = 1
+    symbol: str = "BTCUSDT"
+    start_ms: int = 1_767_174_232_000
+    first_update_id: int = 84_208_125_321
+    rate: float = 10.0
+    levels: float = 20.0
+    mean_dist: float = 20.0
+    book_depth: int = 1000
+    delete_frac: float = 0.3
+    mid: str = "90000.00"
+    tick: str = "0.01"
+    lot: str = "0.00001"
+    qty_median: str = "0.01"
+    sigma: float = 20.0
+    id_gap: float = 40.0
+    burst_prob: float = 0.0001
+    burst_len: int = 500
+    burst_rate_mult: float = 10.0
+    burst_size_mult: float = 4.0
+
+
+class Chunk(NamedTuple):
+    """One batch of messages and their level changes (message order, bids then asks)."""
+    E: np.ndarray          # per message: event time ms
+    U: np.ndarray          # first update id
+    u: np.ndarray          # final update id
+    ts_ns: np.ndarray      # receive time
+    msg: np.ndarray        # per level: message index within the chunk
+    side: np.ndarray       # 0 = bid, 1 = ask
+    price: np.ndarray      # int64, price * PRICE_SCALE
+    qty: np.ndarray        # int64, qty * QTY_SCALE
+
+
+def _scaled(s: str, scale: int) -> int:
+    v = Decimal(s) * scale
+    if v != v.to_integral_value():
+        raise ValueError(f"{s} is not representable at scale {scale}")
+    return int(v)
+
+
+class DepthGenerator:
+    def __init__(self, p: GenParams) -> None:
+        self.p = p
+        self.rng = np.random.default_rng(p.seed)
+        self.tick = _scaled(p.tick, PRICE_SCALE)
+        self.lot = _scaled(p.lot, QTY_SCALE)
+        self.mid = _scaled(p.mid, PRICE_SCALE) // self.tick   # best bid, in ticks
+        self.qty_mu = np.log(max(_scaled(p.qty_median, QTY_SCALE) / self.lot, 1.0))
+        self.next_U = p.first_update_id
+        self.t_ms = float(p.start_ms)
+        self.last_ts = 0
+        self.burst_left = 0
+
+    def _qty(self, n: int) -> np.ndarray:
+        lots = np.ceil(self.rng.lognormal(self.qty_mu, 1.5, n)).astype(np.int64)
+        return np.maximum(lots, 1) * self.lot
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Initial book, --book-depth levels per side: bid prices/qtys, ask prices/qtys."""
+        d = np.arange(self.p.book_depth, dtype=np.int64)
+        bids = (self.mid - d) * self.tick
+        asks = (self.mid + 1 + d) * self.tick
+        return bids, self._qty(len(d)), asks, self._qty(len(d))
+
+    @property
+    def last_update_id(self) -> int:
+        """Snapshot lastUpdateId: the stream starts right after it."""
+        return self.next_U - 1
+
+    def chunks(self) -> Iterator[Chunk]:
+        left = self.p.messages
+        while left > 0:
+            n = min(left, CHUNK_MESSAGES)
+            yield self._chunk(n)
+            left -= n
+
+    def _chunk(self, n: int) -> Chunk:
+        p, rng = self.p, self.rng
+        i = np.arange(n, dtype=np.int64)
+
+        # bursts: a start at message k covers k .. k + burst_len - 1
+        starts = rng.random(n) < p.burst_prob
+        until = np.maximum.accumulate(np.where(starts, i + p.burst_len, self.burst_left))
+        burst = until > i
+        self.burst_left = max(int(until[-1]) - n, 0)
+
+        # arrivals
+        gap_ms = rng.exponential(1e3 / p.rate, n) / np.where(burst, p.burst_rate_mult, 1.0)
+        t = self.t_ms + np.cumsum(gap_ms)
+        self.t_ms = float(t[-1])
+        E = t.astype(np.int64)
+        lag = NET_LAG_NS + rng.exponential(NET_JITTER_NS, n).astype(np.int64)
+        ts_ns = np.maximum.accumulate(np.maximum(E * 1_000_000 + lag, self.last_ts))
+        self.last_ts = int(ts_ns[-1])
+
+        # mid walk (ticks, best bid)
+        step = np.rint(rng.standard_normal(n) * p.sigma * np.sqrt(gap_ms / 1e3)).astype(np.int64)
+        mid = self.mid + np.cumsum(step)
+        prev = np.concatenate(([self.mid], mid[:-1]))
+        self.mid = int(mid[-1])
+
+        # crossed levels: up-move deletes asks prev+1 .. mid, down-move bids mid+1 .. prev
+        n_cross = np.abs(mid - prev)
+        c_msg = np.repeat(i, n_cross)
+        c_off = np.arange(len(c_msg)) - np.repeat(np.cumsum(n_cross) - n_cross, n_cross)
+        c_up = np.repeat(mid > prev, n_cross)
+        c_price = np.repeat(np.minimum(prev, mid), n_cross) + 1 + c_off
+        c_side = np.where(c_up, 1, 0).astype(np.uint8)
+
+        # new levels
+        lam = (p.levels - 1.0) * np.where(burst, p.burst_size_mult, 1.0)
+        k = 1 + rng.poisson(lam)
+        l_msg = np.repeat(i, k)
+        m = len(l_msg)
+        l_side = (rng.random(m) < 0.5).astype(np.uint8)
+        dist = np.minimum(rng.geometric(1.0 / (1.0 + p.mean_dist), m) - 1, p.book_depth - 1)
+        l_mid = mid[l_msg]
+        l_price = np.where(l_side == 0, l_mid - dist, l_mid + 1 + dist)
+        l_qty = np.where(rng.random(m) < p.delete_frac, 0, self._qty(m))
+
+        msg = np.concatenate((c_msg, l_msg))
+        side = np.concatenate((c_side, l_side))
+        price = np.concatenate((c_price, l_price))
+        qty = np.concatenate((np.zeros(len(c_msg), dtype=np.int64), l_qty))
+
+        # message, bids then asks, best first; one change per price (the later one)
+        order = np.lexsort((np.where(side == 0, -price, price), side, msg))
+        msg, side, price, qty = msg[order], side[order], price[order], qty[order]
+        last = np.ones(len(msg), dtype=bool)
+        last[:-1] = (msg[1:] != msg[:-1]) | (side[1:] != side[:-1]) | (price[1:] != price[:-1])
+        msg, side, price, qty = msg[last], side[last], price[last], qty[last]
+
+        # ids
+        per_msg = np.bincount(msg, minlength=n)
+        span = per_msg + rng.poisson(p.id_gap, n)
+        u = self.next_U + np.cumsum(span) - 1
+        U = u - span + 1
+        self.next_U = int(u[-1]) + 1
+
+        return Chunk(E, U.astype(np.uint64), u.astype(np.uint64), ts_ns,
+                     msg, side, price * self.tick, qty)
+
+
+# ---------------------------------------------------------------------------
+# vectorised text rendering
+# ---------------------------------------------------------------------------
+
+_POW10 = 10 ** np.arange(20, dtype=np.uint64)
+# "0000".."9999" as little-endian uint32 words
+_LUT4 = np.array([int.from_bytes(f"{i:04d}".encode("ascii"), "little") for i in range(10_000)],
+                 dtype="<u8")
+
+
+def _digit_words(v: np.ndarray, n_words: int) -> List[np.ndarray]:
+    """Zero-padded decimal text of v, 8 digits per little-endian uint64, most significant first."""
+    words = []
+    for k in reversed(range(n_words)):
+        x = v // _POW10[8 * k] if k else v
+        words.append(_LUT4[(x // np.uint64(10_000)) % np.uint64(10_000)]
+                     | (_LUT4[x % np.uint64(10_000)] << np.uint64(32)))
+    return words
+
+
+class _Item(NamedTuple):
+    kind: str              # "lit", "uint" (no leading zeros), "zpad" (zero-padded), "byte"
+    value: str             # literal text, or the field name
+    width: int = 0         # zpad: digits
+    when: Optional[str] = None  # flag name: the item is left out where the flag is False
+
+
+class _Layout:
+    """
+    Fixed-width text rows. Per call, every item gets a column range sized to
+    the data (uint: the most digits in this batch); literals are baked into a
+    template row, numbers are stored eight digits at a time through unaligned
+    uint64 column views, and a per-cell mask drops leading zeros (only for
+    fields whose width varies) and absent items. The rows are then compacted
+    with the mask in one pass.
+    """
+
+    def __init__(self, items: List[_Item]) -> None:
+        self.items = items
+
+    def render(self, n: int, fields: dict, flags: Optional[dict] = None,
+               lengths: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        fields: name -> values per row, or (values, rows) to render once per
+        value and gather per row. flags: name -> bool per row. Returns the
+        text as a uint8 array and, with lengths, the byte length of each row.
+        """
+        tmpl, keep, stores, var_masks, optional = bytearray(), [], [], [], []
+        for it in self.items:
+            off = len(tmpl)
+            if it.kind == "lit":
+                tmpl += it.value.encode("ascii")
+                keep += [True] * len(it.value)
+            elif it.kind == "byte":
+                stores.append((off, None, fields[it.value], None))
+                tmpl += b" "
+                keep.append(True)
+            else:
+                v, rows = fields[it.value] if isinstance(fields[it.value], tuple) else (fields[it.value], None)
+                v = v.astype(np.uint64)
+                if it.kind == "uint":
+                    nd = np.maximum(np.searchsorted(_POW10, v, side="right"), 1)
+                    digits = int(nd.max()) if len(v) else 1
+                else:
+                    nd, digits = None, it.width
+                w = 8 * -(-digits // 8)
+                for j, word in enumerate(_digit_words(v, w // 8)):
+                    stores.append((off + 8 * j, "<u8", word, rows))
+                tmpl += b"0" * w
+                keep += [False] * (w - digits) + [True] * digits
+                if nd is not None and nd.min() != digits:
+                    var_masks.append((off + w - digits, digits, digits - nd, rows))
+            if it.when is not None:
+                optional.append((off, len(tmpl) - off, flags[it.when]))
+
+        W = len(tmpl)
+        mat = np.broadcast_to(np.frombuffer(bytes(tmpl), dtype=np.uint8), (n, W)).copy()
+        for off, dtype, vals, rows in stores:
+            if dtype is None:
+                mat[:, off] = vals
+                continue
+            col = np.ndarray((n,), dtype=dtype, buffer=mat, offset=off, strides=(W,))
+            col[:] = vals if rows is None else vals[rows]
+
+        if not var_masks and not optional:
+            keep_row = np.array(keep, dtype=bool)
+            text = mat[:, keep_row].reshape(-1)
+            return text, (np.full(n, int(keep_row.sum())) if lengths else None)
+        mask = np.broadcast_to(np.array(keep, dtype=bool), (n, W)).copy()
+        for off, digits, lead, rows in var_masks:
+            lead = lead if rows is None else lead[rows]
+            mask[:, off:off + digits] = np.arange(digits)[None, :] >= lead[:, None]
+        for off, w, flag in optional:
+            mask[~flag, off:off + w] = False
+        return mat[mask], (mask.sum(axis=1) if lengths else None)
+
+
+_LOG_ROW = _Layout([
+    _Item("uint", "ts_ns"), _Item("lit", ","), _Item("uint", "u"), _Item("lit", ","),
+    _Item("byte", "side"), _Item("lit", ","),
+    _Item("uint", "price_int"), _Item("lit", "."), _Item("zpad", "price_frac", 8), _Item("lit", ","),
+    _Item("uint", "qty_int"), _Item("lit", "."), _Item("zpad", "qty_frac", 8), _Item("lit", "\n"),
+])
+
+_NDJSON_LEVEL = _Layout([
+    _Item("lit", '],"a":[', when="first_ask"),     # also when the message has no bids
+    _Item("lit", ",", when="not_first"),
+    _Item("lit", '["'), _Item("uint", "price_int"), _Item("lit", "."), _Item("zpad", "price_frac", 8),
+    _Item("lit", '","'), _Item("uint", "qty_int"), _Item("lit", "."), _Item("zpad", "qty_frac", 8),
+    _Item("lit", '"]'),
+    _Item("lit", '],"a":[]}\n', when="end_no_asks"),
+    _Item("lit", "]}\n", when="end"),
+])
+
+
+def _split(v: np.ndarray, scale: int):
+    return v // scale, v % scale
+
+
+def render_log(c: Chunk) -> np.ndarray:
+    """Stage 2 depth log lines: ts_ns,u,B|A,price,qty."""
+    assert PRICE_SCALE == QTY_SCALE == 10 ** 8
+    p_int, p_frac = _split(c.price, PRICE_SCALE)
+    q_int, q_frac = _split(c.qty, QTY_SCALE)
+    text, _ = _LOG_ROW.render(len(c.msg), {
+        "ts_ns": (c.ts_ns, c.msg), "u": (c.u, c.msg),
+        "side": np.where(c.side == 0, ord("B"), ord("A")).astype(np.uint8),
+        "price_int": p_int, "price_frac": p_frac, "qty_int": q_int, "qty_frac": q_frac,
+    })
+    return text
+
+
+def render_ndjson(c: Chunk, symbol: str) -> bytes:
+    """depthUpdate lines: message heads and level rows rendered apart, then interleaved."""
+    n, n_msg = len(c.msg), len(c.E)
+    heads, head_len = _Layout([
+        _Item("lit", '{"e":"depthUpdate","E":'), _Item("uint", "E"),
+        _Item("lit", f',"s":"{symbol}","U":'), _Item("uint", "U"),
+        _Item("lit", ',"u":'), _Item("uint", "u"), _Item("lit", ',"b":['),
+    ]).render(n_msg, {"E": c.E, "U": c.U, "u": c.u}, lengths=True)
+
+    first = np.ones(n, dtype=bool)
+    first[1:] = c.msg[1:] != c.msg[:-1]
+    end = np.ones(n, dtype=bool)
+    end[:-1] = first[1:]
+    side_start = np.ones(n, dtype=bool)
+    side_start[1:] = first[1:] | (c.side[1:] != c.side[:-1])
+    ask = c.side == 1
+    p_int, p_frac = _split(c.price, PRICE_SCALE)
+    q_int, q_frac = _split(c.qty, QTY_SCALE)
+    levels, row_len = _NDJSON_LEVEL.render(n, {
+        "price_int": p_int, "price_frac": p_frac, "qty_int": q_int, "qty_frac": q_frac,
+    }, {
+        "first_ask": ask & side_start, "not_first": ~side_start,
+        "end_no_asks": end & ~ask, "end": end & ask,
+    }, lengths=True)
+
+    # byte offsets of each message's head and level rows
+    level_len = np.bincount(c.msg, weights=row_len, minlength=n_msg).astype(np.int64)
+    h_end, l_end = np.cumsum(head_len).tolist(), np.cumsum(level_len).tolist()
+    hv, lv = memoryview(heads), memoryview(levels)
+    parts = []
+    h0 = l0 = 0
+    for h1, l1 in zip(h_end, l_end):
+        parts.append(hv[h0:h1])
+        parts.append(lv[l0:l1])
+        h0, l0 = h1, l1
+    return b"".join(parts)
+
+
+def events_records(c: Chunk) -> bytes:
+    rec = empty("evt0", len(c.msg))
+    rec["side"] = c.side
+    rec["E"] = c.E[c.msg]
+    rec["U"] = c.U[c.msg]
+    rec["u"] = c.u[c.msg]
+    rec["price_i64"] = c.price
+    rec["qty_i64"] = c.qty
+    return rec.tobytes()
+
+
+def _levels_json(prices: np.ndarray, qtys: np.ndarray) -> list:
+    def dec(v: int, scale: int) -> str:
+        return f"{v // scale}.{v % scale:0{len(str(scale)) - 1}d}"
+    return [[dec(int(p), PRICE_SCALE), dec(int(q), QTY_SCALE)] for p, q in zip(prices, qtys)]
+
+
+def main() -> None:
+    d = GenParams()
+    ap = argparse.ArgumentParser(description="Synthetic depth stream -> NDJSON / Stage 2 log / events.bin.")
+    ap.add_argument("--messages", type=int, default=d.messages, help="depthUpdate messages to generate")
+    ap.add_argument("--seed", type=int, default=d.seed)
+    ap.add_argument("--symbol", default=d.symbol)
+    ap.add_argument("--start-ms", type=int, default=d.start_ms, help="E of the first message")
+    ap.add_argument("--first-update-id", type=int, default=d.first_update_id)
+    ap.add_argument("--rate", type=float, default=d.rate, help="mean messages/s outside bursts")
+    ap.add_argument("--levels", type=float, default=d.levels, help="mean level changes per message")
+    ap.add_argument("--mean-dist", type=float, default=d.mean_dist, help="mean distance from the touch (ticks)")
+    ap.add_argument("--book-depth", type=int, default=d.book_depth,
+                    help="max distance from the touch (ticks); also the snapshot depth")
+    ap.add_argument("--delete-frac", type=float, default=d.delete_frac)
+    ap.add_argument("--mid", default=d.mid, help="initial best bid")
+    ap.add_argument("--tick", default=d.tick)
+    ap.add_argument("--lot", default=d.lot)
+    ap.add_argument("--qty-median", default=d.qty_median)
+    ap.add_argument("--sigma", type=float, default=d.sigma, help="mid volatility, ticks per sqrt(second)")
+    ap.add_argument("--id-gap", type=float, default=d.id_gap, help="mean extra update ids per message")
+    ap.add_argument("--burst-prob", type=float, default=d.burst_prob, help="burst start probability per message")
+    ap.add_argument("--burst-len", type=int, default=d.burst_len, help="messages per burst")
+    ap.add_argument("--burst-rate-mult", type=float, default=d.burst_rate_mult)
+    ap.add_argument("--burst-size-mult", type=float, default=d.burst_size_mult)
+    ap.add_argument("--ndjson", type=str, default=None, help="write NDJSON here")
+    ap.add_argument("--log", type=str, default=None, help="write a Stage 2 depth log here")
+    ap.add_argument("--events", type=str, default=None, help="write events.bin (v0) here")
+    args = ap.parse_args()
+    if not (args.ndjson or args.log or args.events):
+        ap.error("pick at least one of --ndjson / --log / --events")
+
+    params = GenParams(**{f: getattr(args, f) for f in GenParams._fields})
+    gen = DepthGenerator(params)
+    outs = {}
+    if args.events:
+        outs["events"] = open(args.events, "wb")
+        outs["events"].write(pack_evt0_header(PRICE_SCALE, QTY_SCALE, params.symbol))
+    if args.ndjson:
+        outs["ndjson"] = open(args.ndjson, "wb")
+        meta = {"type": "meta", "schema_version": "ndjson.v0", "symbol": params.symbol,
+                "stream": f"{params.symbol.lower()}@depth", "start_unix_ms": params.start_ms,
+                "start_utc": datetime.fromtimestamp(params.start_ms / 1e3, timezone.utc).isoformat(),
+                "source": "synthetic", "generator": params._asdict()}
+        outs["ndjson"].write((json.dumps(meta, separators=(",", ":")) + "\n").encode("ascii"))
+    if args.log:
+        outs["log"] = open(args.log, "wb")
+        bids, bq, asks, aq = gen.snapshot()
+        snap = {"lastUpdateId": gen.last_update_id, "bids": _levels_json(bids, bq),
+                "asks": _levels_json(asks, aq)}
+        outs["log"].write(("#SNAP " + json.dumps(snap, separators=(",", ":")) + "\n").encode("ascii"))
+
+    n_msgs = n_recs = 0
+    t0 = time.perf_counter()
+    t_gen = 0.0
+    t_fmt = dict.fromkeys(outs, 0.0)
+    try:
+        it = gen.chunks()
+        while True:
+            t = time.perf_counter()
+            c = next(it, None)
+            t_gen += time.perf_counter() - t
+            if c is None:
+                break
+            for name, fh in outs.items():
+                t = time.perf_counter()
+                if name == "events":
+                    fh.write(events_records(c))
+                elif name == "ndjson":
+                    fh.write(render_ndjson(c, params.symbol))
+                else:
+                    fh.write(render_log(c))
+                t_fmt[name] += time.perf_counter() - t
+            n_msgs += len(c.E)
+            n_recs += len(c.msg)
+    finally:
+        for fh in outs.values():
+            fh.close()
+
+    total = time.perf_counter() - t0
+    print(f"[synth] seed={params.seed} messages={n_msgs} records={n_recs} "
+          f"({n_recs / max(n_msgs, 1):.2f}/msg) in {total:.2f}s, generation {t_gen:.2f}s")
+    for name, path in (("events", args.events), ("ndjson", args.ndjson), ("log", args.log)):
+        if path:
+            size = Path(path).stat().st_size
+            print(f"[synth] {name:6s} {path}: {size / 1e6:.1f} MB, "
+                  f"{size / 1e6 / max(t_fmt[name], 1e-9):.0f} MB/s rendered+written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# stage7_ps_pl_stream/phase3_demo_ready/tools/record_codecs.py
+#
+# One registry for the fixed-size binary record layouts used across the repo,
+# with numpy dtypes and batch encode/decode (whole buffers, no per-record
+# struct calls), plus bulk transcoders between layouts.
+#
+# Layouts (little-endian):
+#   uart32       32 B  "<QQBffxxxxxxx"   stage2/stage4 UART depth record
+#                      ts_ns u64, update_id u64, side u8, price f32, qty f32
+#   evt0         48 B  "<B7xQQQqq"       events.bin v0 record (64-byte header)
+#                      side u8, E u64, U u64, u u64, price_i64, qty_i64
+#   evt1         48 B  "<BxH4xQQQqq"     events.bin v1 record (64 + 16*n header)
+#                      as evt0 plus symbol_id u16 at offset 2
+#   bookticker32 32 B  "<8I"             phase1 bookTicker / test event
+#                      magic, seq, u, rsvd, bid_px, bid_qty, ask_px, ask_qty
+#
+# Transcoders:
+#   evt0/evt1 -> uart32 : ts_ns = E * 1e6, update_id = u (final update id),
+#                         price/qty = float32(price_i64 / price_scale), i.e. the
+#                         same float32 the stage2 replay sends for the decimal
+#                         string (both round the exact value to nearest).
+#   uart32 -> evt0      : E = ts_ns // 1e6, U = u = update_id,
+#                         price_i64 = rint(float64(price_f32) * price_scale)
+#                         (lossy: float32 has ~7 significant digits).
+#
+# Usage:
+#   python3 record_codecs.py --in data/sample_btcusdt_depth.events.bin --info
+#   python3 record_codecs.py --in data/sample_btcusdt_depth.events.bin \
+#       --to uart32 --out data/sample_btcusdt_depth.uart32.bin
+
+import argparse
+import mmap
+import struct
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+EVT0_MAGIC = b"EVT0BIN\x00"
+EVT1_MAGIC = b"EVT1BIN\x00"
+EVT_HEADER_SIZE = 64
+EVT_SYMBOL_SIZE = 16
+
+EVT0_HDR_STRUCT = struct.Struct("<8sIIQQ16s16s")  # 64 bytes
+EVT1_HDR_STRUCT = struct.Struct("<8sIIQQII24s")   # 64 bytes
+
+BOOKTICKER_MAGIC = 0x30545645  # "EVT0" as a little-endian u32
+
+NS_PER_MS = 1_000_000
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class RecordCodec(NamedTuple):
+    name: str
+    struct_fmt: str       # equivalent struct format (reference / docs)
+    dtype: np.dtype
+
+    @property
+    def size(self) -> int:
+        return self.dtype.itemsize
+
+
+def _dtype(names, formats, offsets, itemsize) -> np.dtype:
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": itemsize})
+
+
+CODECS: Dict[str, RecordCodec] = {
+    "uart32": RecordCodec(
+        "uart32", "<QQBffxxxxxxx",
+        _dtype(["ts_ns", "update_id", "side", "price", "qty"],
+               ["<u8", "<u8", "u1", "<f4", "<f4"],
+               [0, 8, 16, 17, 21], 32),
+    ),
+    "evt0": RecordCodec(
+        "evt0", "<B7xQQQqq",
+        _dtype(["side", "E", "U", "u", "price_i64", "qty_i64"],
+               ["u1", "<u8", "<u8", "<u8", "<i8", "<i8"],
+               [0, 8, 16, 24, 32, 40], 48),
+    ),
+    "evt1": RecordCodec(
+        "evt1", "<BxH4xQQQqq",
+        _dtype(["side", "symbol_id", "E", "U", "u", "price_i64", "qty_i64"],
+               ["u1", "<u2", "<u8", "<u8", "<u8", "<i8", "<i8"],
+               [0, 2, 8, 16, 24, 32, 40], 48),
+    ),
+    "bookticker32": RecordCodec(
+        "bookticker32", "<8I",
+        _dtype(["magic", "seq", "u", "rsvd", "bid_px", "bid_qty", "ask_px", "ask_qty"],
+               ["<u4"] * 8,
+               [0, 4, 8, 12, 16, 20, 24, 28], 32),
+    ),
+}
+
+for _c in CODECS.values():
+    assert _c.size == struct.calcsize(_c.struct_fmt), _c.name
+
+
+def get_codec(name: str) -> RecordCodec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"unknown record format {name!r} (known: {', '.join(CODECS)})") from None
+
+
+def empty(name: str, n: int) -> np.ndarray:
+    """n zeroed records of a layout (padding bytes stay zero on encode)."""
+    return np.zeros(n, dtype=get_codec(name).dtype)
+
+
+def decode(name: str, buf: Buffer, offset: int = 0, count: int = -1) -> np.ndarray:
+    """
+    View buf[offset:] as records (zero-copy; read-only for bytes / read-only mmaps).
+    A trailing partial record is an error.
+    """
+    codec = get_codec(name)
+    avail = len(buf) - offset
+    if avail < 0:
+        raise ValueError("offset past end of buffer")
+    if count < 0:
+        if avail % codec.size != 0:
+            raise ValueError(f"{name}: {avail} bytes is not a whole number of {codec.size}-byte records")
+        count = avail // codec.size
+    elif count * codec.size > avail:
+        raise ValueError(f"{name}: buffer holds fewer than {count} records")
+    return np.frombuffer(buf, dtype=codec.dtype, count=count, offset=offset)
+
+
+def encode(name: str, records: np.ndarray) -> bytes:
+    """Records (structured array of the layout's dtype, or one castable to it) -> bytes."""
+    codec = get_codec(name)
+    arr = np.asarray(records)
+    if arr.dtype != codec.dtype:
+        out = np.zeros(len(arr), dtype=codec.dtype)
+        for field in codec.dtype.names:
+            out[field] = arr[field]
+        arr = out
+    return np.ascontiguousarray(arr).tobytes()
+
+
+# ---------------------------------------------------------------------------
+# events.bin containers (header + evt0/evt1 records)
+# ---------------------------------------------------------------------------
+
+class EventsHeader(NamedTuple):
+    version: int           # 0 or 1
+    header_size: int       # bytes before the first record
+    price_scale: int
+    qty_scale: int
+    symbols: List[str]     # v0: one symbol; v1: index = symbol_id
+
+    @property
+    def record_format(self) -> str:
+        return "evt1" if self.version == 1 else "evt0"
+
+
+def _sym_str(sym16: bytes) -> str:
+    return sym16.split(b"\x00", 1)[0].decode("ascii", errors="replace")
+
+
+def parse_events_header(buf: Buffer) -> EventsHeader:
+    """Validate an events.bin v0 / v1 header at the start of buf."""
+    if len(buf) < EVT_HEADER_SIZE:
+        raise ValueError("file too small for header")
+    magic = bytes(buf[:8])
+    if magic == EVT0_MAGIC:
+        _, version, rec_size, price_scale, qty_scale, sym16, _ = EVT0_HDR_STRUCT.unpack_from(buf, 0)
+        if version != 0:
+            raise ValueError(f"unsupported version {version}")
+        symbols = [_sym_str(sym16)]
+        header_size = EVT_HEADER_SIZE
+    elif magic == EVT1_MAGIC:
+        _, version, rec_size, price_scale, qty_scale, n_symbols, header_size, _ = EVT1_HDR_STRUCT.unpack_from(buf, 0)
+        if version != 1:
+            raise ValueError(f"unsupported version {version}")
+        if header_size != EVT_HEADER_SIZE + EVT_SYMBOL_SIZE * n_symbols:
+            raise ValueError(f"bad header_size {header_size} for n_symbols={n_symbols}")
+        if len(buf) < header_size:
+            raise ValueError("truncated symbol table")
+        symbols = [_sym_str(bytes(buf[i:i + EVT_SYMBOL_SIZE]))
+                   for i in range(EVT_HEADER_SIZE, header_size, EVT_SYMBOL_SIZE)]
+    else:
+        raise ValueError("bad magic (not EVT0BIN\\0 / EVT1BIN\\0)")
+    if rec_size != 48:
+        raise ValueError(f"unexpected record_size {rec_size} (expected 48)")
+    return EventsHeader(version, header_size, price_scale, qty_scale, symbols)
+
+
+def pack_evt0_header(price_scale: int, qty_scale: int, symbol: str) -> bytes:
+    sym_b = symbol.encode("ascii", errors="strict")
+    if len(sym_b) > EVT_SYMBOL_SIZE:
+        raise ValueError("symbol too long (max 16 bytes ASCII)")
+    return EVT0_HDR_STRUCT.pack(EVT0_MAGIC, 0, 48, int(price_scale), int(qty_scale),
+                                sym_b.ljust(EVT_SYMBOL_SIZE, b"\x00"), b"\x00" * 16)
+
+
+class EventsFile:
+    """
+    events.bin (v0 or v1) mapped read-only: .header and .records (a zero-copy
+    evt0/evt1 structured array over the mapping). Use as a context manager.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._f = self.path.open("rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file: mmap cannot map 0 bytes
+            self._f.close()
+            raise ValueError("file too small for header") from None
+        self.header = parse_events_header(self._mm)
+        self.records = decode(self.header.record_format, self._mm, offset=self.header.header_size)
+
+    def close(self) -> None:
+        self.records = None     # drop the view before unmapping
+        try:
+            self._mm.close()
+        except BufferError:
+            # caller still holds a view of the records: the mapping is
+            # released when the last view goes away
+            pass
+        self._f.close()
+
+    def __enter__(self) -> "EventsFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---------------------------------------------------------------------------
+# Transcoders
+# ---------------------------------------------------------------------------
+
+def evt_to_uart32(records: np.ndarray, price_scale: int, qty_scale: int) -> np.ndarray:
+    """evt0 / evt1 records -> uart32 records (symbol_id is dropped)."""
+    out = empty("uart32", len(records))
+    out["ts_ns"] = records["E"] * np.uint64(NS_PER_MS)
+    out["update_id"] = records["u"]
+    out["side"] = records["side"]
+    out["price"] = records["price_i64"] / float(price_scale)
+    out["qty"] = records["qty_i64"] / float(qty_scale)
+    return out
+
+
+def uart32_to_evt0(records: np.ndarray, price_scale: int, qty_scale: int) -> np.ndarray:
+    """uart32 records -> evt0 records (ms timestamps, float32 precision)."""
+    out = empty("evt0", len(records))
+    out["side"] = records["side"]
+    out["E"] = records["ts_ns"] // np.uint64(NS_PER_MS)
+    out["U"] = records["update_id"]
+    out["u"] = records["update_id"]
+    out["price_i64"] = np.rint(records["price"].astype(np.float64) * price_scale).astype(np.int64)
+    out["qty_i64"] = np.rint(records["qty"].astype(np.float64) * qty_scale).astype(np.int64)
+    return out
+
+
+# (src, dst) -> fn(records, price_scale, qty_scale)
+TRANSCODERS: Dict[Tuple[str, str], Callable[[np.ndarray, int, int], np.ndarray]] = {
+    ("evt0", "uart32"): evt_to_uart32,
+    ("evt1", "uart32"): evt_to_uart32,
+    ("uart32", "evt0"): uart32_to_evt0,
+}
+
+
+def transcode(records: np.ndarray, src: str, dst: str,
+              price_scale: int = 100_000_000, qty_scale: int = 100_000_000) -> np.ndarray:
+    if src == dst:
+        return records
+    try:
+        fn = TRANSCODERS[(src, dst)]
+    except KeyError:
+        raise ValueError(f"no transcoder {src} -> {dst}") from None
+    return fn(records, price_scale, qty_scale)
+
+
+def _info_and_write(args, src: str, records: np.ndarray, price_scale: int, qty_scale: int) -> None:
+    if args.info:
+        names = records.dtype.names
+        print("  idx " + " ".join(names))
+        for i, rec in enumerate(records[:args.n]):
+            print(f"  {i:04d} " + " ".join(str(rec[k]) for k in names))
+
+    if args.dst:
+        out = transcode(records, src, args.dst, price_scale, qty_scale)
+        if args.out_path:
+            payload = encode(args.dst, out)
+            if args.dst == "evt0":
+                payload = pack_evt0_header(price_scale, qty_scale, args.symbol) + payload
+            Path(args.out_path).write_bytes(payload)
+            print(f"out={args.out_path} format={args.dst} records={len(out)} bytes={len(payload)}")
+        else:
+            print(f"transcoded {len(out)} records to {args.dst} (no --out given)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Inspect / bulk-transcode fixed-size record files.")
+    ap.add_argument("--in", dest="in_path", required=True, help="events.bin or headerless record file")
+    ap.add_argument("--from", dest="src", default=None, choices=sorted(CODECS),
+                    help="layout of a headerless input (events.bin is detected from its magic)")
+    ap.add_argument("--to", dest="dst", default=None, choices=sorted(CODECS), help="output layout")
+    ap.add_argument("--out", dest="out_path", default=None, help="output file (evt0 gets an events.bin v0 header, other layouts are bare records)")
+    ap.add_argument("--symbol", default="BTCUSDT", help="symbol for an evt0 header when writing evt0")
+    ap.add_argument("--price-scale", type=int, default=100_000_000)
+    ap.add_argument("--qty-scale", type=int, default=100_000_000)
+    ap.add_argument("--info", action="store_true", help="print header and first records")
+    ap.add_argument("--n", type=int, default=5, help="records to print with --info")
+    args = ap.parse_args()
+
+    events: Optional[EventsFile] = None
+    if args.src is None:
+        events = EventsFile(args.in_path)
+        hdr = events.header
+        src, records = hdr.record_format, events.records
+        price_scale, qty_scale = hdr.price_scale, hdr.qty_scale
+        print(f"in={args.in_path} format={src} symbols={','.join(hdr.symbols)} "
+              f"price_scale={price_scale} qty_scale={qty_scale} records={len(records)}")
+    else:
+        src = args.src
+        records = decode(src, Path(args.in_path).read_bytes())
+        price_scale, qty_scale = args.price_scale, args.qty_scale
+        print(f"in={args.in_path} format={src} records={len(records)}")
+
+    if args.dst and src != args.dst and (src, args.dst) not in TRANSCODERS:
+        raise SystemExit(f"no transcoder {src} -> {args.dst}")
+
+    try:
+        _info_and_write(args, src, records, price_scale, qty_scale)
+    finally:
+        del records
+        if events is not None:
+            events.close()
+
+if __name__ == "__main__":
+    main()